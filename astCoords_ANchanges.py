@@ -12,7 +12,10 @@ import sys
 import math
 import numpy
 import string
-from PyWCSTools import wcscon
+try:
+    from PyWCSTools import wcscon
+except ImportError:
+    wcscon = None
 
 #-----------------------------------------------------------------------------
 def hms2decimal(RAString, delimiter):
@@ -79,6 +82,108 @@ def dms2decimal(decString, delimiter):
 
     return decDeg
 
+#-----------------------------------------------------------------------------
+def _sexagesimal2decimalArray(strings, delimiter):
+    """Converts an array of sexagesimal strings (e.g. -DD:MM:SS.S) into
+    decimal values, in the units of the first field. The sign is taken from
+    the string, so that -00:MM:SS values are negative. Strings without
+    delimiter are read as decimal numbers, empty or '-' ones as NaN.
+
+    @type strings: numpy array
+    @param strings: coordinate strings
+    @type delimiter: string
+    @param delimiter: delimiter character ("" or " " for white spaces, None
+    to use ':' if found in the strings, else white spaces)
+    @rtype: tuple
+    @return: (values, sexagesimal), values with the sign and the mask of the
+    strings in sexagesimal format
+
+    """
+    strings = numpy.asarray(strings, dtype=str)
+    if len(strings) == 0:
+        return numpy.zeros(0, dtype=numpy.float64), numpy.zeros(0, dtype=bool)
+    text = " ".join(strings.tolist())
+    if delimiter is None:
+        if text.find(":") >= 0:
+            delimiter = ":"
+        else:
+            delimiter = " "
+    elif delimiter == "":
+        delimiter = " "
+
+    # Fast paths: no delimiter at all (decimal values), or all the strings
+    # with three fields, parsed in one go (the sign of -00 is kept as -0.0)
+    if delimiter != " " and text.find(delimiter) < 0:
+        strings = numpy.char.strip(strings)
+        undefined = (strings == "") | (strings == "-")
+        values = numpy.where(undefined, "nan", strings).astype(numpy.float64)
+        return values, numpy.zeros(len(values), dtype=bool)
+    if delimiter != " " and text.count(delimiter) == 2*len(strings):
+        fields = numpy.fromstring(text.replace(delimiter, " "), sep=" ")
+        if fields.size == 3*len(strings):
+            fields = fields.reshape(-1, 3)
+            values = numpy.abs(fields[:, 0])+fields[:, 1]/60.0+fields[:, 2]/3600.0
+            values = numpy.where(numpy.signbit(fields[:, 0]), -values, values)
+            return values, numpy.ones(len(values), dtype=bool)
+
+    strings = numpy.char.strip(strings)
+    undefined = (strings == "") | (strings == "-")
+    strings = numpy.where(undefined, "nan", strings)
+    negative = numpy.char.startswith(strings, "-")
+    unsigned = numpy.char.strip(numpy.char.lstrip(strings, "+-"))
+    sexagesimal = numpy.char.find(unsigned, delimiter) >= 0
+
+    parts = numpy.char.partition(unsigned, delimiter)
+    first = parts[:, 0]
+    parts = numpy.char.partition(numpy.char.strip(parts[:, 2]), delimiter)
+    minutes = numpy.char.strip(parts[:, 0])
+    seconds = numpy.char.strip(parts[:, 2])
+
+    values = numpy.where(minutes == "", "0", minutes).astype(numpy.float64)/60.0
+    values = values+numpy.where(seconds == "", "0", seconds).astype(numpy.float64)/3600.0
+    values = first.astype(numpy.float64)+numpy.where(sexagesimal, values, 0.0)
+    values = numpy.where(negative, -values, values)
+
+    return values, sexagesimal
+
+#-----------------------------------------------------------------------------
+def hms2decimalArray(RAStrings, delimiter=None):
+    """Converts an array of delimited strings of Hours:Minutes:Seconds format
+    into decimal degrees, all at once (see hms2decimal). Strings without
+    delimiter are taken as decimal degrees.
+
+    @type RAStrings: list or numpy array
+    @param RAStrings: coordinate strings in H:M:S format
+    @type delimiter: string
+    @param delimiter: delimiter character in RAStrings ("" or " " for white
+    spaces, None to detect it)
+    @rtype: numpy array
+    @return: coordinates in decimal degrees
+
+    """
+    values, sexagesimal = _sexagesimal2decimalArray(RAStrings, delimiter)
+
+    return numpy.where(sexagesimal, values*15.0, values)
+
+#-----------------------------------------------------------------------------
+def dms2decimalArray(decStrings, delimiter=None):
+    """Converts an array of delimited strings of Degrees:Minutes:Seconds format
+    into decimal degrees, all at once (see dms2decimal). The sign applies to
+    the whole value, also for -00:MM:SS declinations.
+
+    @type decStrings: list or numpy array
+    @param decStrings: coordinate strings in D:M:S format
+    @type delimiter: string
+    @param delimiter: delimiter character in decStrings ("" or " " for white
+    spaces, None to detect it)
+    @rtype: numpy array
+    @return: coordinates in decimal degrees
+
+    """
+    values, sexagesimal = _sexagesimal2decimalArray(decStrings, delimiter)
+
+    return values
+
 #-----------------------------------------------------------------------------
 def decimal2hms(RADeg, delimiter):
     """Converts decimal degrees to string in Hours:Minutes:Seconds format with
@@ -230,6 +335,98 @@ def decimal2dms(decDeg, delimiter):
 
         return sDeg+delimiter+sMins+delimiter+sSecs
 
+#-----------------------------------------------------------------------------
+def _sexagesimalStringsArray(ticks, decimals, delimiter, signs=None):
+    """Builds the fixed-width strings [sign]UU:MM:SS.sss of an array of
+    non-negative integer counts of 10**-decimals seconds, writing the
+    characters of all the strings into a single byte array.
+
+    @type ticks: numpy array
+    @param ticks: integer values, in units of 10**-decimals seconds
+    @type decimals: int
+    @param decimals: number of decimal digits of the seconds
+    @type delimiter: string
+    @param delimiter: delimiter characters between the fields
+    @type signs: numpy array
+    @param signs: characters ('+' or '-') to prepend, if not None
+    @rtype: numpy array
+    @return: the strings
+
+    """
+    scale = 10**decimals
+    fields = [ticks//(3600*scale), (ticks//(60*scale)) % 60, (ticks//scale) % 60]
+
+    columns = []
+    if signs is not None:
+        columns.append(numpy.asarray(signs).view(numpy.uint8))
+    for k, value in enumerate(fields):
+        if k > 0:
+            columns.extend([ord(char) for char in delimiter])
+        columns.append(48+(value//10) % 10)
+        columns.append(48+value % 10)
+    if decimals > 0:
+        columns.append(ord("."))
+        for power in range(decimals-1, -1, -1):
+            columns.append(48+(ticks//10**power) % 10)
+
+    chars = numpy.empty((len(ticks), len(columns)), dtype=numpy.uint8)
+    for k, column in enumerate(columns):
+        chars[:, k] = column
+
+    return chars.view("S%i" % len(columns)).ravel()
+
+#-----------------------------------------------------------------------------
+def decimal2hmsArray(RADeg, delimiter=":", decimals=3):
+    """Converts an array of decimal degrees to strings in Hours:Minutes:Seconds
+    format (e.g. 12:30:05.123), all at once (see decimal2hms). The seconds
+    are rounded to the given decimals, carrying into minutes and hours
+    (24:00:00 wraps to 00:00:00). Undefined (NaN) values give "-".
+
+    @type RADeg: float or numpy array
+    @param RADeg: coordinates in decimal degrees
+    @type delimiter: string
+    @param delimiter: delimiter character in returned strings
+    @type decimals: int
+    @param decimals: number of decimal digits of the seconds
+    @rtype: numpy array
+    @return: fixed-width coordinate strings in H:M:S format
+
+    """
+    RADeg = numpy.atleast_1d(numpy.asarray(RADeg, dtype=numpy.float64))
+    defined = numpy.isfinite(RADeg)
+    scale = 10**decimals
+    ticks = numpy.round(numpy.mod(numpy.where(defined, RADeg, 0.0), 360.0)*240.0*scale)
+    ticks = ticks.astype(numpy.int64) % (24*3600*scale)
+
+    return numpy.where(defined, _sexagesimalStringsArray(ticks, decimals, delimiter), "-")
+
+#-----------------------------------------------------------------------------
+def decimal2dmsArray(decDeg, delimiter=":", decimals=2):
+    """Converts an array of decimal degrees to strings in
+    Degrees:Minutes:Seconds format (e.g. -05:10:20.12), all at once (see
+    decimal2dms). The seconds are rounded to the given decimals, carrying
+    into minutes and degrees; the sign is always given ('+' for zero).
+    Undefined (NaN) values give "-".
+
+    @type decDeg: float or numpy array
+    @param decDeg: coordinates in decimal degrees
+    @type delimiter: string
+    @param delimiter: delimiter character in returned strings
+    @type decimals: int
+    @param decimals: number of decimal digits of the seconds
+    @rtype: numpy array
+    @return: fixed-width coordinate strings in D:M:S format
+
+    """
+    decDeg = numpy.atleast_1d(numpy.asarray(decDeg, dtype=numpy.float64))
+    defined = numpy.isfinite(decDeg)
+    scale = 10**decimals
+    decDeg = numpy.where(defined, decDeg, 0.0)
+    ticks = numpy.round(numpy.abs(decDeg)*3600.0*scale).astype(numpy.int64)
+    signs = numpy.where((decDeg < 0) & (ticks > 0), "-", "+")
+
+    return numpy.where(defined, _sexagesimalStringsArray(ticks, decimals, delimiter, signs), "-")
+
 #-----------------------------------------------------------------------------
 def calcAngSepDeg(RA1, dec1, RA2, dec2):
     """Calculates the angular separation of two positions on the sky (specified
@@ -258,6 +455,10 @@ def calcAngSepDeg(RA1, dec1, RA2, dec2):
     In addition, the tangent plane approximation restriction (i.e., dist < 90 deg) 
     has been removed and the complete formula is now implemented. 
     Pythagoras approximation is applied only for dist < 1 arcsec.
+
+    The separation is now given by the Vincenty formula (see
+    calcAngSepDegTrig), accurate at all scales: neither the rounded arccos
+    nor the Pythagoras approximation below 1 arcsec are needed any more.
     """
     # ** ORIGINAL CODE **
     #
@@ -300,33 +501,249 @@ def calcAngSepDeg(RA1, dec1, RA2, dec2):
       RADeg2 = float(newinp[2])
       decDeg2 = float(newinp[3])
 	
-    cRA = numpy.radians(RADeg1)
-    cDec = numpy.radians(decDeg1)
+    rad = calcAngSepDegTrig(precomputeTrig(RADeg1, decDeg1),
+        precomputeTrig(RADeg2, decDeg2))
 
-    gRA = numpy.radians(RADeg2)
-    gDec = numpy.radians(decDeg2)
-      
-    x=numpy.cos(cRA)*numpy.cos(cDec)*numpy.cos(gRA)*numpy.cos(gDec)
-    y=numpy.sin(cRA)*numpy.cos(cDec)*numpy.sin(gRA)*numpy.cos(gDec)
-    z=numpy.sin(cDec)*numpy.sin(gDec)
+    return rad
 
-    rad=numpy.degrees(numpy.arccos(round(x+y+z,10)))
+#-----------------------------------------------------------------------------
+def calcAngSepDegArray(RADeg1, decDeg1, RADeg2, decDeg2):
+    """Calculates the angular separations of positions on the sky (specified
+    in decimal degrees) in decimal degrees. All the inputs can be numpy
+    arrays, broadcast against each other: e.g. one position against a whole
+    catalogue, or two catalogues row by row, in a single call.
 
-    dRA = cRA-gRA
-    dDec = gDec-cDec
-    #cosC = ((numpy.sin(gDec)*numpy.sin(cDec)) +
-        #(numpy.cos(gDec)*numpy.cos(cDec) * numpy.cos(gRA-cRA)))
-    #x = (numpy.cos(cDec)*numpy.sin(gRA-cRA))/cosC
-    #y = (((numpy.cos(gDec)*numpy.sin(cDec)) - (numpy.sin(gDec) *
-        #numpy.cos(cDec)*numpy.cos(gRA-cRA)))/cosC)
-    #r = numpy.degrees(numpy.sqrt(x*x+y*y))
-    
-    # use Pythagoras approximation if rad < 1 arcsec
-    if rad<0.000004848:
-      rad=numpy.degrees(numpy.sqrt((numpy.cos(cDec)*dRA)**2+dDec**2))
+    The Vincenty formula (arctan2 of the norms of the cross and dot products)
+    is used, so the separations are accurate at all scales, from well below
+    1 arcsec up to 180 deg. Unlike calcAngSepDeg, no strings are accepted.
+
+    @type RADeg1: float or numpy array
+    @param RADeg1: R.A. in decimal degrees for position 1
+    @type decDeg1: float or numpy array
+    @param decDeg1: dec. in decimal degrees for position 1
+    @type RADeg2: float or numpy array
+    @param RADeg2: R.A. in decimal degrees for position 2
+    @type decDeg2: float or numpy array
+    @param decDeg2: dec. in decimal degrees for position 2
+    @rtype: float or numpy array, with the broadcast shape of the inputs
+    @return: angular separations in decimal degrees
+
+    """
+    return calcAngSepDegTrig(precomputeTrig(RADeg1, decDeg1),
+        precomputeTrig(RADeg2, decDeg2))
+
+#-----------------------------------------------------------------------------
+def precomputeTrig(RADeg, decDeg):
+    """Precomputes the terms of positions on the sky (specified in decimal
+    degrees) used by calcAngSepDegTrig, i.e. R.A. in radians and sin, cos of
+    dec. Computing them once for a reference catalogue, the separations of
+    many positions from it need no further trigonometry on its side.
+
+    @type RADeg: float or numpy array
+    @param RADeg: R.A. in decimal degrees
+    @type decDeg: float or numpy array
+    @param decDeg: dec. in decimal degrees
+    @rtype: tuple
+    @return: (R.A. in radians, sin(dec), cos(dec))
+
+    """
+    dec = numpy.radians(numpy.asarray(decDeg, dtype=numpy.float64))
+
+    return (numpy.radians(numpy.asarray(RADeg, dtype=numpy.float64)),
+        numpy.sin(dec), numpy.cos(dec))
+
+#-----------------------------------------------------------------------------
+def calcAngSepDegTrig(trig1, trig2):
+    """Calculates the angular separations (in decimal degrees) of positions
+    given by their precomputed terms (see precomputeTrig). The arrays of the
+    two sets of positions are broadcast against each other.
+
+    Vincenty formula: the separation is the arctan2 of the norms of the
+    cross and dot products of the two unit vectors. Unlike arccos (which
+    loses precision at small separations) or arcsin (near 180 deg), it is
+    accurate at all scales, so no approximation is needed below 1 arcsec.
+
+    @type trig1: tuple
+    @param trig1: (R.A. in radians, sin(dec), cos(dec)) for positions 1
+    @type trig2: tuple
+    @param trig2: (R.A. in radians, sin(dec), cos(dec)) for positions 2
+    @rtype: float or numpy array
+    @return: angular separations in decimal degrees
+
+    """
+    RA1, sinDec1, cosDec1 = trig1
+    RA2, sinDec2, cosDec2 = trig2
+    dRA = RA2-RA1
+    cosDRA = numpy.cos(dRA)
+
+    x = cosDec2*numpy.sin(dRA)
+    y = cosDec1*sinDec2-sinDec1*cosDec2*cosDRA
+    z = sinDec1*sinDec2+cosDec1*cosDec2*cosDRA
+
+    return numpy.degrees(numpy.arctan2(numpy.hypot(x, y), z))
+
+#-----------------------------------------------------------------------------
+class SkyCatalogue:
+    """A fixed catalogue of positions on the sky, for repeated separation,
+    cone and nearest-neighbour queries against it. The terms of the
+    separations (R.A. in radians, sin and cos of dec, see precomputeTrig)
+    and the unit vectors of the objects are computed only once, and the
+    objects are sorted by dec, so that each query only looks at the band
+    of dec it can reach. It is also the spatial index of the cross-matches
+    of the FITS tables (see match_FITS.SkyIndex).
+
+    Usage example::
+
+        master = SkyCatalogue(RADegs, decDegs)
+        seps = master.separation(RADeg, decDeg)
+        rows, seps = master.cone(RADeg, decDeg, 0.5)
+        rows, seps = master.nearest(RADegArray, decDegArray, 1.0/60.0)
+        positions, rows, seps = master.pairs(RADegArray, decDegArray, 1.0/60.0)
+
+    """
+    def __init__(self, RADeg, decDeg):
+        """Builds the catalogue.
+
+        @type RADeg: numpy array
+        @param RADeg: R.A. in decimal degrees of the objects
+        @type decDeg: numpy array
+        @param decDeg: dec. in decimal degrees of the objects
+
+        """
+        self.RADeg = numpy.atleast_1d(numpy.asarray(RADeg, dtype=numpy.float64))
+        self.decDeg = numpy.atleast_1d(numpy.asarray(decDeg, dtype=numpy.float64))
+        self.trig = precomputeTrig(self.RADeg, self.decDeg)
+        # undefined (NaN) positions are sorted at the end, out of every band
+        decKey = numpy.where(numpy.isfinite(self.RADeg), self.decDeg, numpy.nan)
+        self.order = numpy.argsort(decKey, kind='mergesort')
+        self.decSorted = decKey[self.order]
+        self.xyzSorted = _unitVectors(self.trig)[self.order]
+
+    def __len__(self):
+        return len(self.RADeg)
+
+    def separation(self, RADeg, decDeg):
+        """Calculates the separations of one or more positions from all the
+        objects of the catalogue.
+
+        @type RADeg: float or numpy array
+        @param RADeg: R.A. in decimal degrees of the position(s)
+        @type decDeg: float or numpy array
+        @param decDeg: dec. in decimal degrees of the position(s)
+        @rtype: numpy array
+        @return: separations in decimal degrees, of shape (N) for a single
+        position and (M, N) for M positions, N being the size of the catalogue
+
+        """
+        trig = precomputeTrig(RADeg, decDeg)
+        if numpy.ndim(trig[0]) > 0:
+            trig = tuple([t.ravel()[:, numpy.newaxis] for t in trig])
+
+        return calcAngSepDegTrig(trig, self.trig)
+
+    def pairs(self, RADeg, decDeg, radiusDeg):
+        """Finds all the objects of the catalogue within radiusDeg of each
+        position. Each position is compared only with the objects in its dec
+        band, through the dot products of the unit vectors; the separations
+        of the pairs found are then computed exactly (see calcAngSepDegTrig).
+
+        @type RADeg: float or numpy array
+        @param RADeg: R.A. in decimal degrees of the positions
+        @type decDeg: float or numpy array
+        @param decDeg: dec. in decimal degrees of the positions
+        @type radiusDeg: float
+        @param radiusDeg: maximum separation in decimal degrees
+        @rtype: tuple
+        @return: (indices of the positions, rows of the objects, separations
+        in decimal degrees) of the pairs, sorted by position and separation
+
+        """
+        RADeg = numpy.atleast_1d(numpy.asarray(RADeg, dtype=numpy.float64))
+        decDeg = numpy.atleast_1d(numpy.asarray(decDeg, dtype=numpy.float64))
+        trig = precomputeTrig(RADeg, decDeg)
+        xyz = _unitVectors(trig)
+        lo = numpy.searchsorted(self.decSorted, decDeg-radiusDeg, side='left')
+        hi = numpy.searchsorted(self.decSorted, decDeg+radiusDeg, side='right')
+        # the dot products only select the candidates: small margin
+        minDot = numpy.cos(numpy.radians(min(radiusDeg+1e-6, 180.0)))
+
+        positions = []
+        sortedRows = []
+        for i in numpy.flatnonzero((hi > lo) & numpy.isfinite(RADeg) & numpy.isfinite(decDeg)):
+            dot = self.xyzSorted[lo[i]:hi[i]].dot(xyz[i])
+            inside = numpy.flatnonzero(dot >= minDot)
+            positions.append(numpy.zeros(len(inside), dtype=int)+i)
+            sortedRows.append(lo[i]+inside)
+        if len(positions) == 0:
+            return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int), numpy.zeros(0)
+        positions = numpy.concatenate(positions)
+        rows = self.order[numpy.concatenate(sortedRows)]
+
+        seps = calcAngSepDegTrig(tuple([t[positions] for t in trig]),
+            tuple([t[rows] for t in self.trig]))
+        inside = seps <= radiusDeg
+        positions = positions[inside]
+        rows = rows[inside]
+        seps = seps[inside]
+        order = numpy.lexsort((seps, positions))
+
+        return positions[order], rows[order], seps[order]
+
+    def cone(self, RADeg, decDeg, radiusDeg):
+        """Finds the objects of the catalogue within radiusDeg of a position.
+
+        @type RADeg: float
+        @param RADeg: R.A. in decimal degrees of the centre of the cone
+        @type decDeg: float
+        @param decDeg: dec. in decimal degrees of the centre of the cone
+        @type radiusDeg: float
+        @param radiusDeg: radius of the cone in decimal degrees
+        @rtype: tuple
+        @return: (rows, separations in decimal degrees) of the objects in
+        the cone, sorted by separation
+
+        """
+        positions, rows, seps = self.pairs(RADeg, decDeg, radiusDeg)
+
+        return rows, seps
+
+    def nearest(self, RADeg, decDeg, radiusDeg=5.0/60.0):
+        """Finds the nearest object of the catalogue to each position, within
+        radiusDeg (default is 5 arcmin, the default radius of the matches of
+        the FITS tables). Large radii make each position scan a wide band of
+        dec: keep it as small as the problem allows.
+
+        @type RADeg: float or numpy array
+        @param RADeg: R.A. in decimal degrees of the positions
+        @type decDeg: float or numpy array
+        @param decDeg: dec. in decimal degrees of the positions
+        @type radiusDeg: float
+        @param radiusDeg: maximum separation in decimal degrees
+        @rtype: tuple
+        @return: (rows, separations in decimal degrees) of the nearest
+        objects; -1 and NaN for the positions with no object within radiusDeg
+
+        """
+        numPositions = len(numpy.atleast_1d(RADeg))
+        rows = numpy.zeros(numPositions, dtype=int)-1
+        seps = numpy.zeros(numPositions)+numpy.nan
+        positions, pairRows, pairSeps = self.pairs(RADeg, decDeg, radiusDeg)
+
+        # the pairs are sorted by separation: the first one of each position
+        first = numpy.ones(len(positions), dtype=bool)
+        first[1:] = positions[1:] != positions[:-1]
+        rows[positions[first]] = pairRows[first]
+        seps[positions[first]] = pairSeps[first]
+
+        return rows, seps
+
+#-----------------------------------------------------------------------------
+def _unitVectors(trig):
+    """Unit vectors (N, 3) of the positions given by precomputeTrig."""
+    RARad, sinDec, cosDec = trig
+    return numpy.column_stack([cosDec*numpy.cos(RARad),
+        cosDec*numpy.sin(RARad), sinDec])
 
-    return rad
-    
 #-----------------------------------------------------------------------------
 def calcAngSepDegPythagoras(RADeg1, decDeg1, RADeg2, decDeg2):
     # ** ORIGINAL CODE **
@@ -353,53 +770,53 @@ def shiftRADec(ra1, dec1, deltaRA, deltaDec):
     """Computes new right ascension and declination shifted from the original
     by some delta RA and delta DEC. Input position is decimal degrees. Shifts
     (deltaRA, deltaDec) are arcseconds, and output is decimal degrees. Based on
-    an IDL routine of the same name.
+    an IDL routine of the same name. Positions and shifts can be arrays (of
+    broadcastable shapes), e.g. to shift every object of a catalogue at once.
 
-    @param ra1: float
+    @param ra1: float or numpy array
     @type ra1: R.A. in decimal degrees
-    @param dec1: float
+    @param dec1: float or numpy array
     @type dec1: dec. in decimal degrees
-    @param deltaRA: float
+    @param deltaRA: float or numpy array
     @type deltaRA: shift in R.A. in arcseconds
-    @param deltaDec: float
+    @param deltaDec: float or numpy array
     @type deltaDec: shift in dec. in arcseconds
-    @rtype: float [newRA, newDec]
+    @rtype: float [newRA, newDec], or numpy arrays
     @return: shifted R.A. and dec.
 
     """
 
-    d2r = math.pi/180.
-    as2r = math.pi/648000.
+    d2r = numpy.pi/180.
+    as2r = numpy.pi/648000.
 
     # Convert everything to radians
-    rara1 = ra1*d2r
-    dcrad1 = dec1*d2r
-    shiftRArad = deltaRA*as2r
-    shiftDCrad = deltaDec*as2r
+    dcrad1 = numpy.asarray(dec1, dtype=numpy.float64)*d2r
+    shiftRArad = numpy.asarray(deltaRA, dtype=numpy.float64)*as2r
 
     # Shift!
-    deldec2 = 0.0
-    sindis = math.sin(shiftRArad / 2.0)
-    sindelRA = sindis / math.cos(dcrad1)
-    delra = 2.0*math.asin(sindelRA) / d2r
+    sindis = numpy.sin(shiftRArad / 2.0)
+    sindelRA = sindis / numpy.cos(dcrad1)
+    delra = 2.0*numpy.arcsin(sindelRA) / d2r
 
     # Make changes
     ra2 = ra1+delra
-    dec2 = dec1 +deltaDec / 3600.0
+    dec2 = dec1 +numpy.asarray(deltaDec, dtype=numpy.float64) / 3600.0
 
     return ra2, dec2
 
 #-----------------------------------------------------------------------------
 def convertCoords(inputSystem, outputSystem, coordX, coordY, epoch):
     """Converts specified coordinates (given in decimal degrees) between J2000,
-    B1950, and Galactic.
+    B1950, Galactic and ecliptic. Uses L{convertCoordsArray}, which gives the
+    same results as the wcscon routine of WCSTools (see
+    L{validateConvertCoords}).
 
     @type inputSystem: string
     @param inputSystem: system of the input coordinates (either "J2000",
-        "B1950" or "GALACTIC")
+        "B1950", "GALACTIC" or "ECLIPTIC")
     @type outputSystem: string
     @param outputSystem: system of the returned coordinates (either "J2000",
-        "B1950" or "GALACTIC")
+        "B1950", "GALACTIC" or "ECLIPTIC")
     @type coordX: float
     @param coordX: longitude coordinate in decimal degrees, e.g. R. A.
     @type coordY: float
@@ -411,74 +828,387 @@ def convertCoords(inputSystem, outputSystem, coordX, coordY, epoch):
 
     """
 
-    if inputSystem=="J2000" or inputSystem=="B1950" or inputSystem=="GALACTIC":
-        if outputSystem=="J2000" or outputSystem=="B1950" or \
-            outputSystem=="GALACTIC":
+    return convertCoordsArray(inputSystem, outputSystem, float(coordX),
+                              float(coordY), epoch)
+
+#-----------------------------------------------------------------------------
+# Rotation matrices from the equatorial (J2000/FK5, B1950/FK4) to the Galactic
+# frame, as used by the wcscon routines of WCSTools
+_J2000_TO_GALACTIC = numpy.array([
+    [-0.054875539726, -0.873437108010, -0.483834985808],
+    [ 0.494109453312, -0.444829589425,  0.746982251810],
+    [-0.867666135858, -0.198076386122,  0.455983795705]])
+
+_B1950_TO_GALACTIC = numpy.array([
+    [-0.066988739415, -0.872755765852, -0.483538914632],
+    [ 0.492728466075, -0.450346958020,  0.744584633283],
+    [-0.867600811151, -0.188374601723,  0.460199784784]])
+
+# FK4 <-> FK5 (B1950 <-> J2000) transformation of position+velocity 6-vectors
+# (velocities in arcsec per century) and E-terms of aberration (A, in radians,
+# and its rate ADOT), as in the fk425/fk524 routines of wcscon (from SLALIB)
+_FK4_E_TERMS = numpy.array([-1.62557e-6, -0.31919e-6, -0.13843e-6])
+_FK4_E_TERMS_RATE = numpy.array([1.245e-3, -1.580e-3, -0.659e-3])
+
+_FK4_TO_FK5 = numpy.array([
+    [ 0.9999256782, -0.0111820611, -0.0048579477,
+      0.00000242395018, -0.00000002710663, -0.00000001177656],
+    [ 0.0111820610,  0.9999374784, -0.0000271765,
+      0.00000002710663,  0.00000242397878, -0.00000000006587],
+    [ 0.0048579479, -0.0000271474,  0.9999881997,
+      0.00000001177656, -0.00000000006582,  0.00000242410173],
+    [-0.000551, -0.238565,  0.435739, 0.99994704, -0.01118251, -0.00485767],
+    [ 0.238514, -0.002667, -0.008541, 0.01118251,  0.99995883, -0.00002718],
+    [-0.435623,  0.012254,  0.002117, 0.00485767, -0.00002714,  1.00000956]])
+
+_FK5_TO_FK4 = numpy.array([
+    [ 0.9999256795,  0.0111814828,  0.0048590039,
+     -0.00000242389840, -0.00000002710544, -0.00000001177742],
+    [-0.0111814828,  0.9999374849, -0.0000271771,
+      0.00000002710544, -0.00000242392702,  0.00000000006585],
+    [-0.0048590040, -0.0000271557,  0.9999881946,
+      0.00000001177742,  0.00000000006585, -0.00000242404995],
+    [-0.000551,  0.238509, -0.435614, 0.99990432,  0.01118145,  0.00485852],
+    [-0.238560, -0.002667,  0.012254, -0.01118145, 0.99991613, -0.00002717],
+    [ 0.435730, -0.008541,  0.002117, -0.00485852, -0.00002716, 0.99996684]])
+
+# Radians per year -> arcsec per century
+_PMF = 100.0*60.0*60.0*360.0/(2.0*numpy.pi)
+
+_COORD_SYSTEMS = ["J2000", "B1950", "GALACTIC", "ECLIPTIC"]
+
+#-----------------------------------------------------------------------------
+def _axisRotation(axis, angle):
+    """Matrix rotating the coordinate frame by angle (radians) about the x (0),
+    y (1) or z (2) axis.
+
+    """
+    cosA = numpy.cos(angle)
+    sinA = numpy.sin(angle)
+    i, j = [k for k in range(3) if k != axis]
+    matrix = numpy.identity(3)
+    matrix[i, i] = matrix[j, j] = cosA
+    if axis == 1:
+        matrix[j, i], matrix[i, j] = sinA, -sinA
+    else:
+        matrix[i, j], matrix[j, i] = sinA, -sinA
+    return matrix
+
+#-----------------------------------------------------------------------------
+def _precessionMatrix(fromEpoch, toEpoch):
+    """IAU 1976 (FK5) precession matrix between two epochs, as in the fk5prec
+    routine of wcscon.
+
+    """
+    t0 = (fromEpoch-2000.0)/100.0
+    t = (toEpoch-fromEpoch)/100.0
+    tas2r = numpy.radians(t/3600.0)
+    w = 2306.2181+(1.39656-0.000139*t0)*t0
+    zeta = (w+((0.30188-0.000344*t0)+0.017998*t)*t)*tas2r
+    z = (w+((1.09468+0.000066*t0)+0.018203*t)*t)*tas2r
+    theta = ((2004.3109+(-0.85330-0.000217*t0)*t0)
+             + ((-0.42665-0.000217*t0)-0.041833*t)*t)*tas2r
+
+    return numpy.dot(_axisRotation(2, -z),
+                     numpy.dot(_axisRotation(1, theta), _axisRotation(2, -zeta)))
+
+#-----------------------------------------------------------------------------
+def _systemToJ2000(system, eclipticEpoch):
+    """Matrix rotating unit vectors of the J2000, Galactic or ecliptic (mean
+    ecliptic and equinox of eclipticEpoch, IAU 1976 obliquity) frames into the
+    J2000 frame.
+
+    """
+    if system == "GALACTIC":
+        return _J2000_TO_GALACTIC.T
+    if system == "ECLIPTIC":
+        t = (eclipticEpoch-2000.0)*0.01
+        obliquity = numpy.radians((84381.448+(-46.8150+(-0.00059+0.001813*t)*t)*t)/3600.0)
+        toEcliptic = numpy.dot(_axisRotation(0, obliquity),
+                               _precessionMatrix(2000.0, eclipticEpoch))
+        return toEcliptic.T
+    return numpy.identity(3)
+
+#-----------------------------------------------------------------------------
+def _sphericalToVectors(x, y):
+    """Unit vectors (3, N) of longitudes and latitudes in radians."""
+    cosY = numpy.cos(y)
+    return numpy.array([cosY*numpy.cos(x), cosY*numpy.sin(x), numpy.sin(y)])
+
+#-----------------------------------------------------------------------------
+def _vectorsToSpherical(vectors, velocities=None, years=None):
+    """Longitudes and latitudes in radians of vectors (3, N). If velocities
+    (3, N, in arcsec per century) and years are given, the positions are moved
+    by their proper motions over that number of years.
+
+    """
+    x, y, z = vectors
+    rxySq = x*x+y*y
+    rxy = numpy.sqrt(rxySq)
+    lon = numpy.arctan2(y, x)
+    lat = numpy.arctan2(z, rxy)
+    if velocities is not None and years is not None:
+        xd, yd, zd = velocities
+        pole = rxy < 1e-12
+        rxySq = numpy.where(pole, 1.0, rxySq)
+        rxy = numpy.where(pole, 1.0, rxy)
+        lonRate = numpy.where(pole, 0.0, (x*yd-y*xd)/rxySq)
+        latRate = numpy.where(pole, 0.0,
+                              (zd*rxySq-z*(x*xd+y*yd))/((rxySq+z*z)*rxy))
+        lon = lon+years*lonRate/_PMF
+        lat = lat+years*latRate/_PMF
+
+    return lon, lat
+
+#-----------------------------------------------------------------------------
+def _fk4ToFK5(vectors, years):
+    """J2000 (FK5) longitudes and latitudes in radians of B1950 (FK4) unit
+    vectors (3, N) of objects with no FK4 proper motion: the E-terms are
+    removed, then the 6-vectors are transformed (as in the fk425 routines of
+    wcscon). The positions are moved by the resulting FK5 proper motions over
+    the given years, if not None.
+
+    """
+    w = numpy.dot(_FK4_E_TERMS, vectors)
+    wd = numpy.dot(_FK4_E_TERMS_RATE, vectors)
+    positions = vectors-_FK4_E_TERMS[:, numpy.newaxis]+w*vectors
+    velocities = -_FK4_E_TERMS_RATE[:, numpy.newaxis]+wd*vectors
+    transformed = numpy.dot(_FK4_TO_FK5, numpy.vstack([positions, velocities]))
+
+    return _vectorsToSpherical(transformed[:3], transformed[3:], years)
 
-            outCoords=wcscon.wcscon(wcscon.wcscsys(inputSystem),
-                wcscon.wcscsys(outputSystem), 0, 0, coordX, coordY, epoch)
+#-----------------------------------------------------------------------------
+def _fk5ToFK4(vectors, years):
+    """B1950 (FK4) longitudes and latitudes in radians of J2000 (FK5) unit
+    vectors (3, N) of objects with no FK5 proper motion: the 6-vectors are
+    transformed, then the E-terms are added (as in the fk524 routines of
+    wcscon). The positions are moved by the resulting FK4 proper motions over
+    the given years, if not None.
+
+    """
+    transformed = numpy.dot(_FK5_TO_FK4[:, :3], vectors)
+    positions, velocities = transformed[:3], transformed[3:]
+    w = numpy.dot(_FK4_E_TERMS, positions)
+    wd = numpy.dot(_FK4_E_TERMS_RATE, positions)
+    eTerms = _FK4_E_TERMS[:, numpy.newaxis]
+    # The E-terms scale with the length of the position they are added to
+    length = numpy.sqrt(numpy.sum(positions**2, axis=0))
+    length = numpy.sqrt(numpy.sum((positions+eTerms*length-w*positions)**2, axis=0))
+    positions = positions+eTerms*length-w*positions
+    velocities = velocities+_FK4_E_TERMS_RATE[:, numpy.newaxis]*length-wd*positions
+
+    return _vectorsToSpherical(positions, velocities, years)
 
-            return outCoords
+#-----------------------------------------------------------------------------
+def convertCoordsArray(inputSystem, outputSystem, coordX, coordY, epoch=2000.0):
+    """Converts arrays of coordinates (given in decimal degrees) between J2000,
+    B1950, Galactic and ecliptic, with no calls to wcscon. The unit vectors of
+    all the coordinates are rotated at once by precomputed matrices; the
+    conversions between B1950 (FK4) and the other systems but Galactic also
+    remove or add the E-terms of aberration, as wcscon does. The results agree
+    with the wcscon routine of WCSTools well below the milli-arcsecond level
+    (see L{validateConvertCoords}).
+
+    @type inputSystem: string
+    @param inputSystem: system of the input coordinates (either "J2000",
+        "B1950", "GALACTIC" or "ECLIPTIC")
+    @type outputSystem: string
+    @param outputSystem: system of the returned coordinates (either "J2000",
+        "B1950", "GALACTIC" or "ECLIPTIC")
+    @type coordX: float or numpy array
+    @param coordX: longitude coordinates in decimal degrees, e.g. R. A.
+    @type coordY: float or numpy array
+    @param coordY: latitude coordinates in decimal degrees, e.g. dec.
+    @type epoch: float
+    @param epoch: Besselian epoch of the input coordinates, used as in
+        wcscon: the FK4 <-> FK5 positions are moved by the proper motions
+        that the conversion gives to objects at rest, and the ecliptic is
+        the mean ecliptic of the epoch. 0 or None for no epoch
+    @rtype: list
+    @return: [longitudes, latitudes] in decimal degrees in requested output
+        system (numpy arrays, or floats if the input coordinates are scalars)
 
-    raise Exception("inputSystem and outputSystem must be 'J2000', 'B1950'"
-                    "or 'GALACTIC'")
+    """
+    if inputSystem not in _COORD_SYSTEMS or outputSystem not in _COORD_SYSTEMS:
+        raise Exception("inputSystem and outputSystem must be 'J2000', 'B1950',"
+                        " 'GALACTIC' or 'ECLIPTIC'")
+
+    # Epochs used by wcscon: the (fictitious) proper motions of the FK4 <-> FK5
+    # conversions apply from J2000 (B1950 -> J2000) or B1950 (J2000 -> B1950);
+    # the ecliptic is that of the epoch (of B1950 or J2000 if no epoch)
+    hasEpoch = epoch is not None and epoch > 0
+    if hasEpoch:
+        eclipticEpoch = epoch
+    elif "B1950" in [inputSystem, outputSystem]:
+        eclipticEpoch = 1950.0
+    else:
+        eclipticEpoch = 2000.0
+
+    x = numpy.radians(numpy.asarray(coordX, dtype=float))
+    y = numpy.radians(numpy.asarray(coordY, dtype=float))
+    if inputSystem == outputSystem:
+        lon, lat = x, y
+    else:
+        vectors = _sphericalToVectors(x, y).reshape(3, -1)
+        if [inputSystem, outputSystem] == ["B1950", "GALACTIC"]:
+            lon, lat = _vectorsToSpherical(numpy.dot(_B1950_TO_GALACTIC, vectors))
+        elif [inputSystem, outputSystem] == ["GALACTIC", "B1950"]:
+            lon, lat = _vectorsToSpherical(numpy.dot(_B1950_TO_GALACTIC.T, vectors))
+        elif inputSystem == "B1950":
+            if outputSystem == "J2000":
+                years = epoch-2000.0 if hasEpoch else None
+            else:
+                years = eclipticEpoch-2000.0
+            lon, lat = _fk4ToFK5(vectors, years)
+            if outputSystem != "J2000":
+                rotation = _systemToJ2000(outputSystem, eclipticEpoch).T
+                lon, lat = _vectorsToSpherical(numpy.dot(rotation,
+                                               _sphericalToVectors(lon, lat)))
+        elif outputSystem == "B1950":
+            if inputSystem == "J2000":
+                years = epoch-1950.0 if hasEpoch else None
+            else:
+                years = eclipticEpoch-1950.0
+            rotation = _systemToJ2000(inputSystem, eclipticEpoch)
+            lon, lat = _fk5ToFK4(numpy.dot(rotation, vectors), years)
+        else:
+            rotation = numpy.dot(_systemToJ2000(outputSystem, eclipticEpoch).T,
+                                 _systemToJ2000(inputSystem, eclipticEpoch))
+            lon, lat = _vectorsToSpherical(numpy.dot(rotation, vectors))
+        lon = lon.reshape(x.shape)
+        lat = lat.reshape(x.shape)
+
+    lon = numpy.degrees(lon) % 360.0
+    lat = numpy.degrees(lat)
+    if lon.ndim == 0:
+        return [float(lon), float(lat)]
+    return [lon, lat]
+
+#-----------------------------------------------------------------------------
+def validateConvertCoords(numObjects=10000, epoch=2000.0):
+    """Compares L{convertCoordsArray} with the wcscon routine of WCSTools, for
+    all the pairs of coordinate systems, on random positions over the whole
+    sky. Needs PyWCSTools.
+
+    @type numObjects: int
+    @param numObjects: number of random positions
+    @type epoch: float
+    @param epoch: epoch of the input coordinates
+    @rtype: dictionary
+    @return: maximum separation in arcsec between the two conversions, for
+        each (inputSystem, outputSystem)
+
+    """
+    if wcscon is None:
+        raise Exception("PyWCSTools is needed to compare with wcscon")
+
+    coordX = numpy.random.uniform(0.0, 360.0, numObjects)
+    coordY = numpy.degrees(numpy.arcsin(numpy.random.uniform(-1.0, 1.0,
+                                                              numObjects)))
+    maxSeps = {}
+    for inputSystem in _COORD_SYSTEMS:
+        for outputSystem in _COORD_SYSTEMS:
+            if inputSystem == outputSystem:
+                continue
+            lon, lat = convertCoordsArray(inputSystem, outputSystem, coordX,
+                                          coordY, epoch)
+            wcsLon = numpy.zeros(numObjects)
+            wcsLat = numpy.zeros(numObjects)
+            for i in range(numObjects):
+                wcsLon[i], wcsLat[i] = wcscon.wcscon(
+                    wcscon.wcscsys(inputSystem), wcscon.wcscsys(outputSystem),
+                    0, 0, coordX[i], coordY[i], epoch)
+            seps = calcAngSepDegArray(lon, lat, wcsLon, wcsLat)
+            maxSeps[(inputSystem, outputSystem)] = seps.max()*3600.0
+
+    return maxSeps
 
 #-----------------------------------------------------------------------------
 def calcRADecSearchBox(RADeg, decDeg, radiusSkyDeg):
     """Calculates minimum and maximum RA, dec coords needed to define a box
     enclosing a circle of radius radiusSkyDeg around the given RADeg, decDeg
-    coordinates. Useful for freeform queries of e.g. SDSS, UKIDSS etc.. Uses
-    L{calcAngSepDeg}, so has the same limitations.
-
-    @type RADeg: float
+    coordinates. Useful for freeform queries of e.g. SDSS, UKIDSS etc., or as
+    a prefilter of cone searches in a database. The box is computed
+    analytically: its RA half-width is asin(sin(radius)/cos(dec)), the widest
+    extent of the circle (reached north or south of the centre). Circles
+    containing a pole give the whole RA range (0, 360) and a dec limit of
+    +/-90. RAMin and RAMax are not wrapped into 0-360, so that RAMin can be
+    negative, or RAMax above 360, for circles across RA = 0.
+
+    Centres and radii can be arrays (of broadcastable shapes), to get the
+    boxes of every object in a catalogue at once.
+
+    @type RADeg: float or numpy array
     @param RADeg: RA coordinate of centre of search region
-    @type decDeg: float
+    @type decDeg: float or numpy array
     @param decDeg: dec coordinate of centre of search region
-    @type radiusSkyDeg: float
+    @type radiusSkyDeg: float or numpy array
     @param radiusSkyDeg: radius in degrees on the sky used to define search
         region
     @rtype: list
     @return: [RAMin, RAMax, decMin, decMax] - coordinates in decimal degrees
-        defining search box
+        defining search box (floats, or numpy arrays)
 
     """
-
-    tolerance = 1e-5  # in degrees on sky
-    targetHalfSizeSkyDeg = radiusSkyDeg
-    funcCalls = ["calcAngSepDeg(RADeg, decDeg, guess, decDeg)",
-               "calcAngSepDeg(RADeg, decDeg, guess, decDeg)",
-               "calcAngSepDeg(RADeg, decDeg, RADeg, guess)",
-               "calcAngSepDeg(RADeg, decDeg, RADeg, guess)"]
-    coords = [RADeg, RADeg, decDeg, decDeg]
-    signs = [1.0, -1.0, 1.0, -1.0]
-    results = []
-    for f, c, sign in zip(funcCalls, coords, signs):
-        # Initial guess range
-        maxGuess = sign*targetHalfSizeSkyDeg*10.0
-        minGuess = sign*targetHalfSizeSkyDeg/10.0
-        guessStep = (maxGuess-minGuess)/10.0
-        guesses = numpy.arange(minGuess+c, maxGuess+c, guessStep)
-        for i in range(50):
-            minSizeDiff = 1e6
-            bestGuess = None
-            for guess in guesses:
-                sizeDiff = abs(eval(f)-targetHalfSizeSkyDeg)
-                if sizeDiff < minSizeDiff:
-                    minSizeDiff = sizeDiff
-                    bestGuess = guess
-            if minSizeDiff < tolerance:
-                break
-            else:
-                guessRange = abs((maxGuess-minGuess))
-                maxGuess = bestGuess+guessRange/4.0
-                minGuess = bestGuess-guessRange/4.0
-                guessStep = (maxGuess-minGuess)/10.0
-                guesses = numpy.arange(minGuess, maxGuess, guessStep)
-        results.append(bestGuess)
-
-    RAMax = results[0]
-    RAMin = results[1]
-    decMax = results[2]
-    decMin = results[3]
-
+    RADeg = numpy.asarray(RADeg, dtype=numpy.float64)
+    decDeg = numpy.asarray(decDeg, dtype=numpy.float64)
+    radiusSkyDeg = numpy.asarray(radiusSkyDeg, dtype=numpy.float64)
+
+    decMax = decDeg+radiusSkyDeg
+    decMin = decDeg-radiusSkyDeg
+    polar = (decMax >= 90.0) | (decMin <= -90.0)
+
+    # The circle does not reach the poles here, so that sin(r) < cos(dec)
+    sinDelRA = numpy.sin(numpy.radians(numpy.where(polar, 0.0, radiusSkyDeg)))
+    sinDelRA = sinDelRA/numpy.cos(numpy.radians(numpy.where(polar, 0.0, decDeg)))
+    delRA = numpy.degrees(numpy.arcsin(numpy.clip(sinDelRA, -1.0, 1.0)))
+
+    RAMin = numpy.where(polar, 0.0, RADeg-delRA)
+    RAMax = numpy.where(polar, 360.0, RADeg+delRA)
+    decMin = numpy.maximum(decMin, -90.0)
+    decMax = numpy.minimum(decMax, 90.0)
+
+    if RAMin.ndim == 0:
+        return [float(RAMin), float(RAMax), float(decMin), float(decMax)]
     return [RAMin, RAMax, decMin, decMax]
+
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+
+    # Timing of the scalar and array conversions on a random catalogue
+    import time
+    numObjects = 100000
+    RADeg = numpy.random.uniform(0.0, 360.0, numObjects)
+    decDeg = numpy.degrees(numpy.arcsin(numpy.random.uniform(-1.0, 1.0, numObjects)))
+
+    for label, scalarFunc, arrayFunc, values, scalarToDeg, arrayToDeg in [
+            ("decimal2hms", decimal2hms, decimal2hmsArray, RADeg, hms2decimal, hms2decimalArray),
+            ("decimal2dms", decimal2dms, decimal2dmsArray, decDeg, dms2decimal, dms2decimalArray)]:
+        start = time.time()
+        scalarStrings = [scalarFunc(value, ":") for value in values]
+        scalarTime = time.time()-start
+        start = time.time()
+        arrayStrings = arrayFunc(values)
+        arrayTime = time.time()-start
+        scalarDiff = numpy.abs(numpy.array([scalarToDeg(s, ":") for s in scalarStrings])-values)
+        arrayDiff = numpy.abs(arrayToDeg(arrayStrings)-values)
+        print "%s: %i values, scalar %.3f s, array %.3f s (x%.0f faster)" \
+              % (label, numObjects, scalarTime, arrayTime, scalarTime/arrayTime)
+        print "    max round-trip difference: scalar %.4f arcsec, array %.4f arcsec" \
+              % (scalarDiff.max()*3600.0, arrayDiff.max()*3600.0)
+
+    numObjects = 10000
+    start = time.time()
+    scalarCoords = [convertCoords("J2000", "GALACTIC", RADeg[i], decDeg[i], 2000.0)
+                    for i in range(numObjects)]
+    scalarTime = time.time()-start
+    start = time.time()
+    arrayCoords = convertCoordsArray("J2000", "GALACTIC", RADeg[:numObjects],
+                                     decDeg[:numObjects], 2000.0)
+    arrayTime = time.time()-start
+    print "convertCoords: %i values, scalar %.3f s, array %.3f s (x%.0f faster)" \
+          % (numObjects, scalarTime, arrayTime, scalarTime/arrayTime)
+    if wcscon is not None:
+        for systems, maxSep in sorted(validateConvertCoords(numObjects).items()):
+            print "    %s -> %s: max difference from wcscon %.2e arcsec" \
+                  % (systems[0], systems[1], maxSep)
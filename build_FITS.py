@@ -0,0 +1,203 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Builder of FITS binary tables, used by create_FITS.py.
+
+The table is allocated once, as a single record array with the FITS
+(big-endian) types of the fields, and filled column by column: pyfits
+takes it as the data of the BINTABLE with no further copies, instead of
+building one Column at a time and copying the whole table at each step.
+
+ASCII tables larger than the memory are converted in two passes:
+  1. scan_ascii_table : reads the file chunk by chunk to count the rows
+                        and to find the formats (and string widths);
+  2. stream_table     : parses it again chunk by chunk, writing each chunk
+                        straight into the data area of the FITS file.
+Only one chunk of rows is in memory at any time.
+
+The progress of the conversion (time, rows/s and bytes/s of each phase) is
+reported by ConversionLog, which prints nothing in quiet mode.
+'''
+
+import numpy as np
+import sys, time
+import pyfits
+
+#Use the provided astCoords.py file rather than the default module of astLib
+import astCoords
+from read_ASCII import read_ascii_chunks
+from schema_FITS import tform_code, infer_tform, combine_tforms, convert_strings, fits_array
+
+#NumPy types of the FITS data types, as stored in the file
+_TFORM_DTYPES = {'L': 'i1', 'B': 'u1', 'I': '>i2', 'J': '>i4', 'K': '>i8', 'E': '>f4', 'D': '>f8'}
+
+#Rows parsed and written at a time by the streaming conversion
+STREAM_CHUNK_ROWS = 100000
+
+class ConversionLog:
+  '''
+  Progress of a conversion, phase by phase.
+
+  log.start(phase)           -> start (and time) a new phase
+  log.update(rows)           -> rows processed so far in the phase (e.g. chunks)
+  log.done(rows, nbytes)     -> end the phase, with its time and rates
+  log.info(message)          -> any other message
+  log.summary()              -> time of each phase and total time
+
+  Nothing is printed if 'quiet' is True.
+  '''
+  def __init__(self, quiet=False, out=sys.stdout):
+    self.quiet = quiet
+    self._out = out
+    self._phase = None
+    self._start = 0.
+    self.timings = []
+
+  def _write(self, text):
+    if self.quiet: return
+    self._out.write(text)
+    self._out.flush()
+
+  def info(self, message):
+    self._write("\n\t%s\n" % message)
+
+  def start(self, phase):
+    self._phase = phase
+    self._start = time.time()
+    self._write("\n\t>> %s ...\n" % phase)
+
+  def update(self, rows):
+    elapsed = max(time.time() - self._start, 1e-6)
+    self._write("\t   %i rows (%.0f rows/s)    \r" % (rows, rows / elapsed))
+
+  def done(self, rows=None, nbytes=None):
+    elapsed = time.time() - self._start
+    self.timings.append((self._phase, elapsed))
+    rates = []
+    if rows is not None: rates.append("%i rows, %.0f rows/s" % (rows, rows / max(elapsed, 1e-6)))
+    if nbytes is not None: rates.append("%.1f MB/s" % (nbytes / 1024.**2 / max(elapsed, 1e-6)))
+    self._write("\t   %s: %.2f s%s\n" % (self._phase, elapsed, (" (" + ", ".join(rates) + ")") if rates else ""))
+
+  def summary(self):
+    self._write("\n\t>> Total time: %.2f s (%s)\n" % (sum(t for phase, t in self.timings), ", ".join("%s %.2f s" % item for item in self.timings)))
+
+def tform_dtype(tform):
+  '''NumPy type of the cells of a FITS column of format 'tform' (e.g. '20A' -> 'S20', 'E' -> '>f4')'''
+  code = tform_code(tform)
+  if code == 'A':
+    width = tform.strip()[:-1]
+    return 'S%i' % int(width or 1)
+  if code not in _TFORM_DTYPES or tform.strip()[:-1] not in ['', '1']:
+    raise ValueError("FITS format '%s' not supported" % tform)
+  return _TFORM_DTYPES[code]
+
+def fits_column(field, strings, tform):
+  '''
+  Column of ASCII strings converted for the FITS format 'tform'. RA and DEC
+  in H:M:S and D:M:S format are converted in decimal degrees.
+  '''
+  if field == 'RA' and tform_code(tform) != 'A': return astCoords.hms2decimalArray(strings)
+  if field == 'DEC' and tform_code(tform) != 'A': return astCoords.dms2decimalArray(strings)
+  return fits_array(strings, tform)
+
+def _allocate(names, formats, nrows):
+  return np.zeros(nrows, dtype=[(str(name), tform_dtype(tform)) for name, tform in zip(names, formats)])
+
+def _fill(data, name, tform, column):
+  '''Copy a column into the record array (logical values as 'T'/'F', as in the FITS files)'''
+  if tform_code(tform) == 'L': data[name] = np.where(np.asarray(column, dtype=bool), ord('T'), ord('F'))
+  else: data[name] = column
+
+def build_table(names, formats, units, columns):
+  '''
+  BinTableHDU of the fields 'names' with the given formats (TFORM) and units
+  (TUNIT), filled with 'columns' (one array per field, all of the same length).
+  '''
+  nrows = 0
+  if len(columns) > 0: nrows = len(columns[0])
+  data = _allocate(names, formats, nrows)
+
+  header = pyfits.Header()
+  for i, (name, tform, column) in enumerate(zip(names, formats, columns)):
+    _fill(data, name, tform, column)
+    header.update('TTYPE%i' % (i+1), str(name))
+    header.update('TFORM%i' % (i+1), tform)
+
+  hdu = pyfits.BinTableHDU(data=data, header=header)
+  for i, unit in enumerate(units):
+    if unit: hdu.header.update('TUNIT%i' % (i+1), unit, after='TFORM%i' % (i+1))
+  return hdu
+
+def table_header(names, formats, units, nrows):
+  '''Header of a BINTABLE of 'nrows' rows, with no data allocated (see stream_table)'''
+  hdu = build_table(names, formats, units, [[]] * len(names))
+  hdu.header.update('NAXIS2', nrows)
+  return hdu.header
+
+def scan_ascii_table(filename, fields_schema, delimiter=None, chunk_rows=STREAM_CHUNK_ROWS, log=None):
+  '''
+  First pass of the streaming conversion: read the ASCII table a chunk at a
+  time and return (names, formats, units, nrows). The formats are taken from
+  'fields_schema', or inferred from all the chunks for the fields not in it.
+  The rows read so far are given to 'log' (ConversionLog), if any.
+  '''
+  names, nrows = [], 0
+  inferred, widths = {}, {}
+  for chunk in read_ascii_chunks(filename, delimiter, chunk_rows):
+    names = chunk.names
+    nrows += chunk.nrows
+    if log is not None: log.update(nrows)
+    for name in names:
+      if name in fields_schema: continue
+      strings = chunk.strings(name)
+      widths[name] = max(widths.get(name, 1), chunk.max_length(name))
+      #Chunks with no defined values tell nothing about the format
+      if convert_strings(strings, 'A')[1].any(): inferred.setdefault(name, []).append(infer_tform(strings))
+
+  formats, units = [], []
+  for name in names:
+    if name in fields_schema:
+      formats.append(fields_schema.tform(name))
+      units.append(fields_schema.tunit(name))
+    else:
+      formats.append(combine_tforms(inferred.get(name, []), widths.get(name, 1)))
+      units.append('None')
+  return names, formats, units, nrows
+
+def stream_table(fits_file, header, filename, delimiter=None, chunk_rows=STREAM_CHUNK_ROWS, log=None):
+  '''
+  Second pass of the streaming conversion: write 'header' (see table_header)
+  into 'fits_file', then parse the ASCII table a chunk at a time and write
+  each chunk, in the FITS binary format, right after the previous one.
+  The rows written so far are given to 'log' (ConversionLog), if any.
+  '''
+  names = [header['TTYPE%i' % (i+1)] for i in range(header['TFIELDS'])]
+  formats = [header['TFORM%i' % (i+1)] for i in range(header['TFIELDS'])]
+  hdu = pyfits.StreamingHDU(fits_file, header)
+  rows = 0
+  try:
+    for chunk in read_ascii_chunks(filename, delimiter, chunk_rows):
+      if chunk.nrows == 0: continue
+      data = _allocate(names, formats, chunk.nrows)
+      for name, tform in zip(names, formats):
+        _fill(data, name, tform, fits_column(name, chunk.strings(name), tform))
+      hdu.write(data.view(np.uint8))
+      rows += chunk.nrows
+      if log is not None: log.update(rows)
+  finally:
+    hdu.close()
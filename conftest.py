@@ -0,0 +1,13 @@
+'''
+Configuration of the tests (python -m pytest): the scripts import the
+astCoords.py provided with them (astCoords_ANchanges.py, see
+edits_FITS_table.py), used here as astCoords if no such module is installed.
+'''
+
+import sys
+
+try:
+  import astCoords
+except ImportError:
+  import astCoords_ANchanges
+  sys.modules['astCoords'] = astCoords_ANchanges
@@ -24,7 +24,17 @@ of the labels and has to be UNCOMMENTED.
 
 The syntax is:
 
-$ python create_FITS.py <ascii_file> <table>.fits
+$ python create_FITS.py <ascii_file> <table>.fits [--stream] [--processes=<number>] [--quiet]
+
+With --stream, tables larger than the memory are converted in two passes
+(see build_FITS.py): the file is read a chunk of rows at a time, first to
+find the number of rows and the formats, then to write the data.
+
+Large tables read in memory are parsed by a pool of processes (all the CPUs,
+or the number given with --processes=<number>).
+
+The time and the rates (rows/s, MB/s) of each phase of the conversion are
+printed as it goes; --quiet turns these messages off.
 
 @author: Alessandro NASTASI for IAS - IDOC 
 @date: 04/05/2015
@@ -37,9 +47,10 @@ __date__ = "04/05/2015"
 
 import numpy as np
 import os, sys, re
-import asciidata
 import pyfits
-from astLib import astCoords
+from build_FITS import ConversionLog, build_table, fits_column, scan_ascii_table, stream_table, table_header
+from read_ASCII import read_ascii_table
+from schema_FITS import load_schema, infer_tform
 from datetime import date
 
 class bcolors:
@@ -50,222 +61,98 @@ class bcolors:
     FAIL = '\033[91m'
     ENDC = '\033[0m'
 
-_FIELDS_DICTIONARY = {
-
-  'INDEX': { 'format': 'I', 'unit': 'None' },
-  
-  # ****** ACT ******
-  'INDEX_ACT': { 'format': 'I', 'unit': 'None' },
-  'CATALOG': { 'format': '7A', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'GLON': { 'format': 'E', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'degrees' },
-  #'RA': { 'format': 'E', 'unit': 'degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'degrees' },
-  'SNR': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  'ERR_M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  'Ysz': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ERR_Ysz': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'THETA': { 'format': 'E', 'unit': 'arcmin' },
-  'PAPER': { 'format': '56A', 'unit': 'None' },
-  
-  # ****** AMI ******
-  'INDEX_AMI': { 'format': 'I', 'unit': 'None' },
-  'NAME': { 'format': '18A', 'unit': 'None' },
-  #'RA': { 'format': 'E', 'unit': 'Degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLON': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  #'ALT_NAME': { 'format': '60A', 'unit': 'None' },
-  'COORD_SOURCE': { 'format': '5A', 'unit': 'None' },
-  
-  # ****** CARMA ******
-  'INDEX_CARMA': { 'format': 'I', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'RA': { 'format': 'E', 'unit': 'Degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLON': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  #'COORD_SOURCE': { 'format': '5A', 'unit': 'None' },
-
-  #****** PSZ1 ******
-  'INDEX_PSZ1': { 'format': 'I', 'unit': 'None' },
-  'NAME': { 'format': '18A', 'unit': 'None' },
-  'GLON': { 'format': 'D', 'unit': 'degrees' },
-  'GLAT': { 'format': 'D', 'unit': 'degrees' },
-  'RA': { 'format': 'D', 'unit': 'degrees' },
-  'DEC': { 'format': 'D', 'unit': 'degrees' },
-  'RA_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'DEC_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'REDSHIFT_SOURCE': { 'format': 'I', 'unit': 'None' },
-  'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'ALT_NAME': { 'format': '66A', 'unit': 'None' },
-  'YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'ERRP_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'ERRM_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'ERRP_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'ERRM_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'ERR_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'Y_PSX_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'SN_PSX': { 'format': 'E', 'unit': 'None' },
-  'PIPELINE': { 'format': 'I', 'unit': 'None' },
-  'PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PCCS': { 'format': 'L', 'unit': 'None' },
-  'VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'ID_EXT': { 'format': '25A', 'unit': 'None' },
-  'POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  'SNR': { 'format': 'E', 'unit': 'None' },
-  'COSMO': { 'format': 'L', 'unit': 'None' },
-  'COMMENT': { 'format': 'L', 'unit': 'None' },
-  'QN': { 'format': 'E', 'unit': 'None' }, 
-
-  # ****** PSZ2 ******
-  'INDEX_PSZ2': { 'format': 'I', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'GLON': { 'format': 'D', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'D', 'unit': 'degrees' },
-  #'RA': { 'format': 'D', 'unit': 'degrees' },
-  #'DEC': { 'format': 'D', 'unit': 'degrees' },
-  #'POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  #'PIPELINE': { 'format': 'I', 'unit': 'None' },
-  #'PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PCCS2': { 'format': 'L', 'unit': 'None' },
-  'PSZ': { 'format': 'I', 'unit': 'None' },
-  'IR_FLAG': { 'format': 'I', 'unit': 'None' },
-  'Q_NEURAL': { 'format': 'E', 'unit': 'None' },
-  'Y5R500': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  'Y5R500_ERR': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  'PSZ2_VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'REDSHIFT_ID': { 'format': '25A', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'MSZ': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MSZ_ERR_UP': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MSZ_ERR_LOW': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MCXC': { 'format': '25A', 'unit': 'None' },
-  'REDMAPPER': { 'format': '25A', 'unit': 'None' },
-  'ACT': { 'format': '25A', 'unit': 'None' },
-  'SPT': { 'format': '25A', 'unit': 'None' },
-  'WISE_SIGNF': { 'format': 'E', 'unit': 'None' },
-  'WISE_FLAG': { 'format': 'I', 'unit': 'None' },
-  'AMI_EVIDENCE': { 'format': 'E', 'unit': 'None' },
-  #'COSMO': { 'format': 'L', 'unit': 'None' },
-  'PSZ2_COMMENT': { 'format': '128A', 'unit': 'None' },
-
-  # ****** PLCK ******
-  'INDEX_PLCK': { 'format': 'I', 'unit': 'None' },
+#Registry with the FORMAT and UNITS of the fields (see schema_FITS.py)
+fields_schema = load_schema()
 
-  # ****** SPT ******
-  'INDEX_SPT': { 'format': 'I', 'unit': 'None' },
-  #'CATALOG': { 'format': '7A', 'unit': 'None' },
-  #'NAME': { 'format': '16A', 'unit': 'None' },
-  #'GLON': { 'format': 'E', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'degrees' },
-  #'RA': { 'format': 'E', 'unit': 'degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'degrees' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  #'ERR_M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  'LX': { 'format': 'E', 'unit': '10^44 erg/s' }
-  #'Y': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  #'ERR_Y': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  #'THETA': { 'format': 'E', 'unit': 'arcmin' },
-  #'PAPER': { 'format': '59A', 'unit': 'None' },
-  
-  }
 
+#Files are the arguments, '--' options can be given anywhere
+arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
 
-if (len(sys.argv) > 1):
-    ascii_file = sys.argv[1] 	# Input ASCII table
-    fits_file = sys.argv[2] 	# Output FITS file
+if (len(arguments) > 1):
+    ascii_file = arguments[0] 	# Input ASCII table
+    fits_file = arguments[1] 	# Output FITS file
+    stream = '--stream' in options	# Two-pass conversion, for tables larger than the memory
+    processes = None			# Processes parsing large tables (None = all the CPUs)
+    quiet = '--quiet' in options	# No progress messages
+    for option in options:
+      if option.startswith('--processes='): processes = int(option.split('=', 1)[1]) or None
 else:
-    print "\n\t!! Sintax:\t> python create_FITS.py <ascii_file> <fits_file>\n\n"
+    print "\n\t!! Sintax:\t> python create_FITS.py <ascii_file> <fits_file> [--stream] [--processes=<number>] [--quiet]\n\n"
     exit(0)
 
 #User can define the column delimiter of ASCII table.
-delim = raw_input("\n> Please enter the columns delimiter of the ASCII table (default is ','):\t")
-if not delim:
-  ascii_table=asciidata.open(ascii_file, 'r', delimiter = ',')	# >> ascii_table [COLUMNS] [ROWS] << 
-else:
-  ascii_table=asciidata.open(ascii_file, 'r', delimiter = delim)	# >> ascii_table [COLUMNS] [ROWS] << 
-
-#Read the fields' names
-fields_name = [str(ascii_table[i][0]).strip() for i in range(ascii_table.ncols)]
-
-#Read the 2D array
-ascii_data2D = [[ascii_table[j][i] for j in range(len(fields_name))] for i in range(1,ascii_table.nrows)] # Store all in a 2D array, but without the name line
-
-#Define columns' properties
+delim = raw_input("\n> Please enter the columns delimiter of the ASCII table (leave empty to detect it automatically):\t")
+
+#Time and rates of each phase of the conversion (see build_FITS.ConversionLog)
+log = ConversionLog(quiet)
+ascii_size = os.path.getsize(ascii_file)
+
+if stream:
+  #1st pass: rows, fields' names and formats, reading the table a chunk at a time (see build_FITS.py)
+  log.start("Scanning the ASCII table")
+  fields_name, tform, tunit, nrows = scan_ascii_table(ascii_file, fields_schema, delim, log=log)
+  log.done(nrows, ascii_size)
+  for i, field in enumerate(fields_name):
+    if field not in fields_schema:
+      log.info("-> Format of the new field \"%s\" inferred from the data: %s" % (field, tform[i]))
+  header = table_header(fields_name, tform, tunit, nrows)
 
-tform = []
-tunit = []
+else:
+  #Read the table once, column by column (see read_ASCII.AsciiTable); large files are parsed in parallel
+  log.start("Reading the ASCII table")
+  ascii_table = read_ascii_table(ascii_file, delim, processes)
+  log.done(ascii_table.nrows, ascii_size)
 
-for field in fields_name:
-  if field not in _FIELDS_DICTIONARY:
-    message = "\n\t-> Please enter the format (\'TFORM\') of the new field \"%s\" (e.g.: 5A, E, L, ...): " % (field)
-    tform.append(raw_input(message))
-    message = "\n\t-> Please enter the unit (\'TUNIT\') of the new field \"%s\" (e.g.: None, arcmin, ...): " % (field)
-    tunit.append(raw_input(message))
-  else:
-    tform.append(_FIELDS_DICTIONARY[field]['format'])
-    tunit.append(_FIELDS_DICTIONARY[field]['unit'])
-    
-#Convert RA and DEC in decimal format
+  #Read the fields' names
+  fields_name = ascii_table.names
 
-if 'RA' in fields_name:
-  index_ra = fields_name.index('RA')
-  if (str(ascii_data2D[0][index_ra]).find(":") >= 0): ascii_data2D[index_ra] = [ astCoords.hms2decimal(str(item),':') for item in ascii_data2D[index_ra] ]
-if 'DEC' in fields_name:
-  index_dec = fields_name.index('DEC')
-  if (str(ascii_data2D[0][index_dec]).find(":") >= 0): ascii_data2D[index_dec] = [ astCoords.hms2decimal(str(item),':') for item in ascii_data2D[index_dec] ]
-  
-#Create/add the columns for the FITS table
+  #Define columns' properties
 
-for i,field in enumerate(fields_name):
-    
-    col_tmp = [ascii_data2D[j][i] for j in range(len(ascii_data2D))]
-    print field, tform[i], tunit[i], col_tmp
-    c_tmp = pyfits.Column(name=str(field), format=tform[i], unit=tunit[i], array=col_tmp)
+  tform = []
+  tunit = []
 
-    if i == 0:
-      table_hdu = pyfits.new_table( [c_tmp] )
+  for field in fields_name:
+    if field not in fields_schema:
+      #New field: the format is inferred from its values (see schema_FITS.infer_tform)
+      tform.append(infer_tform(ascii_table.strings(field)))
+      tunit.append('None')
+      log.info("-> Format of the new field \"%s\" inferred from the data: %s" % (field, tform[-1]))
     else:
-      table_hdu.columns.add_col( c_tmp )
+      tform.append(fields_schema.tform(field))
+      tunit.append(fields_schema.tunit(field))
+
+  #Read the columns in their FITS format (RA and DEC are converted in decimal format)
+  log.start("Converting the columns")
+  ascii_columns = [fits_column(field, ascii_table.strings(i), tform[i]) for i, field in enumerate(fields_name)]
 
-hdulist = pyfits.new_table(table_hdu.columns)
+  #Create the FITS table in one go (see build_FITS.build_table)
+  hdulist = build_table(fields_name, tform, tunit, ascii_columns)
+  header = hdulist.header
+  log.done(ascii_table.nrows)
 
 ##### Change this section to add/remove comments in the FITS Header ####
 
-hdulist.header.add_comment("", before="TTYPE1")
+header.add_comment("", before="TTYPE1")
 version = 1.0 #raw_input("\n\tPlease enter the number of the current table Version: ")
-hdulist.header.add_comment("*** Version" +str(version)+" ***", before="TTYPE1")
+header.add_comment("*** Version" +str(version)+" ***", before="TTYPE1")
 today = date.today().strftime("%A %d. %B %Y")
 comment = "*** Compiled at IDOC/IAS on %s ***" % (today)
-hdulist.header.add_comment(comment, before="TTYPE1")
-hdulist.header.add_comment("", before="TTYPE1")
+header.add_comment(comment, before="TTYPE1")
+header.add_comment("", before="TTYPE1")
 extname = fits_file.split(".")[0]
-hdulist.header.update('EXTNAME', extname, before="TTYPE1")
+header.update('EXTNAME', extname, before="TTYPE1")
 
 #######################################################################
 
-hdulist.writeto(fits_file)
+log.start("Writing the FITS table")
+if stream:
+  #2nd pass: the chunks are parsed again and written one after the other
+  stream_table(fits_file, header, ascii_file, delim, log=log)
+else:
+  hdulist.writeto(fits_file)
+log.done(header['NAXIS2'], os.path.getsize(fits_file))
+log.summary()
    
 print "\n\t>> Created the file"+bcolors.OKGREEN + " %s " % (fits_file) + bcolors.ENDC+"<<\n" 
 
@@ -0,0 +1,305 @@
+#!/usr/bin/python
+
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Incremental versions of a FITS table, stored as compact binary DELTA files
+(NumPy .npz) instead of complete copies of the table.
+
+A delta contains only:
+  - the schema (names, formats, units) of the new version;
+  - the cells changed in the rows already present in the old version;
+  - the new columns and the new rows (appended at the bottom).
+
+Each delta is keyed to the checksum of the data of the table it was computed
+from, so a chain of deltas can be replayed only on the right source.
+
+To rebuild a version, the syntax is:
+
+$ python delta_FITS.py <source>.fits <delta_1>.npz [<delta_2>.npz ...] <output>.fits
+
+A delta changing only some cells of the existing columns (same rows, names
+and formats) can also be written directly into the source table, which is
+memory mapped: only the pages holding the changed cells are written.
+
+$ python delta_FITS.py --in-place <table>.fits <delta_1>.npz [<delta_2>.npz ...]
+'''
+
+import numpy as np
+import os, sys, json, hashlib
+import pyfits
+
+class bcolors:
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKGREEN = '\033[92m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+
+def _is_string(column):
+  return np.asarray(column).dtype.kind in 'SU'
+
+def _normalize(column):
+  '''Values of a column in a comparable form (strings without trailing blanks)'''
+  column = np.asarray(column)
+  if _is_string(column): return np.char.rstrip(column)
+  return column
+
+def table_checksum(fits_data):
+  '''
+  MD5 checksum of the CONTENT of a table (names, formats and values), so
+  that it does not depend on the header comments or on the padding of the file.
+  '''
+  return _columns_checksum(fits_data.names, fits_data.formats, [fits_data.field(i) for i in range(len(fits_data.names))])
+
+def _columns_checksum(names, formats, columns):
+  '''Checksum of a table given as lists of names, formats and columns (see table_checksum)'''
+  md5 = hashlib.md5()
+  for name, tform, column in zip(names, formats, columns):
+    md5.update(('%s:%s;' % (name, tform)).encode('utf-8'))
+    column = _normalize(column)
+    if _is_string(column):
+      md5.update('\x00'.join(str(item) for item in column).encode('utf-8'))
+    else:
+      md5.update(np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('>')).tostring())
+  return md5.hexdigest()
+
+def _changed_cells(old, new):
+  '''Mask of the cells of 'new' differing from 'old' (NaN == NaN)'''
+  old = _normalize(old)
+  new = _normalize(new)
+  if _is_string(old) or _is_string(new):
+    return old.astype(str) != new.astype(str)
+  changed = old != new
+  if old.dtype.kind == 'f' and new.dtype.kind == 'f':
+    changed &= ~(np.isnan(old) & np.isnan(new))
+  return changed
+
+def compute_delta(old_data, new_data):
+  '''
+  Compute the delta from the table 'old_data' to the table 'new_data'
+  (FITS_rec). The rows of the old table are assumed to be the first ones of
+  the new table, as written by edits_FITS_table.py.
+  Returns a dictionary of arrays, ready for write_delta().
+  '''
+  nrows_old = len(old_data)
+  nrows_new = len(new_data)
+  if nrows_new < nrows_old:
+    raise ValueError("Rows cannot be removed in a delta (%i -> %i rows)" % (nrows_old, nrows_new))
+
+  columns_new = pyfits.ColDefs(new_data.columns)
+  meta = {
+    'source': table_checksum(old_data),
+    'target': table_checksum(new_data),
+    'nrows_old': nrows_old,
+    'nrows_new': nrows_new,
+    'names': list(columns_new.names),
+    'formats': list(columns_new.formats),
+    'units': [str(unit) for unit in columns_new.units],
+    'changed': [],
+    'added_columns': []
+    }
+  delta = {}
+
+  for name in meta['names']:
+    column = np.asarray(new_data[name])
+    if name in old_data.names:
+      rows = np.flatnonzero(_changed_cells(old_data[name], column[:nrows_old]))
+      if len(rows) > 0:
+        meta['changed'].append(name)
+        delta['rows__' + name] = rows
+        delta['cells__' + name] = column[rows]
+    else:
+      meta['added_columns'].append(name)
+      delta['column__' + name] = column[:nrows_old]
+    if nrows_new > nrows_old:
+      delta['new_rows__' + name] = column[nrows_old:]
+
+  delta['meta'] = np.array(json.dumps(meta))
+  return delta
+
+def cells_delta(old_data, rows, new_data, checksums=True):
+  '''
+  Compute the delta changing only the rows 'rows' of the existing columns of
+  the table 'old_data' (FITS_rec), whose new values are the rows of
+  'new_data' (e.g. a FITS_rec holding only the updated rows, in the same
+  order). Unlike compute_delta, the other rows are not compared, so the
+  delta can be applied in place (see update_in_place) without building the
+  new table. The checksums of the source and of the target (which read the
+  whole table) are computed only if 'checksums' is True, i.e. if the delta
+  is to be written into a file and replayed.
+  Raises ValueError if a new string is longer than its column.
+  '''
+  rows = np.asarray(rows, dtype=int)
+  columns_old = pyfits.ColDefs(old_data.columns)
+  meta = {
+    'source': None,
+    'target': None,
+    'nrows_old': len(old_data),
+    'nrows_new': len(old_data),
+    'names': list(columns_old.names),
+    'formats': list(columns_old.formats),
+    'units': [str(unit) for unit in columns_old.units],
+    'changed': [],
+    'added_columns': []
+    }
+  delta = {}
+
+  for name in meta['names']:
+    column = old_data[name]
+    cells = np.asarray(new_data[name])
+    if _is_string(column) and len(cells) > 0:
+      length = max(len(str(item).rstrip()) for item in cells)
+      if length > column.dtype.itemsize:
+        raise ValueError("New values of %s longer than its format (%i > %i characters)" % (name, length, column.dtype.itemsize))
+    changed = np.flatnonzero(_changed_cells(column[rows], cells))
+    if len(changed) > 0:
+      meta['changed'].append(name)
+      delta['rows__' + name] = rows[changed]
+      delta['cells__' + name] = cells[changed]
+
+  if checksums:
+    meta['source'] = table_checksum(old_data)
+    #Only the changed columns are copied to compute the checksum of the target
+    columns = []
+    for name in meta['names']:
+      column = old_data[name]
+      if name in meta['changed']:
+        column = np.array(column)
+        column[delta['rows__' + name]] = delta['cells__' + name]
+      columns.append(column)
+    meta['target'] = _columns_checksum(old_data.names, old_data.formats, columns)
+
+  delta['meta'] = np.array(json.dumps(meta))
+  return delta
+
+def write_delta(filename, delta):
+  '''Write a delta (as returned by compute_delta) into a compressed .npz file'''
+  f = open(filename, 'wb')
+  try:
+    np.savez_compressed(f, **delta)
+  finally:
+    f.close()
+
+def read_delta(filename):
+  '''Read a delta file. Returns the metadata dictionary and the arrays'''
+  npz = np.load(filename)
+  delta = dict((key, npz[key]) for key in npz.files)
+  npz.close()
+  return json.loads(str(delta.pop('meta'))), delta
+
+def apply_delta(fits_data, meta, delta, check=True):
+  '''
+  Apply a delta to the table 'fits_data' (FITS_rec) and return the new
+  version as a BinTableHDU. If 'check' is True, the checksums of the source
+  and of the rebuilt table are verified.
+  '''
+  if check and table_checksum(fits_data) != meta['source']:
+    raise ValueError("The delta does not apply to this table (checksum mismatch)")
+
+  nrows_old = meta['nrows_old']
+  nrows_new = meta['nrows_new']
+  if len(fits_data) != nrows_old:
+    raise ValueError("The delta expects %i rows, the table has %i" % (nrows_old, len(fits_data)))
+
+  columns = []
+  for name, tform, tunit in zip(meta['names'], meta['formats'], meta['units']):
+    if name in meta['added_columns']: old_values = delta['column__' + name]
+    else: old_values = _normalize(fits_data[name])
+
+    if nrows_new > nrows_old: values = np.concatenate([old_values, delta['new_rows__' + name]])
+    else: values = np.array(old_values)
+
+    if name in meta['changed']:
+      cells = delta['cells__' + name]
+      if _is_string(values) and cells.dtype.itemsize > values.dtype.itemsize: values = values.astype(cells.dtype)
+      values[delta['rows__' + name]] = cells
+    columns.append(pyfits.Column(name=str(name), format=str(tform), unit=str(tunit), array=values))
+
+  hdu = pyfits.new_table(pyfits.ColDefs(columns))
+  if check and table_checksum(hdu.data) != meta['target']:
+    raise ValueError("The rebuilt table does not match the delta target (checksum mismatch)")
+  return hdu
+
+def can_update_in_place(fits_data, meta):
+  '''
+  True if the delta only changes cells of the existing columns of 'fits_data',
+  i.e. no new rows/columns and no format changes (e.g. wider strings).
+  '''
+  columns = pyfits.ColDefs(fits_data.columns)
+  return (meta['nrows_new'] == meta['nrows_old'] == len(fits_data) and len(meta['added_columns']) == 0
+          and list(meta['names']) == list(columns.names) and list(meta['formats']) == list(columns.formats))
+
+def update_in_place(fits_file, meta, delta, check=True):
+  '''
+  Apply a delta directly into 'fits_file', opened in update mode with a
+  memory map: only the changed cells are written, and the CHECKSUM/DATASUM
+  keywords are recomputed (if present). If 'check' is True, the checksum of
+  the content of the table is verified before the update (this reads the
+  whole table).
+  Returns the number of cells written.
+  '''
+  hdulist = pyfits.open(fits_file, mode='update', memmap=True)
+  try:
+    hdu = hdulist[1]
+    if not can_update_in_place(hdu.data, meta):
+      raise ValueError("The delta adds rows/columns or changes formats: it cannot be applied in place")
+    if check and table_checksum(hdu.data) != meta['source']:
+      raise ValueError("The delta does not apply to this table (checksum mismatch)")
+    ncells = 0
+    for name in meta['changed']:
+      rows = delta['rows__' + name]
+      hdu.data[name][rows] = delta['cells__' + name]
+      ncells += len(rows)
+    if 'CHECKSUM' in hdu.header or 'DATASUM' in hdu.header:
+      hdu.add_checksum()
+  finally:
+    hdulist.close()
+  return ncells
+
+def replay(fits_file, delta_files):
+  '''Rebuild a version of the table applying a chain of deltas to 'fits_file' '''
+  hdulist = pyfits.open(fits_file)
+  hdu = hdulist[1]
+  for delta_file in delta_files:
+    meta, delta = read_delta(delta_file)
+    hdu = apply_delta(hdu.data, meta, delta)
+  return hdu
+
+if __name__ == '__main__':
+  if (len(sys.argv) > 3 and sys.argv[1] == '--in-place'):
+    fits_file = sys.argv[2]
+    for delta_file in sys.argv[3:]:
+      meta, delta = read_delta(delta_file)
+      ncells = update_in_place(fits_file, meta, delta)
+      print "\n\t>> %s: %i cell(s) updated in place in" % (delta_file, ncells) + bcolors.OKGREEN + " %s " % (fits_file) + bcolors.ENDC
+    print
+    os._exit(0)
+  elif (len(sys.argv) > 3):
+    fits_file = sys.argv[1]
+    delta_files = sys.argv[2:-1]
+    file_output = sys.argv[-1]
+  else:
+    print bcolors.WARNING +  "\n\tSintax:\t$ python delta_FITS.py <source>.fits <delta_1>.npz [<delta_2>.npz ...] <output>.fits" + bcolors.ENDC
+    print bcolors.WARNING +  "\t\t$ python delta_FITS.py --in-place <table>.fits <delta_1>.npz [<delta_2>.npz ...]\n" + bcolors.ENDC
+    os._exit(0)
+
+  hdu = replay(fits_file, delta_files)
+  hdu.writeto(file_output)
+  print "\n\t>> Applied %i delta(s). New file:" % len(delta_files) + bcolors.OKGREEN + " %s " % (file_output) + bcolors.ENDC + "\n"
@@ -30,9 +30,61 @@ of the columns, and must be UNCOMMENTED!
 NOTE: Ra and DEC must be in **decimal degrees**, both in FITS and                                          
 ASCII tables.
 
+The format (TFORM) of the new fields is read from fields_schema.json; for
+the fields not defined there it is inferred from the values of the ASCII
+column (see schema_FITS.infer_tform), with no questions.
+
 The syntax is:
 
-$ python edit_FITS.py <table>.fits <ascii_file>
+$ python edit_FITS.py <table>.fits <ascii_file> [options]
+
+With more than one ASCII file, the catalogues are merged in one pass and
+without questions (see merge_FITS.py), the first file having the highest
+priority:
+
+$ python edit_FITS.py <table>.fits [<CATALOG>=]<ascii_1> [<CATALOG>=]<ascii_2> ... [options]
+
+Options:
+  --delta   also write the changes as a delta file (<new_table>.delta.npz),
+            to rebuild the new table from the old one with delta_FITS.py
+  --report=tab|csv|json
+            format of the report of the updates (default is 'tab', i.e. the
+            aligned text file summary_updates.tab)
+  --in-place
+            if only some values of the existing columns change (no new
+            rows/columns, no wider strings), write the changed cells of the
+            matched rows directly into <table>.fits instead of a new table.
+            The header is unchanged, apart from the CHECKSUM/DATASUM
+            keywords (if present), so the Version number and EXTNAME are
+            not asked; with --delta, the delta is <table>.delta.npz.
+            Not available when merging several catalogues
+  --no-cache
+            do not reuse the matches of a previous run. The matches are
+            cached in the directory .match_cache/ of the current directory,
+            keyed on the matching columns and parameters; the directory is
+            never pruned: delete it to clear the cache
+  --auto-match
+            when several ASCII objects are found around a FITS object, do
+            not ask: match it to the nearest one, if the FITS object is in
+            turn its nearest FITS object (otherwise it is not matched)
+  --max-candidates=<k>
+            number of nearest ASCII objects kept for each FITS object in
+            the candidates (default is 5). All the objects within the radius
+            are still counted, and offered when the choice is asked
+  --candidates=<file>
+            write all the candidate matches (with separations, best-match and
+            unique flags) into a CSV file, for review
+  --processes=<number>
+            number of processes for the parsing of large ASCII files and
+            for the matching by POSITION of large tables (default is all
+            the CPUs)
+
+Options of the merge of several catalogues:
+  --radius=<arcsec>     match radius (default is 300 arcsec, as for a single file)
+  --h-factor=<value>    factor applied to the masses of the catalogues (default is 1)
+  --delimiter=<char>    column delimiter of the ASCII files (default is automatic)
+  --version=<number>    version number of the new table (default is 1.0)
+  --output=<name>       name of the new FITS table, without extension (default is <table>_merged)
 
 @author: Alessandro NASTASI for IAS - IDOC 
 @date: 21/05/2015
@@ -44,9 +96,8 @@ __version__ = "1.0"
 __date__ = "21/05/2015"
 
 import numpy as np
-import os, sys, re, time
+import os, sys, re, time, json
 import string
-import asciidata
 import pyfits
 from datetime import date
 
@@ -54,6 +105,13 @@ from datetime import date
 #since the calcAngSepDeg() of the latter works only for separation <90 deg 
 #(tangent plane projection approximation)
 import astCoords
+from delta_FITS import compute_delta, cells_delta, write_delta, update_in_place
+from match_FITS import DEFAULT_MATCH_RADIUS, MatchResult, SkyIndex, crossmatch_knn, match_cache_key, load_match, save_match
+from merge_FITS import merge_catalogues, parse_input
+from read_ASCII import read_ascii_table
+from schema_FITS import load_schema, infer_tform, tform_code
+from report_FITS import UpdateReport, REPORT_FORMATS
+from names_FITS import remove_duplicated_names, remove_duplicated_names_column, set_undef_values
 
 class bcolors:
     HEADER = '\033[95m'
@@ -63,363 +121,8 @@ class bcolors:
     FAIL = '\033[91m'
     ENDC = '\033[0m'
     
-#Dictionary containing the FORMAT and UNITS of all (or most of) the fields
-_FIELDS_DICTIONARY = { 
-  'INDEX': { 'format': 'I', 'unit': 'None' },
-  'COORD_SOURCE': { 'format': '5A', 'unit': 'None' },
-  'x':{ 'format': 'E', 'unit': 'None' },
-  'y':{ 'format': 'E', 'unit': 'None' },
-  'z':{ 'format': 'E', 'unit': 'None' },
-  
-  # ****** ACT ******
-  'ACT_INDEX': { 'format': 'I', 'unit': 'None' },
-  'INDEX_ACT': { 'format': 'I', 'unit': 'None' },
-  'CATALOG': { 'format': '7A', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'GLON': { 'format': 'E', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'degrees' },
-  #'RA': { 'format': 'E', 'unit': 'degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'degrees' },
-  'SNR': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'M500': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'ERR_M500': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ERR_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'THETA': { 'format': 'E', 'unit': 'arcmin' },
-  #'PAPER': { 'format': '56A', 'unit': 'None' },      # Use PAPER in SPT as bigger format '59A'
-
-  'ACT_CATALOG': { 'format': '7A', 'unit': 'None' },
-  'ACT_NAME': { 'format': '18A', 'unit': 'None' },
-  'ACT_GLON': { 'format': 'E', 'unit': 'degrees' },
-  'ACT_GLAT': { 'format': 'E', 'unit': 'degrees' },
-  'ACT_RA': { 'format': 'E', 'unit': 'degrees' },
-  'ACT_DEC': { 'format': 'E', 'unit': 'degrees' },
-  'ACT_SNR': { 'format': 'E', 'unit': 'None' },
-  'ACT_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'ACT_ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'ACT_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'ACT_REDSHIFT_REF': { 'format': '19A', 'unit': 'None' },
-  'ACT_M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  'ACT_ERR_M500': { 'format': 'E', 'unit': '10^14 h^-1 solar mass' },
-  'ACT_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ACT_ERR_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ACT_THETA': { 'format': 'E', 'unit': 'arcmin' },
-  'ACT_PAPER': { 'format': '56A', 'unit': 'None' },
-
-  # ****** AMI ******
-  'INDEX_AMI': { 'format': 'I', 'unit': 'None' },
-  'AMI_INDEX': { 'format': 'I', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'RA': { 'format': 'E', 'unit': 'Degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLON': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  #'ALT_NAME': { 'format': '60A', 'unit': 'None' },
-  #'COORD_SOURCE': { 'format': '5A', 'unit': 'None' },
-
-  'AMI_NAME': { 'format': '18A', 'unit': 'None' },
-  'AMI_RA': { 'format': 'E', 'unit': 'Degrees' },
-  'AMI_DEC': { 'format': 'E', 'unit': 'Degrees' },
-  'AMI_GLON': { 'format': 'E', 'unit': 'Degrees' },
-  'AMI_GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  'AMI_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'AMI_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'AMI_REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'AMI_ALT_NAME': { 'format': '60A', 'unit': 'None' },
-  
-  # ****** CARMA ******
-  'INDEX_CARMA': { 'format': 'I', 'unit': 'None' },
-  'CARMA_INDEX': { 'format': 'I', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'RA': { 'format': 'E', 'unit': 'Degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLON': { 'format': 'E', 'unit': 'Degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  #'COORD_SOURCE': { 'format': '5A', 'unit': 'None' },  
-  
-  'CARMA_NAME': { 'format': '18A', 'unit': 'None' },
-  'CARMA_RA': { 'format': 'E', 'unit': 'Degrees' },
-  'CARMA_DEC': { 'format': 'E', 'unit': 'Degrees' },
-  'CARMA_GLON': { 'format': 'E', 'unit': 'Degrees' },
-  'CARMA_GLAT': { 'format': 'E', 'unit': 'Degrees' },
-  'CARMA_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'CARMA_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'CARMA_REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'CARMA_M500': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'CARMA_ERR_M500': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-
-  #****** PSZ1 ******
-  'PSZ1_INDEX': { 'format': 'I', 'unit': 'None' },
-  'INDEX_PSZ1': { 'format': 'I', 'unit': 'None' },
-  'NAME': { 'format': '18A', 'unit': 'None' },
-  'GLON': { 'format': 'D', 'unit': 'degrees' },
-  'GLAT': { 'format': 'D', 'unit': 'degrees' },
-  'RA': { 'format': 'D', 'unit': 'degrees' },
-  'DEC': { 'format': 'D', 'unit': 'degrees' },
-  'RA_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'DEC_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'REDSHIFT_SOURCE': { 'format': 'I', 'unit': 'None' },
-  'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'ALT_NAME': { 'format': '66A', 'unit': 'None' },
-  'YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'ERRP_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'ERRM_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'ERRP_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'ERRM_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'ERR_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'Y_PSX_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'SN_PSX': { 'format': 'E', 'unit': 'None' },
-  'PIPELINE': { 'format': 'I', 'unit': 'None' },
-  'PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PCCS': { 'format': 'L', 'unit': 'None' },
-  'VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'ID_EXT': { 'format': '25A', 'unit': 'None' },
-  'POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  'COSMO': { 'format': 'L', 'unit': 'None' },
-  'COMMENT': { 'format': 'L', 'unit': 'None' },
-  'QN': { 'format': 'E', 'unit': 'None' }, 
-
-  'PSZ1_NAME': { 'format': '18A', 'unit': 'None' },
-  'PSZ1_GLON': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ1_GLAT': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ1_RA': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ1_DEC': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ1_RA_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'PSZ1_DEC_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'PSZ1_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'PSZ1_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'PSZ1_REDSHIFT_SOURCE': { 'format': 'I', 'unit': 'None' },
-  'PSZ1_REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'PSZ1_ALT_NAME': { 'format': '66A', 'unit': 'None' },
-  'PSZ1_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PSZ1_ERRP_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PSZ1_ERRM_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PSZ1_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PSZ1_ERRP_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PSZ1_ERRM_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PSZ1_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'PSZ1_ERR_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'PSZ1_Y_PSX_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PSZ1_SN_PSX': { 'format': 'E', 'unit': 'None' },
-  'PSZ1_PIPELINE': { 'format': 'I', 'unit': 'None' },
-  'PSZ1_PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PSZ1_PCCS': { 'format': 'L', 'unit': 'None' },
-  'PSZ1_VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'PSZ1_ID_EXT': { 'format': '25A', 'unit': 'None' },
-  'PSZ1_POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  'PSZ1_SNR': { 'format': 'E', 'unit': 'None' },
-  'PSZ1_COSMO': { 'format': 'L', 'unit': 'None' },
-  'PSZ1_COMMENT': { 'format': 'L', 'unit': 'None' },
-  'PSZ1_QN': { 'format': 'E', 'unit': 'None' }, 
-
-  # ****** PSZ2 ******
-  'PSZ2_INDEX': { 'format': 'I', 'unit': 'None' },
-  'INDEX_PSZ2': { 'format': 'I', 'unit': 'None' },
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'GLON': { 'format': 'D', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'D', 'unit': 'degrees' },
-  #'RA': { 'format': 'D', 'unit': 'degrees' },
-  #'DEC': { 'format': 'D', 'unit': 'degrees' },
-  #'POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  #'PIPELINE': { 'format': 'I', 'unit': 'None' },
-  #'PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PCCS2': { 'format': 'L', 'unit': 'None' },
-  'PSZ': { 'format': 'I', 'unit': 'None' },
-  'IR_FLAG': { 'format': 'I', 'unit': 'None' },
-  'Q_NEURAL': { 'format': 'E', 'unit': 'None' },
-  'Y5R500': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  'Y5R500_ERR': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  'PSZ2_VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'REDSHIFT_ID': { 'format': '25A', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'MSZ': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MSZ_ERR_UP': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MSZ_ERR_LOW': { 'format': 'E', 'unit': '10^14 Msol' },
-  'MCXC': { 'format': '25A', 'unit': 'None' },
-  'REDMAPPER': { 'format': '25A', 'unit': 'None' },
-  'ACT': { 'format': '25A', 'unit': 'None' },
-  'SPT': { 'format': '25A', 'unit': 'None' },
-  'WISE_SIGNF': { 'format': 'E', 'unit': 'None' },
-  'WISE_FLAG': { 'format': 'I', 'unit': 'None' },
-  'AMI_EVIDENCE': { 'format': 'E', 'unit': 'None' },
-  #'COSMO': { 'format': 'L', 'unit': 'None' },
-  'PSZ2_COMMENT': { 'format': '128A', 'unit': 'None' },
-
-  'PSZ2_NAME': { 'format': '18A', 'unit': 'None' },
-  'PSZ2_GLON': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ2_GLAT': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ2_RA': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ2_DEC': { 'format': 'D', 'unit': 'degrees' },
-  'PSZ2_POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  'PSZ2_SNR': { 'format': 'E', 'unit': 'None' },
-  'PSZ2_PIPELINE': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_PCCS2': { 'format': 'L', 'unit': 'None' },
-  'PSZ2_PSZ': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_IR_FLAG': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_Q_NEURAL': { 'format': 'E', 'unit': 'None' },
-  'PSZ2_Y5R500': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  'PSZ2_Y5R500_ERR': { 'format': 'E', 'unit': '10^-3 arcmin^2' },
-  #'PSZ2_VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_REDSHIFT_ID': { 'format': '25A', 'unit': 'None' },
-  'PSZ2_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'PSZ2_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'PSZ2_MSZ': { 'format': 'E', 'unit': '10^14 Msol' },
-  'PSZ2_MSZ_ERR_UP': { 'format': 'E', 'unit': '10^14 Msol' },
-  'PSZ2_MSZ_ERR_LOW': { 'format': 'E', 'unit': '10^14 Msol' },
-  'PSZ2_MCXC': { 'format': '25A', 'unit': 'None' },
-  'PSZ2_REDMAPPER': { 'format': '25A', 'unit': 'None' },
-  'PSZ2_ACT': { 'format': '25A', 'unit': 'None' },
-  'PSZ2_SPT': { 'format': '25A', 'unit': 'None' },
-  'PSZ2_WISE_SIGNF': { 'format': 'E', 'unit': 'None' },
-  'PSZ2_WISE_FLAG': { 'format': 'I', 'unit': 'None' },
-  'PSZ2_AMI_EVIDENCE': { 'format': 'E', 'unit': 'None' },
-  'PSZ2_COSMO': { 'format': 'L', 'unit': 'None' },
-  #'PSZ2_COMMENT': { 'format': '128A', 'unit': 'None' },
-
-  # ****** PLCK ******
-  'PLCK_INDEX': { 'format': 'I', 'unit': 'None' },
-  'INDEX_PLCK': { 'format': 'I', 'unit': 'None' },
-
-  #'NAME': { 'format': '18A', 'unit': 'None' },
-  #'GLON': { 'format': 'D', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'D', 'unit': 'degrees' },
-  #'RA': { 'format': 'D', 'unit': 'degrees' },
-  #'DEC': { 'format': 'D', 'unit': 'degrees' },
-  #'RA_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  #'DEC_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  #'REDSHIFT_SOURCE': { 'format': 'I', 'unit': 'None' },
-  #'REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  #'ALT_NAME': { 'format': '66A', 'unit': 'None' },
-  #'YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  #'ERRP_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  #'ERRM_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  #'M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  #'ERRP_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  #'ERRM_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  #'S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  #'ERR_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  #'Y_PSX_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  #'SN_PSX': { 'format': 'E', 'unit': 'None' },
-  #'PIPELINE': { 'format': 'I', 'unit': 'None' },
-  #'PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  #'PCCS': { 'format': 'L', 'unit': 'None' },
-  #'VALIDATION': { 'format': 'I', 'unit': 'None' },
-  #'ID_EXT': { 'format': '25A', 'unit': 'None' },
-  #'POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  #'COSMO': { 'format': 'L', 'unit': 'None' },
-  #'COMMENT': { 'format': 'L', 'unit': 'None' },
-  #'QN': { 'format': 'E', 'unit': 'None' }, 
-
-  'PLCK_NAME': { 'format': '18A', 'unit': 'None' },
-  'PLCK_GLON': { 'format': 'D', 'unit': 'degrees' },
-  'PLCK_GLAT': { 'format': 'D', 'unit': 'degrees' },
-  'PLCK_RA': { 'format': 'D', 'unit': 'degrees' },
-  'PLCK_DEC': { 'format': 'D', 'unit': 'degrees' },
-  'PLCK_RA_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'PLCK_DEC_MCXC': { 'format': 'E', 'unit': 'degrees' },
-  'PLCK_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'PLCK_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'PLCK_REDSHIFT_SOURCE': { 'format': 'I', 'unit': 'None' },
-  'PLCK_REDSHIFT_REF': { 'format': '36A', 'unit': 'None' },
-  'PLCK_ALT_NAME': { 'format': '66A', 'unit': 'None' },
-  'PLCK_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PLCK_ERRP_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PLCK_ERRM_YZ_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PLCK_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PLCK_ERRP_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PLCK_ERRM_M_YZ_500': { 'format': 'E', 'unit': '10^14 solar mass' },
-  'PLCK_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'PLCK_ERR_S_X': { 'format': 'E', 'unit': 'erg/s/cm2' },
-  'PLCK_Y_PSX_500': { 'format': 'E', 'unit': '10^-4 arcmin squared' },
-  'PLCK_SN_PSX': { 'format': 'E', 'unit': 'None' },
-  'PLCK_PIPELINE': { 'format': 'I', 'unit': 'None' },
-  'PLCK_PIPE_DET': { 'format': 'I', 'unit': 'None' },
-  'PLCK_PCCS': { 'format': 'L', 'unit': 'None' },
-  'PLCK_VALIDATION': { 'format': 'I', 'unit': 'None' },
-  'PLCK_ID_EXT': { 'format': '25A', 'unit': 'None' },
-  'PLCK_POS_ERR': { 'format': 'E', 'unit': 'arcmin' },
-  'PLCK_SNR': { 'format': 'E', 'unit': 'None' },
-  'PLCK_COSMO': { 'format': 'L', 'unit': 'None' },
-  'PLCK_COMMENT': { 'format': 'L', 'unit': 'None' },
-  'PLCK_QN': { 'format': 'E', 'unit': 'None' }, 
-
-  # ****** SPT ******
-  'SPT_INDEX': { 'format': 'I', 'unit': 'None' },
-  'INDEX_SPT': { 'format': 'I', 'unit': 'None' },
-  #'CATALOG': { 'format': '7A', 'unit': 'None' },
-  #'NAME': { 'format': '16A', 'unit': 'None' },
-  #'GLON': { 'format': 'E', 'unit': 'degrees' },
-  #'GLAT': { 'format': 'E', 'unit': 'degrees' },
-  #'RA': { 'format': 'E', 'unit': 'degrees' },
-  #'DEC': { 'format': 'E', 'unit': 'degrees' },
-  #'SNR': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  #'REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'REDSHIFT_LIMIT': { 'format': 'E', 'unit': 'None' },
-  
-  'M500_fidCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'ERR_M500_fidCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'M500_PlanckCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'ERR_M500_PlanckCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ERR_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-    
-  'LX': { 'format': 'E', 'unit': '10^44 erg/s' },
-  'YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'ERR_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  #'THETA': { 'format': 'E', 'unit': 'arcmin' },
-  'PAPER': { 'format': '59A', 'unit': 'None' },
-  'XRAY': { 'format': 'L', 'unit': 'None' },
-  'STRONG_LENS': { 'format': 'L', 'unit': 'None' },
-  
-  'SPT_CATALOG': { 'format': '7A', 'unit': 'None' },
-  'SPT_NAME': { 'format': '16A', 'unit': 'None' },
-  'SPT_GLON': { 'format': 'E', 'unit': 'degrees' },
-  'SPT_GLAT': { 'format': 'E', 'unit': 'degrees' },
-  'SPT_RA': { 'format': 'E', 'unit': 'degrees' },
-  'SPT_DEC': { 'format': 'E', 'unit': 'degrees' },
-  'SPT_SNR': { 'format': 'E', 'unit': 'None' },
-  'SPT_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'SPT_ERR_REDSHIFT': { 'format': 'E', 'unit': 'None' },
-  'SPT_REDSHIFT_TYPE': { 'format': '5A', 'unit': 'None' },
-  'SPT_REDSHIFT_REF': { 'format': '19A', 'unit': 'None' },
-
-  'SPT_REDSHIFT_LIMIT': { 'format': 'E', 'unit': 'None' },
-  'SPT_XRAY': { 'format': 'L', 'unit': 'None' },
-  'SPT_STRONG_LENS': { 'format': 'L', 'unit': 'None' },
-
-  'SPT_M500_fidCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'SPT_ERR_M500_fidCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'SPT_M500_PlanckCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  'SPT_ERR_M500_PlanckCosmo': { 'format': 'E', 'unit': '10^14 h70^-1 solar mass' },
-  
-  'SPT_LX': { 'format': 'E', 'unit': '10^44 erg/s' },
-  'SPT_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'SPT_ERR_YSZ': { 'format': 'E', 'unit': '10^-6 arcmin squared' },
-  'SPT_THETA': { 'format': 'E', 'unit': 'arcmin' },
-  'SPT_PAPER': { 'format': '59A', 'unit': 'None' }
-  
-  }
+#Registry with the FORMAT and UNITS of all (or most of) the fields (see schema_FITS.py)
+fields_schema = load_schema()
   
 #Name of fields (in FITS/ASCII) sometimes called individually in the script
 
@@ -452,54 +155,6 @@ _UNDEF_VALUES_ = {
   'PIPE_DET' : {0}
   }
 
-def remove_duplicated_names(string):
-  '''
-  This function removes duplicated names of a string, assuming they are separated by ';'
-  In addition, it takes out 'NULL', 'NaN', 'False' from the final, composite string.
-  It is used for the creation of ALT_NAME field.
-  '''
-  string = string.replace('; ',';')
-  tmp = [item for item in string.split(';') if item.upper() not in ["-", "NULL", "NAN", "NONE", "FALSE"] and len(item)>0 ]
-  # *** This lines of code help preserving the order ot the names ***
-  tmp_uniq = []
-  set_tmp = set()
-  for item in tmp:
-    if item not in set_tmp:
-      tmp_uniq.append(item)
-      set_tmp.add(item)
-  # ******************************************************************
-  
-  if len(tmp)==0: new_string = '-'
-  else: new_string =  "; ".join(tmp_uniq)
-  return new_string
- 
-def set_undef_values(fits_data):
-  '''
-  Set the proper 'undef' values according to the format/name of the field
-  '''
-  print "\n\t>> Checking/setting undefined values for the different fields ..."
-  for i, name in enumerate(fits_data.names):
-    sys.stdout.write('\t%i/%i > %s (format %s) : Done                                        \r' % (i+1, len(fits_data.names), name, fits_data.formats[i]))
-    sys.stdout.flush()
-    for j in range(fits_data.size):
-      if name == name_index_key:
-	if fits_data[name_Name_key][j] <= 0: fits_data[j][i] = -1
-      elif name == name_redshift_key and fits_data[name][j] == -1.0:
-	fits_data[j][i] = np.nan
-      elif name.find(name_zType_key) >= 0 and str(fits_data[name][j]) == 'Null':
-	fits_data[j][i] = "undef"
-      elif fits_data.formats[i] in 'EDJ':
-	if str(fits_data[j][i]) in ['-1.6375e+30','-1.63750e+30', '-1.6375E+30', '-1.63750E+30', 'None', 'NULL']:
-	  fits_data[j][i] = np.nan
-      elif fits_data.formats[i].find('A') >= 0:
-	fits_data[j][i] = remove_duplicated_names(fits_data[j][i])
-	if str(fits_data[j][i]).upper() in ["", "0.0", "NULL", "NAN", "NONE", "FALSE"]  or str(fits_data[j][i]) == 'False':
-	  fits_data[j][i] = "-"
-      elif name in ['PIPELINE','PIPE_DET']:
-	if fits_data[j][i] <= 0: fits_data[j][i] = 0
-  print '\n'
-  return fits_data
-
 def recreate_reformatted_column(hdulist, field_name, new_format, new_vector):
   '''
   Update the length (format) of a 'STRING' (format = 'xA') FIELD. 
@@ -550,31 +205,86 @@ def recreate_reformatted_column(hdulist, field_name, new_format, new_vector):
   *** >> START << ***
 '''
 
-if (len(sys.argv) > 1):
-    fits_file = sys.argv[1] 
-    ascii_file = sys.argv[2] 
+arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+if (len(arguments) > 1):
+    fits_file = arguments[0] 
+    ascii_file = arguments[1] 
 else:
-    print bcolors.WARNING +  "\n\tSintax:\t$ python edit_FITS.py <fits_file> <ascii_file>\n" + bcolors.ENDC
+    print bcolors.WARNING +  "\n\tSintax:\t$ python edit_FITS.py <fits_file> <ascii_file> [<ascii_file_2> ...] [--delta] [--in-place] [--no-cache] [--auto-match] [--candidates=<file>] [--report=tab|csv|json]\n" + bcolors.ENDC
     os._exit(0)
 
-#Open the output file
-file_report_name = 'summary_updates.tab'
-file_report = open(file_report_name, 'w')
+#Open the output file (the report format can be chosen with --report=tab|csv|json)
+report_format = 'tab'
+for option in options:
+  if option.startswith('--report='): report_format = option.split('=', 1)[1]
+if report_format not in REPORT_FORMATS:
+  print bcolors.FAIL + "\n\t*** Report format '%s' not valid: use one of %s ***\n" % (report_format, ", ".join(REPORT_FORMATS)) + bcolors.ENDC
+  os._exit(0)
+
+file_report_name = 'summary_updates.' + report_format
+file_report = UpdateReport(file_report_name, report_format)
 
 question = bcolors.OKBLUE+ "[Q]" + bcolors.ENDC
 info = bcolors.WARNING+ "[I]" + bcolors.ENDC
 error = bcolors.FAIL+ "[ERR]" + bcolors.ENDC
 
+def get_option(name, default):
+  '''Value of the command-line option --<name>=<value> (default if not given)'''
+  for option in options:
+    if option.startswith('--%s=' % name): return option.split('=', 1)[1]
+  return default
+
+#Processes for the parsing of large ASCII files and the matching by POSITION (None = all the CPUs)
+processes = int(get_option('processes', 0)) or None
+
+#Options of the matching by POSITION: number of candidates, automatic choice, table of the candidates
+max_candidates = int(get_option('max-candidates', 5))
+auto_match = '--auto-match' in options
+candidates_file = get_option('candidates', None)
+
+#Several ASCII files: merge all the catalogues in one pass, without questions
+if len(arguments) > 2:
+  if '--in-place' in options:
+    print '%s --in-place is not available when merging several catalogues (they add rows and columns)\nAborted.\n' % error; os._exit(0)
+  hdulist = pyfits.open(fits_file)
+  inputs = [parse_input(arg) for arg in arguments[1:]]
+  print "\n\t>> Merging %i catalogues into %s (priority: %s)" % (len(inputs), fits_file, ", ".join([label for label, filename in inputs]))
+  try:
+    new_hdu = merge_catalogues(hdulist[1].data, inputs, fields_schema, float(get_option('radius', DEFAULT_MATCH_RADIUS)), delimiter=get_option('delimiter', None),
+                               h_factor=float(get_option('h-factor', 1.)), mass_keys=name_mass_key + name_errMass_key, report=file_report,
+                               processes=processes)
+  except ValueError, err:
+    print '%s %s\nAborted.\n' % (error, err); os._exit(0)
+  file_report.close()
+
+  version = get_option('version', '1.0')
+  extname = get_option('output', os.path.splitext(os.path.basename(fits_file))[0] + '_merged')
+  new_hdu.header.add_comment("", before="TTYPE1")
+  new_hdu.header.add_comment("*** Version " +str(version)+" ***", before="TTYPE1")
+  new_hdu.header.add_comment("*** Compiled at IDOC/IAS on %s ***" % (date.today().strftime("%A %d. %B %Y")), before="TTYPE1")
+  new_hdu.header.add_comment("", before="TTYPE1")
+  new_hdu.header.update('EXTNAME', extname, before='TTYPE1')
+  new_hdu.data = set_undef_values(new_hdu.data)
+
+  file_output = extname+'.fits'
+  new_hdu.writeto(file_output)
+  print "\n\t>> New updated file:" + bcolors.OKGREEN + " %s " % (file_output) + bcolors.ENDC
+  print "\t>> Details of the applied updates are reported in:" + bcolors.OKGREEN + " %s " % (file_report_name) + bcolors.ENDC + "\n"
+  if '--delta' in options:
+    file_delta = extname+'.delta.npz'
+    write_delta(file_delta, compute_delta(hdulist[1].data, new_hdu.data))
+    print "\t>> Delta from %s to %s written in:" % (fits_file, file_output) + bcolors.OKGREEN + " %s " % (file_delta) + bcolors.ENDC + "\n"
+  sys.exit(0)
+
 #User can define the columns delimiter in the ASCII table.
-delim=raw_input("\n%s Please enter the column delimiter of the ASCII table (default is ','):\t" % question)
-if not delim:
-# Read the ascii table, with the structure: ascii_table[COLUMNS][ROWS]
-  ascii_table=asciidata.open(ascii_file, 'r', delimiter=',')
-else:
-  ascii_table=asciidata.open(ascii_file, 'r', delimiter=delim)
+delim=raw_input("\n%s Please enter the column delimiter of the ASCII table (leave empty to detect it automatically):\t" % question)
+
+# Read the ascii table once, column by column (see read_ASCII.AsciiTable)
+ascii_table = read_ascii_table(ascii_file, delim, processes)
   
 Ncol_ascii = ascii_table.ncols
-Nrows_ascii = (ascii_table.nrows) - 1 #1st excluded because of the header
+Nrows_ascii = ascii_table.nrows #The header is not counted
 
 print "\n\t\t **** ASCII table details ****"
 print "\t\t Number of columns: %s" % (Ncol_ascii)
@@ -585,17 +295,18 @@ ascii_keywds=[]
 keys_form_unit = {}
 
 for i in range(ascii_table.ncols):
-  tmpKey = str(ascii_table[i][0]).strip()
+  tmpKey = ascii_table.names[i]
   ascii_keywds.append(tmpKey)
-  if tmpKey in _FIELDS_DICTIONARY:
+  if tmpKey in fields_schema:
     keys_form_unit[tmpKey] = {}
-    keys_form_unit[tmpKey]['TFORM'] = _FIELDS_DICTIONARY[tmpKey]['format']
-    keys_form_unit[tmpKey]['TUNIT'] = _FIELDS_DICTIONARY[tmpKey]['unit']
+    keys_form_unit[tmpKey]['TFORM'] = fields_schema.tform(tmpKey)
+    keys_form_unit[tmpKey]['TUNIT'] = fields_schema.tunit(tmpKey)
 
 #Read the fits table
 hdulist = pyfits.open(fits_file)
 fits_header = hdulist[1].header	# HEADER 
 fits_data = hdulist[1].data 		# DATA 
+fits_source = fits_data		# Original DATA (for --in-place)
 
 #Number of columns in FITS table
 Ncol_fits = int(fits_header['TFIELDS'])
@@ -635,19 +346,18 @@ keywds_to_add=[item for item in ascii_keywds if item not in fits_keywds]
 
 print "\n\t%s The following new keyword(s) will be added to the FITS table: " % info , keywds_to_add
 
-#To associate TFORM and TUNIT to each field, first look into _FIELDS_DICTIONARY
-#If nothing is found ther, ask the user to enter them manually
+#To associate TFORM and TUNIT to each field, first look into fields_schema
+#If nothing is found there, the TFORM is inferred from the values of the ASCII column
 for i in range(len(keywds_to_add)):
-  if keywds_to_add[i] not in _FIELDS_DICTIONARY:
+  if keywds_to_add[i] not in fields_schema:
     keys_form_unit[keywds_to_add[i]] = {}
-    message = "\n%s Please enter the format (\'TFORM\') of the new field \"%s\" (e.g.: 5A, E, L, ...): " % (question, keywds_to_add[i])
-    keys_form_unit[keywds_to_add[i]]['TFORM'] = raw_input(message)
-    message = "\n%s Please enter the unit (\'TUNIT\') of the new field \"%s\" (e.g.: None, arcmin, ...): " % (question, keywds_to_add[i])
-    keys_form_unit[keywds_to_add[i]]['TUNIT'] = raw_input(message)
+    keys_form_unit[keywds_to_add[i]]['TFORM'] = infer_tform(ascii_table.strings(keywds_to_add[i]))
+    keys_form_unit[keywds_to_add[i]]['TUNIT'] = 'None'
+    print "\n%s Format of the new field \"%s\" inferred from the data: %s" % (info, keywds_to_add[i], keys_form_unit[keywds_to_add[i]]['TFORM'])
   else:
     keys_form_unit[keywds_to_add[i]] = {}
-    keys_form_unit[keywds_to_add[i]]['TFORM'] = _FIELDS_DICTIONARY[keywds_to_add[i]]['format']
-    keys_form_unit[keywds_to_add[i]]['TUNIT'] = _FIELDS_DICTIONARY[keywds_to_add[i]]['unit']
+    keys_form_unit[keywds_to_add[i]]['TFORM'] = fields_schema.tform(keywds_to_add[i])
+    keys_form_unit[keywds_to_add[i]]['TUNIT'] = fields_schema.tunit(keywds_to_add[i])
         
   # ...to be appended into the 'fits_keywds' array
   fits_keywds.append(keywds_to_add[i])
@@ -665,22 +375,20 @@ columns = []
 for keys in keywds_to_add:
   if keys_form_unit[keys]['TFORM'] == 'E' or keys_form_unit[keys]['TFORM'] == 'D':
     a_tmp = [-1.6375E+30] * Nrows_fits # Initialize Float with empty array
-  elif keys_form_unit[keys]['TFORM'] == 'I':
+  elif keys_form_unit[keys]['TFORM'] in ['I', 'J', 'K']:
     a_tmp = [-1] * Nrows_fits # Initialize Integer with -1 array
   elif keys_form_unit[keys]['TFORM'] == 'L':
     a_tmp = [False] * Nrows_fits # Initialize logical with True array
   elif keys_form_unit[keys]['TFORM'].find('A') >= 0:
     a_tmp = ['Null'] * Nrows_fits
 
-  while True:
-    #Check between field format and values.
-    try:
-      col_tmp = pyfits.Column(name=keys, format=keys_form_unit[keys]['TFORM'], unit=keys_form_unit[keys]['TUNIT'], array=a_tmp)
-      columns.append(col_tmp)
-      break
-    except ValueError:
-      print bcolors.FAIL+ "\n\t\t*** FORMAT INCONSISTENT WITH DATA ***" + bcolors.ENDC
-      keys_form_unit[keys]['TFORM'] = raw_input("\n%s Please, enter again the format (\'TFORM\') of the new field \"%s\": " % (question, keys))
+  #Check between field format and values.
+  try:
+    col_tmp = pyfits.Column(name=keys, format=keys_form_unit[keys]['TFORM'], unit=keys_form_unit[keys]['TUNIT'], array=a_tmp)
+    columns.append(col_tmp)
+  except ValueError:
+    print bcolors.FAIL+ "\n\t\t*** FORMAT \'%s\' OF THE FIELD \"%s\" INCONSISTENT WITH DATA: please fix it in fields_schema.json ***" % (keys_form_unit[keys]['TFORM'], keys) + bcolors.ENDC
+    sys.exit(1)
          
 '''
   *** 1st data UPDATE: new fields added as new columns ***
@@ -699,7 +407,7 @@ fits_data = hdulist.data
   *** Object identification via POSITION matching, NAME or INDEX  ***
 '''
 match_option = False
-match_radius = 300.0 # default = 5 arcmin
+match_radius = DEFAULT_MATCH_RADIUS # default = 5 arcmin
 
 name_index_fits = ''
 name_index_ascii = ''
@@ -714,7 +422,8 @@ while match_option == False:
       print bcolors.FAIL+ "\n\t>> NO %s and %s found in FITS and ASCII tables: POSITION matching not possible <<" % (name_ra_key, name_dec_key) + bcolors.ENDC
     else:
       match_option = method
-      match_radius = float(raw_input('\n\t%s Please enter the match radius (in arcsec): ' % question))
+      answer = raw_input('\n\t%s Please enter the match radius (in arcsec, leave empty for %.0f): ' % (question, DEFAULT_MATCH_RADIUS))
+      if answer.strip(): match_radius = float(answer)
   elif method == '2' : match_option = method
   elif method == '3' :
     check_name_index_fits = False
@@ -733,7 +442,7 @@ while match_option == False:
 	print bcolors.FAIL+ "\n\t*** '%s' NOT in ASCII Keywords ***" % name_index_ascii+ bcolors.ENDC
       else:
 	check_name_index_ascii = True
-	index_ascii = [ (ascii_table[k][j]) for k in range(ascii_table.ncols) if ascii_table[k][0] == name_index_ascii for j in range(1,ascii_table.nrows) ]
+	index_ascii = ascii_table[name_index_ascii]
       
     match_option = method
 
@@ -747,22 +456,9 @@ name_ascii = []
 ra_ascii = []
 dec_ascii = []
 
-for k in range(ascii_table.ncols):
-  if ascii_keywds[k]==name_Name_key:
-    for j in range(ascii_table.nrows -1): name_ascii.append((ascii_table[k][j+1]).strip())
-  if ascii_keywds[k]==name_ra_key:
-    for j in range(ascii_table.nrows -1): ra_ascii.append(float(ascii_table[k][j+1]))
-  elif ascii_keywds[k]==name_dec_key:
-    for j in range(ascii_table.nrows -1): dec_ascii.append(float(ascii_table[k][j+1]))
-
-dist_asec = []
-
-#Two arrays with the indexes of the matching objects
-rowAscii_match = []	# ASCII rows
-rowFits_match = []	# FITS rows
-
-#Array with the indexes of the NEW objects found in the ASCII file (if any)
-rowAscii_new = []
+if name_Name_key in ascii_table: name_ascii = ascii_table.strings(name_Name_key)
+if name_ra_key in ascii_table: ra_ascii = np.asarray(ascii_table[name_ra_key], dtype=float)
+if name_dec_key in ascii_table: dec_ascii = np.asarray(ascii_table[name_dec_key], dtype=float)
 
 method_dict = {
   '1' : 'POSITION (dist < %.1f")' % match_radius,
@@ -772,86 +468,110 @@ method_dict = {
 
 print "\n\t>> Matching ASCII/FITS tables by %s ...\n" % method_dict[method]
 
-num_tot_matches = 0
-for j in range(Nrows_fits):
-  num_multiple_matches = 0
-  id_matches = []
-  ra_dec_matches = []
-  
-  if match_option == '1':
-    tmp_idxs_matches = []
-    tmp_dist_matches = []
-    
+#The matches of a previous run (and the choices among multiple matches) are reused if
+#the matching columns and parameters are unchanged (see match_FITS.match_cache_key)
+match_keys = [name_ra_key, name_dec_key, name_Name_key, name_index_key]
+match_key = match_cache_key(
+  dict((key, fits_data[key]) for key in match_keys + [name_index_fits] if key in fits_data.names),
+  dict((key, ascii_table.strings(key)) for key in match_keys + [name_index_ascii] if key in ascii_table),
+  [match_option, match_radius, name_index_fits, name_index_ascii, max_candidates, auto_match])
+match = None
+#(the candidates table, if requested, needs a new match)
+if '--no-cache' not in options and not candidates_file: match = load_match(match_key, Nrows_fits, Nrows_ascii)
+
+if match is not None:
+  print "\t%s Matches of a previous run reused (same tables and match parameters)" % info
+else:
+  #Matches between FITS and ASCII rows (see match_FITS.MatchResult)
+  match = MatchResult(Nrows_fits, Nrows_ascii)
+
+  #For NAME/INDEX matching, the ASCII rows are looked up through a dictionary
+  ascii_rows_by_key = {}
+  if match_option == '2':
     for i in range(Nrows_ascii):
-      dist_tmp = 3600. * astCoords.calcAngSepDeg(float(ra_fits[j]), float(dec_fits[j]), ra_ascii[i], dec_ascii[i])
-      if dist_tmp <= match_radius:
-	tmp_idxs_matches.append(i)
-	tmp_dist_matches.append(round(dist_tmp,1))
-	num_tot_matches += 1
-	num_multiple_matches += 1
-	
-    idx_match = 0
-    if len( tmp_idxs_matches ) > 1:
-      print bcolors.WARNING+ "\n\t! WARNING ! %i objects found within %.1f arcsec from %s \n" % ( len(tmp_idxs_matches), match_radius, name_fits[j]) + bcolors.ENDC
-      for idx in range( len(tmp_idxs_matches) ): print '\t%i: %s (dist = %s")' % ( (idx+1, name_ascii[ tmp_idxs_matches[idx]], tmp_dist_matches[idx] ) )
-      tmp_check = False
-      while tmp_check == False:
-	tmp_entry = int(raw_input('\t-> Please enter the number of the matching object: '))
-	if tmp_entry in range(1, len(tmp_idxs_matches)+1 ): 
-	  tmp_check = True
-	  idx_match = tmp_idxs_matches[ tmp_entry - 1 ]
-	else:
-	  print bcolors.FAIL+ "\n\t*** Wrong option ***\n"+ bcolors.ENDC
+      ascii_rows_by_key.setdefault(name_ascii[i].strip(), []).append(i)
+  elif match_option == '3':
+    for i in range(Nrows_ascii):
+      if int(index_ascii[i]) >= 0: ascii_rows_by_key.setdefault(int(index_ascii[i]), [i])
+
+  #For POSITION matching, the nearest ASCII objects of all the FITS rows are found at once through a spatial
+  #index of the ASCII objects (in parallel over declination zones, for large tables)
+  if match_option == '1':
+    ascii_index = SkyIndex(ra_ascii, dec_ascii)
+    candidates = crossmatch_knn(ascii_index, ra_fits, dec_fits, match_radius, max_candidates, processes)
+    if candidates_file:
+      candidates.write(candidates_file, name_fits, name_ascii if len(name_ascii) > 0 else None)
+      print "\t%s All the candidate matches are listed in: %s" % (info, candidates_file) + "\n"
+
+  num_tot_matches = 0
+  for j in range(Nrows_fits):
+  
+    if match_option == '1':
+      tmp_idxs_matches = list(candidates.rows[j][candidates.rows[j] >= 0])
+      tmp_dist_matches = [round(dist_tmp,1) for dist_tmp in candidates.distance[j][:len(tmp_idxs_matches)]]
+      num_tot_matches += candidates.count[j]
 	
-      id_matches.append((name_ascii[idx_match]).strip())
-      ra_dec_matches.append(ra_ascii[idx_match])
-      ra_dec_matches.append(dec_ascii[idx_match])
-      
-      # NOTE: When the ascii_table is called, the corresponding index is (rowAscii_match + 1) because of the additional line for the HEADER
-      rowAscii_match.append(idx_match)
-      rowFits_match.append(j)
+      idx_match = 0
+      #The ambiguity is given by all the objects within the radius, not only by the max_candidates nearest ones
+      if candidates.count[j] > 1 and auto_match:
+	#Matched only if the nearest ASCII object has no nearer FITS row
+	if candidates.best_match[j]: match.add(j, tmp_idxs_matches[0], tmp_dist_matches[0])
+      elif candidates.count[j] > 1:
+	if candidates.count[j] > len(tmp_idxs_matches):
+	  #More objects than the candidates kept: all of them are offered, by increasing separation
+	  rows_tmp, rows_ascii_tmp, dist_tmp = ascii_index.query(ra_fits[j], dec_fits[j], match_radius)
+	  order_tmp = np.lexsort((rows_ascii_tmp, dist_tmp))
+	  tmp_idxs_matches = list(rows_ascii_tmp[order_tmp])
+	  tmp_dist_matches = [round(dist_pair, 1) for dist_pair in dist_tmp[order_tmp]]
+	print bcolors.WARNING+ "\n\t! WARNING ! %i objects found within %.1f arcsec from %s \n" % ( candidates.count[j], match_radius, name_fits[j]) + bcolors.ENDC
+	for idx in range( len(tmp_idxs_matches) ): print '\t%i: %s (dist = %s")' % ( (idx+1, name_ascii[ tmp_idxs_matches[idx]], tmp_dist_matches[idx] ) )
+	tmp_check = False
+	while tmp_check == False:
+	  tmp_entry = int(raw_input('\t-> Please enter the number of the matching object: '))
+	  if tmp_entry in range(1, len(tmp_idxs_matches)+1 ): 
+	    tmp_check = True
+	    idx_match = tmp_idxs_matches[ tmp_entry - 1 ]
+	    match.add(j, idx_match, tmp_dist_matches[ tmp_entry - 1 ])
+	  else:
+	    print bcolors.FAIL+ "\n\t*** Wrong option ***\n"+ bcolors.ENDC
 
-    elif len( tmp_idxs_matches ) == 1:
-      idx_match = tmp_idxs_matches[0]
-      
-      id_matches.append((name_ascii[idx_match]).strip())
-      ra_dec_matches.append(ra_ascii[idx_match])
-      ra_dec_matches.append(dec_ascii[idx_match])
-      
-      # NOTE: When the ascii_table is called, the corresponding index is (rowAscii_match + 1) because of the additional line for the HEADER
-      rowAscii_match.append(idx_match)
-      rowFits_match.append(j)
+      elif candidates.count[j] == 1:
+	match.add(j, tmp_idxs_matches[0], tmp_dist_matches[0])
       
-  elif match_option == '2':
-    for i in range(Nrows_ascii):
-      if (name_fits[j]).strip() == (name_ascii[i]).strip():
-	num_multiple_matches += 1
+    elif match_option == '2':
+      rows_tmp = ascii_rows_by_key.get((name_fits[j]).strip(), [])
+      num_tot_matches += len(rows_tmp)
+      if len(rows_tmp) > 1:
+	print '%s Found %i objects with the same name : %s\nAborted.\n' % (error, len(rows_tmp), name_fits[j]); os._exit(0)
+      elif len(rows_tmp) == 1:
+	match.add(j, rows_tmp[0])
+
+    elif match_option == '3':
+      if int(index_fits[j]) >= 0 and int(index_fits[j]) in ascii_rows_by_key:
 	num_tot_matches += 1
-	if num_multiple_matches > 1: 
-	
-	  print '%s Found %i objects with the same name : %s\nAborted.\n' % (error, num_multiple_matches, name_fits[j]); os._exit(0)
-	  
-	# NOTE: When the ascii_table is called, the corresponding index is (rowAscii_match + 1) because of the additional line for the HEADER  
-	rowAscii_match.append(i)
-	rowFits_match.append(j)
+	match.add(j, ascii_rows_by_key[int(index_fits[j])][0])
 
-  elif match_option == '3':
-    for i in range(Nrows_ascii):
-      if int(index_fits[j]) == int(index_ascii[i]) and (int(index_fits[j]) >= 0 and int(index_ascii[i]) >= 0):
-	num_tot_matches += 1
+  save_match(match_key, match)
 
-	# NOTE: When the ascii_table is called, the corresponding index is (rowAscii_match + 1) because of the additional line for the HEADER
-	rowAscii_match.append(i)
-	rowFits_match.append(j)
-	break
+rowFits_match = match.rows_fits		# FITS rows
+rowAscii_match = match.rows_ascii	# ASCII rows
 
-for i in range(Nrows_ascii):
-  if i not in rowAscii_match: rowAscii_new.append(i) # Rows numbers of the NEW clusters, in the ASCII file
+#Rows numbers of the NEW clusters, in the ASCII file
+rowAscii_new = match.rows_ascii_new
 
 print "\n\t%s Found %s matching clusters between FITS/ASCII table to be UPDATED in the FITS table" % (info, len(rowAscii_match))
 
 print "\n\t%s Found %s NEW clusters in the ASCII table to be ADDED to the FITS table" % (info, len(rowAscii_new))
 
+#With --in-place, the matched cells are written directly into the original table, if no rows/columns are added
+#and the new NAME/REDSHIFT_REF fit in their columns (ALT_NAME and PAPER are checked once updated, see cells_delta)
+in_place = False
+if '--in-place' in options:
+  widened_keywds = [key for key in [name_Name_key, name_zRef_key] if key in common_keywds and
+                    ascii_table.max_length(key) > fits_source[key].dtype.itemsize]
+  if len(keywds_to_add) == 0 and len(rowAscii_new) == 0 and len(widened_keywds) == 0: in_place = True
+  else: print "\n\t%s New rows/columns or longer strings: the table cannot be updated in place, a new table will be written" % info
+
 #Store the names of the common/new clusters
 idx_name = fits_keywds.index(name_Name_key)
 clName_fits=[]
@@ -867,7 +587,7 @@ for i, idx in enumerate(rowAscii_match):
   
 for idx in rowAscii_new:
   idx_name = ascii_keywds.index(name_Name_key)
-  new_clNames.append( ascii_table[idx_name][idx+1] )
+  new_clNames.append( ascii_table.strings(idx_name)[idx] )
 
 #Define the MASS conversion factor, only if it is found in ASCII table:
 h_factor = 1.0
@@ -900,24 +620,20 @@ if name_catalog_key in fits_keywds and name_catalog_key not in ascii_keywds and
   *** Update the PAPER column ***
 '''
 paper_flag = False
+names_cache = {}
 updated_paper_vec = []
 max_length_paper = 0
-cnt = 0
 
 #If 'PAPER' is defined in the ASCII table, but it is not in the FITS and there are NO NEW objects, the latter is updated with the former
 if name_paper_key in ascii_keywds and name_paper_key not in fits_keywds and len(rowAscii_new) == 0:
   for j in range(Nrows_fits):
     
     #Update only those clusters specified in the ASCII table
-    if j in rowFits_match:
-      paper_tmp = ascii_table[ascii_keywds.index(name_paper_key)][rowAscii_match[cnt]+1]
-      cnt += 1
+    if match.fits_to_ascii[j] >= 0:
+      paper_tmp = ascii_table.strings(name_paper_key)[match.fits_to_ascii[j]]
     else:
       paper_tmp = "Null"
-    
-    paper_tmp = remove_duplicated_names(paper_tmp)
     updated_paper_vec.append(paper_tmp)
-    if len(paper_tmp) > max_length_paper: max_length_paper = len(paper_tmp)
  
 #If 'PAPER' is defined in the FITS table, it is updated for the common clusters (and created for the new clusters) with the one defined in the ASCII table.
 #If no 'PAPER' is found in ASCII, user is asked to enter it manually.
@@ -928,7 +644,7 @@ elif name_paper_key in fits_keywds:
   if name_paper_key in ascii_keywds:
     paper_flag = True
     for i in range(Nrows_ascii):
-      new_paper_vec.append( ascii_table[ascii_keywds.index(name_paper_key)][i+1].strip() )
+      new_paper_vec.append( ascii_table.strings(name_paper_key)[i] )
   else:
     #The new reference is asked to be added manually only if new clusters are found
     if len(new_clNames)>0:
@@ -941,19 +657,19 @@ elif name_paper_key in fits_keywds:
   #Update those clusters in common with ASCII and FITS table
   for j in range(Nrows_fits):
     paper_old = (fits_data[j][col_paper_fits]).strip()
-    if j in rowFits_match:
+    if match.fits_to_ascii[j] >= 0:
       if paper_old == "Null":
-	paper_tmp = new_paper_vec[ rowAscii_match[cnt] ]	#Here the '+1' correction is not necessary because also new_paper_vec[] contains the header line
-	cnt+=1
+	paper_tmp = new_paper_vec[ match.fits_to_ascii[j] ]	#Here the '+1' correction is not necessary because also new_paper_vec[] contains the header line
       else:
-	paper_tmp = paper_old+"; "+new_paper_vec[ rowAscii_match[cnt] ]	#Here the '+1' correction is not necessary because also new_paper_vec[] contains the header line
-	cnt += 1
+	paper_tmp = paper_old+"; "+new_paper_vec[ match.fits_to_ascii[j] ]	#Here the '+1' correction is not necessary because also new_paper_vec[] contains the header line
     else:
       paper_tmp = paper_old
-  
-    paper_tmp = remove_duplicated_names(paper_tmp)
     updated_paper_vec.append(paper_tmp)
-    if len(paper_tmp) > max_length_paper: max_length_paper = len(paper_tmp)
+
+#The names are cleaned in one go, for the whole column
+if len(updated_paper_vec) > 0:
+  updated_paper_vec = remove_duplicated_names_column(updated_paper_vec, names_cache)
+  max_length_paper = max(len(paper_tmp) for paper_tmp in updated_paper_vec)
   
 #Delete the old 'PAPER' column and update it with a new one defined according to the above case.
 if name_paper_key in fits_keywds and paper_flag: 
@@ -974,7 +690,6 @@ len_ALT_NAME = []
 new_altName_vec = []
 old_altName_vec = []
 new_altName = ""
-cnt = 0
 
 altName_flag = False
 name_in_altName = False
@@ -1000,7 +715,7 @@ if len(common_clNames) > 0:
 
       oldVal_fits = (fits_data[j][col_altName_fits]).strip()
       old_altName_vec.append(oldVal_fits)
-      if j in rowFits_match:
+      if match.fits_to_ascii[j] >= 0:
 	
 	#Adds the NAME to "ALT_NAME", if it does not exist already
 	if name_in_altName:
@@ -1011,16 +726,14 @@ if len(common_clNames) > 0:
 	
 	else: new_altName = oldVal_fits
 	
-	new_altName = remove_duplicated_names(new_altName)
 	new_altName_vec.append(new_altName)
-	len_ALT_NAME.append(len(new_altName))
-
-	cnt += 1
 	  
       else:
-	new_altName = remove_duplicated_names(oldVal_fits)
 	new_altName_vec.append(oldVal_fits)
 
+    new_altName_vec = remove_duplicated_names_column(new_altName_vec, names_cache)
+    len_ALT_NAME = [max(len(item) for item in new_altName_vec)]
+
   elif name_altName_key in ascii_keywds and name_altName_key in fits_keywds:
     
     answer_check = False
@@ -1053,23 +766,19 @@ if len(common_clNames) > 0:
 	for j in range(Nrows_fits):
 	  oldVal_fits = (fits_data[ name_altName_key ][j]).strip()
 	  old_altName_vec.append(oldVal_fits)
-	  if j in rowFits_match:
-	    new_altName = ascii_table[col_altName_ascii][rowAscii_match[cnt]+1]+"; "+name_fits[j]
-	    cnt+=1  
+	  if match.fits_to_ascii[j] >= 0:
+	    new_altName = ascii_table.strings(col_altName_ascii)[match.fits_to_ascii[j]]+"; "+name_fits[j]
 	  else: new_altName = oldVal_fits
 	  
-	  new_altName = remove_duplicated_names(new_altName)
 	  new_altName_vec.append(new_altName)
       else:
 	for j in range(Nrows_fits):
 	  oldVal_fits = (fits_data[ name_altName_key ][j]).strip()
 	  old_altName_vec.append(oldVal_fits)
-	  if j in rowFits_match: 
-	    new_altName = ascii_table[col_altName_ascii][rowAscii_match[cnt]+1]
-	    cnt+=1  
+	  if match.fits_to_ascii[j] >= 0: 
+	    new_altName = ascii_table.strings(col_altName_ascii)[match.fits_to_ascii[j]]
 	  else: new_altName = oldVal_fits
 	  
-	  new_altName = remove_duplicated_names(new_altName)
 	  new_altName_vec.append(new_altName)
 	  
     elif not replace_altName:
@@ -1080,31 +789,29 @@ if len(common_clNames) > 0:
 	for j in range(Nrows_fits):
 	  oldVal_fits = (fits_data[ name_altName_key ][j]).strip()
 	  old_altName_vec.append(oldVal_fits)
-	  if j in rowFits_match:
-	    new_altName = "; ".join([ oldVal_fits, ascii_table[col_altName_ascii][rowAscii_match[cnt]+1], name_fits[j] ])
-	    cnt+=1  
+	  if match.fits_to_ascii[j] >= 0:
+	    new_altName = "; ".join([ oldVal_fits, ascii_table.strings(col_altName_ascii)[match.fits_to_ascii[j]], name_fits[j] ])
 	  else:
 	    new_altName = oldVal_fits
 	  
-	  new_altName = remove_duplicated_names(new_altName)
 	  new_altName_vec.append(new_altName)
       else:
 	for j in range(Nrows_fits):
 	  oldVal_fits = (fits_data[ name_altName_key ][j]).strip()
 	  old_altName_vec.append(oldVal_fits)
-	  if j in rowFits_match: 
-	    if oldVal_fits in [np.nan, "NULL", "NaN", "False"]: new_altName = ascii_table[col_altName_ascii][rowAscii_match[cnt]+1]
+	  if match.fits_to_ascii[j] >= 0: 
+	    if oldVal_fits in [np.nan, "NULL", "NaN", "False"]: new_altName = ascii_table.strings(col_altName_ascii)[match.fits_to_ascii[j]]
 	    else: 
-	      new_altName = "%s; %s" % (oldVal_fits, ascii_table[col_altName_ascii][rowAscii_match[cnt]+1])
-	    cnt+=1  
+	      new_altName = "%s; %s" % (oldVal_fits, ascii_table.strings(col_altName_ascii)[match.fits_to_ascii[j]])
 	  else: new_altName = oldVal_fits
 	  
-	  new_altName = remove_duplicated_names(new_altName)
 	  new_altName_vec.append(new_altName)
 	    
+    new_altName_vec = remove_duplicated_names_column(new_altName_vec, names_cache)
+
     #Compute the max length of ALT_NAME in fits and ascii
     maxLength_altName_fits = max([len(item) for item in fits_data[ name_altName_key ]])
-    maxLength_altName_ascii = max([len(item) for item in ascii_table[col_altName_ascii]])
+    maxLength_altName_ascii = ascii_table.max_length(col_altName_ascii)
     
     maxLength_altName_new = max([len(item) for item in new_altName_vec])
     
@@ -1175,18 +882,18 @@ if len(rowAscii_match) > 0:
       tmp_lenght = coldefs.formats[index_fits_field].split('A')[0]
     elif coldefs.formats[index_fits_field].find('E') >= 0 or coldefs.formats[index_fits_field].find('D') >= 0:
       tmp_lenght = '15' #For float and double, string size fixed to 15
-    elif coldefs.formats[index_fits_field].find('I') >= 0:
-      max_len_int =  max(len(str(elem).strip()) for elem in ascii_table[index_ascii_field])
+    elif tform_code(coldefs.formats[index_fits_field]) in ['I', 'J', 'K']:
+      max_len_int =  ascii_table.max_length(index_ascii_field)
       tmp_lenght = str(max_len_int + 3)
     elif coldefs.formats[index_fits_field].find('L') >= 0:
       tmp_lenght = '6'
     
     length_new_field.append( max( int(tmp_lenght), len(fields)+3 ) )
-      
-  file_report.write("\n# >>>> CLUSTERS PROPERTIES ** UPDATED ** IN THE FITS TABLE <<<<\n\n")
-  to_write = ""
 
-  #Write/format the header of each column
+  #The widths of the old/new values are computed once per field
+  max_len_old_vec = []
+  max_len_new_vec = []
+
   for tmp, fields in enumerate(ascii_keywds):
     
     max_len_new = length_new_field[tmp]
@@ -1201,7 +908,7 @@ if len(rowAscii_match) > 0:
       #Update the length of NAME or REDSHIFT_REF (increase its TFORM) if necessary
       #by comparing the max length of its values in old (fits) and new (ascii) file
       maxLength_fits = max([len(item) for item in fits_data[fields]])
-      maxLength_ascii = max([len(item) for item in ascii_table[index_ascii_field_vec[tmp]] ])
+      maxLength_ascii = ascii_table.max_length(index_ascii_field_vec[tmp])
       
       #If ascii names are longer than in fits, NAME is deleted and re-created with a bigger format, but keeping (for the moment) the old values
       if maxLength_ascii > maxLength_fits:
@@ -1209,7 +916,7 @@ if len(rowAscii_match) > 0:
 	
 	new_format = '%sA' % maxLength_ascii
 
-	hdulist = recreate_reformatted_column(hdulist, fields, new_format, hdulist.data[fields] ) #ascii_table[index_ascii_field_vec[tmp]])
+	hdulist = recreate_reformatted_column(hdulist, fields, new_format, hdulist.data[fields] )
 
     #Define lengths for ALT_NAME
     elif fields == name_altName_key and altName_flag:
@@ -1220,12 +927,15 @@ if len(rowAscii_match) > 0:
     elif fields == name_paper_key and paper_flag:
       max_len_new = max_length_paper
 
-    label_tot_length = str(int(max_len_old) + int(max_len_new) +3) #+3 because of  ' | '
-    formatting = '{0:^%ss}' % (label_tot_length)
-  
-    to_write += formatting.format( fields )
-    
-  file_report.write(to_write+"\n")
+    max_len_old_vec.append(max_len_old)
+    max_len_new_vec.append(max_len_new)
+
+  #Write/format the header of each column
+  file_report.start_section('updated', "\n# >>>> CLUSTERS PROPERTIES ** UPDATED ** IN THE FITS TABLE <<<<\n\n", ascii_keywds, max_len_new_vec, max_len_old_vec)
+
+  #Columns of each field in the (final) FITS and ASCII tables
+  kwCol_fits_vec = [hdulist.data.names.index(fields) for fields in ascii_keywds]
+  ascii_strings_vec = [ascii_table.strings(fields) for fields in ascii_keywds]
 
   #Write/format the values of each column
   for r, idx in enumerate(rowAscii_match):
@@ -1234,51 +944,41 @@ if len(rowAscii_match) > 0:
     clRow_fits = rowFits_match[r]
     clRow_ascii = idx #rowAscii_match[r]
     
-    to_write = "\n"
+    old_values = []
+    new_values = []
 
     for tmp, fields in enumerate(ascii_keywds): 
       
-      kwCol_fits = hdulist.data.names.index(fields)
-      kwCol_ascii = ascii_keywds.index(fields)
+      kwCol_fits = kwCol_fits_vec[tmp]
 	
       oldVal_fits = hdulist.data[clRow_fits][kwCol_fits]
-      newVal_ascii = ascii_table[kwCol_ascii][clRow_ascii+1] #the '+1' correction is needed because of the additional HEADER line
-          
+      newVal_ascii = ascii_strings_vec[tmp][clRow_ascii]
+	  
       #Updates values...
 
       # Set undefined values to  '-' or -1.6375e+30
       if str(newVal_ascii).strip() in ['', '-', '-1.6375E+30', '-1.6375e+30']:
 	#String
 	if keys_form_unit[fields]['TFORM'].find('A') >=0 : newVal_ascii = '-'
+	#Integer
+	elif tform_code(keys_form_unit[fields]['TFORM']) in ['I', 'J', 'K'] : newVal_ascii = -1
 	#Not string
-	else : 	newVal_ascii = -1.6375e+30 
+	else :  newVal_ascii = -1.6375e+30 
 
       if (fields in name_mass_key or fields in name_errMass_key) and newVal_ascii != -1.6375e+30:
 	newVal_ascii = h_factor * float(newVal_ascii)
       
-      max_len_new = length_new_field[tmp]
-      
-      if fields in fits_keywds:
-	max_len_old = max(len(str(elem).strip()) for elem in fits_data[fields])
-      else:
-	max_len_old = max_len_new
-      
       #if ALT_NAME has changed, write it in the report even if it is not an ASCII field
       if fields == name_altName_key and altName_flag:
-	max_len_old = max([len(item) for item in old_altName_vec])
-	max_len_new = max([len(item) for item in new_altName_vec])
-	
 	oldVal_fits = old_altName_vec[clRow_fits]
 	newVal_ascii = new_altName_vec[clRow_fits]
 	  
       elif fields == name_paper_key and paper_flag:
-	max_len_new = max_length_paper
-	
 	oldVal_fits = fits_data[name_paper_key][clRow_fits]
-	newVal_ascii = new_paper_vec[clRow_ascii]	
+	newVal_ascii = new_paper_vec[clRow_ascii]       
       
-      formatting = ' {0:>%ss} | {1:<%ss} ' % (max_len_old, max_len_new)
-      to_write += formatting.format(str(oldVal_fits), str(newVal_ascii))
+      old_values.append(oldVal_fits)
+      new_values.append(newVal_ascii)
 	    
       #Update values for Boolean fields...
       if keys_form_unit[fields]['TFORM'] == 'L':
@@ -1290,7 +990,7 @@ if len(rowAscii_match) > 0:
 	except:
 	  if str(newVal_ascii) == 'nan': hdulist.data[clRow_fits][kwCol_fits] = np.nan
 
-    file_report.write(to_write)
+    file_report.write_row(clRow_fits, new_values, old_values)
 
 
 #Write summary for NEW clusters (if any)
@@ -1301,8 +1001,6 @@ for i in range(Ncol_fits):
   fits_keywds.append(hdulist.data.names[i])
 
 if len(rowAscii_new) > 0: 
-  file_report.write("\n\n# >>>> NEW CLUSTERS ** ADDED ** TO THE FITS TABLE <<<<\n\n")
-  to_write = ""
   tmp = 0
   for fields in fits_keywds:
     
@@ -1313,7 +1011,7 @@ if len(rowAscii_new) > 0:
       tmp_length = format_tmp.split('A')[0]
     elif format_tmp.find('E') >= 0 or format_tmp.find('D') >= 0:
       tmp_length = '15' #For float and double, string size fixed to 15
-    elif format_tmp.find('I') >= 0:
+    elif tform_code(format_tmp) in ['I', 'J', 'K']:
       index_fits_field = fits_keywds.index(fields)
       max_len_int =  len(str(fits_data[-1][index_fits_field]))
       tmp_length = str(max_len_int+3)
@@ -1321,33 +1019,36 @@ if len(rowAscii_new) > 0:
       tmp_length = '6' #For boolean, string size fixed to 6
       
     length_label_vec.append( max( int(tmp_length), len(fields)+3 ) )
-    
-    formatting = '{0:^%ss}' % (length_label_vec[-1])
-    
-    to_write +=formatting.format( fields )
     tmp +=1
     
-  file_report.write(to_write+"\n")
+  file_report.start_section('new', "\n\n# >>>> NEW CLUSTERS ** ADDED ** TO THE FITS TABLE <<<<\n\n", fits_keywds, length_label_vec)
+
+  #Format and columns of each field, in the FITS and ASCII tables
+  format_field_vec = [coldefs.formats[coldefs.names.index(field)] for field in fits_keywds]
+  ascii_strings_vec = [ascii_table.strings(field) if field in ascii_keywds else None for field in fits_keywds]
+
+  #Galactic coordinates of all the new clusters, computed in one go from RA, DEC (if any)
+  if len(ra_ascii) > 0 and len(dec_ascii)>0:
+    glon_new, glat_new = astCoords.convertCoordsArray('J2000', 'GALACTIC', ra_ascii[rowAscii_new], dec_ascii[rowAscii_new], 2000)
 
   j = 0
 
   for name in new_clNames:
     
-    to_write = "\n"
+    new_values = []
     for k, field in enumerate(fits_keywds):
-      index_field = coldefs.names.index(field)
-      format_field = coldefs.formats[index_field]
+      format_field = format_field_vec[k]
 
-      kwCol_fits = fits_keywds.index(field)
+      kwCol_fits = k
       oldVal_fits = hdulist.data[Nrows_fits+j][kwCol_fits]	# Add rows after the last one, filling the empty ones...
       
       if field in ascii_keywds:
-	kwCol_ascii = ascii_keywds.index(field)      
-	
-	newVal_ascii = ascii_table[kwCol_ascii][rowAscii_new[j]+1]
+	newVal_ascii = ascii_strings_vec[k][rowAscii_new[j]]
 	
 	if format_field.find('A') >= 0 and (newVal_ascii.strip()).upper() in ['', '-', "NULL", "NAN", "NONE", "FALSE"]: newVal_ascii = '-'
 	elif str(newVal_ascii).strip() in ['-1.6375E+30', '-1.6375e+30']:  newVal_ascii = -1.6375e+30
+	elif format_field in ['I', 'J', 'K'] and newVal_ascii.strip() in ['', '-']:  newVal_ascii = -1
+	elif format_field in ['E', 'D'] and newVal_ascii.strip() in ['', '-']:  newVal_ascii = -1.6375e+30
 	if (fields in name_mass_key or fields in name_errMass_key) and newVal_ascii != -1.6375e+30:
 	  newVal_ascii = h_factor * float(newVal_ascii)
       else:
@@ -1362,9 +1063,9 @@ if len(rowAscii_new) > 0:
 	  
 	#Galactic coordinates are created from RA, DEC (if any)
 	elif field == 'GLON':
-	  if len(ra_ascii) > 0 and len(dec_ascii)>0:  newVal_ascii = round(astCoords.convertCoords('J2000', 'GALACTIC', ra_ascii[rowAscii_new[j]], dec_ascii[rowAscii_new[j]], 2000)[0], 5)
+	  if len(ra_ascii) > 0 and len(dec_ascii)>0:  newVal_ascii = round(glon_new[j], 5)
 	elif field == 'GLAT':
-	  if len(ra_ascii) > 0 and len(dec_ascii)>0:  newVal_ascii = round(astCoords.convertCoords('J2000', 'GALACTIC', ra_ascii[rowAscii_new[j]], dec_ascii[rowAscii_new[j]], 2000)[1], 5)
+	  if len(ra_ascii) > 0 and len(dec_ascii)>0:  newVal_ascii = round(glat_new[j], 5)
 
 	elif field == name_zErr_key:
 	  newVal_ascii = np.nan
@@ -1376,9 +1077,9 @@ if len(rowAscii_new) > 0:
 	  newVal_ascii = False
 	elif field in name_coordinates_keys:
 	  newVal_ascii = np.nan
-	elif format_field == 'I':
+	elif format_field in ['I', 'J', 'K']:
 	  newVal_ascii = -1
-	elif format_field == 'E': #FLOAT
+	elif format_field in ['E', 'D']: #FLOAT
 	  newVal_ascii = -1.6375E+30
 	elif format_field.find("A") >= 0: #STRING
 	  newVal_ascii = 'Null'
@@ -1394,12 +1095,35 @@ if len(rowAscii_new) > 0:
 	  if str(newVal_ascii) == 'nan': hdulist.data[Nrows_fits][kwCol_fits] = np.nan
 	  else: print  '%s A problem occurred for cluster Name = %s : field = %s , value = %s \nAborted.\n' % (error, name, field, newVal_ascii); os._exit(0)
       
-      formatting = '{0:^%ss}' % (length_label_vec[k])
-      to_write += formatting.format( str(newVal_ascii) )
+      new_values.append(newVal_ascii)
+    file_report.write_row(Nrows_fits+j, new_values)
     j += 1
-    file_report.write(to_write)
 
 
+'''
+  *** --in-place: the changed cells of the matched rows are written directly into the original table ***
+'''
+if in_place:
+  #Only the matched rows are compared with the original table, once their 'undef' values are set
+  try:
+    delta = cells_delta(fits_source, rowFits_match, set_undef_values(hdulist.data[rowFits_match]), checksums='--delta' in options)
+  except ValueError, err:
+    print "\n\t%s %s: the table cannot be updated in place, a new table will be written" % (info, err)
+    in_place = False
+
+if in_place:
+  file_report.close()
+  file_output = fits_file
+  ncells = update_in_place(file_output, json.loads(str(delta['meta'])), delta, check=False)
+  print "\n\t>> %i cell(s) updated in place in:" % ncells + bcolors.OKGREEN + " %s " % (file_output) + bcolors.ENDC
+  print "\t%s The header is unchanged: no Version number nor EXTNAME are asked" % info
+  print "\t>> Details of the applied updates are reported in:" + bcolors.OKGREEN + " %s " % (file_report_name) + bcolors.ENDC + "\n"
+  if '--delta' in options:
+    file_delta = os.path.splitext(os.path.basename(fits_file))[0] + '.delta.npz'
+    write_delta(file_delta, delta)
+    print "\t>> Delta of the update of %s written in:" % (fits_file) + bcolors.OKGREEN + " %s " % (file_delta) + bcolors.ENDC + "\n"
+  sys.exit(0)
+
 '''
   *** 4th data UPDATE: update the fits HEADER with the Version number and the creation date ***
 '''
@@ -1461,3 +1185,9 @@ file_output = extname+'.fits'
 print "\n\t>> New updated file:" + bcolors.OKGREEN + " %s " % (file_output) + bcolors.ENDC
 print "\t>> Details of the applied updates are reported in:" + bcolors.OKGREEN + " %s " % (file_report_name) + bcolors.ENDC + "\n"
 hdulist.writeto(file_output)
+
+#Store only the changes with respect to the original table
+if '--delta' in options:
+  file_delta = extname+'.delta.npz'
+  write_delta(file_delta, compute_delta(pyfits.open(fits_file)[1].data, hdulist[1].data))
+  print "\t>> Delta from %s to %s written in:" % (fits_file, file_output) + bcolors.OKGREEN + " %s " % (file_delta) + bcolors.ENDC + "\n"
@@ -45,6 +45,9 @@ import numpy as np
 import os, sys, re, math
 from time import time
 
+#PostgreSQL types of the FITS formats (see schema_FITS.py)
+from schema_FITS import sql_type
+
 class bcolors:
     HEADER = '\033[95m'
     OKBLUE = '\033[94m'
@@ -53,31 +56,6 @@ class bcolors:
     FAIL = '\033[91m'
     ENDC = '\033[0m'
 
-PSQL_FORMAT = {
-  'L' : 'boolean DEFAULT false',
-  #'X':  'TBD',   #bit                            
-  #'B':  'TBD',   #Unsigned byte                  
-  'I' : 'integer DEFAULT (-1) NOT NULL',
-  'J' : 'real DEFAULT (- (1.6375E+30::numeric)::real)',
-  'K' : 'real DEFAULT (- (1.6375E+30::numeric)::real)',
-  'E' : 'real DEFAULT (- (1.6375E+30::numeric)::real)',
-  'D' : 'real DEFAULT (- (1.6375E+30::numeric)::real)',
-  'A' : 'character varying(1027)'
-  #'C': 'TBD', #single precision complex       
-  #'M': 'TBD', #double precision complex       
-  #'P': 'TBD', #array descriptor               
-  #'Q': 'TBD'  #array descriptor               
-  }
-
-def convert_into_SQL_format(fits_format):
-  """Convert from FITS to PSQL formats"""
-  formats = 'LXBIJKAEDCMPQ'
-  psql_format = ''
-  for char in formats:
-    if len(fits_format.split(char)) > 1:
-      psql_format = PSQL_FORMAT[char]      
-  return psql_format
-
 def RADECtoXYZ(RA,DEC):
   """Convert RA DEC pointing to X Y Z"""
   #convert degrees to radians
@@ -196,7 +174,7 @@ print '\n- Creating/updating the table...\n'
 createTable_cmd = "CREATE TABLE %s (id integer PRIMARY KEY" % dataset
 for j, name in enumerate(fields):
   
-  createTable_cmd += ", %s %s" % (name, convert_into_SQL_format(fields_format[j]) )
+  createTable_cmd += ", %s %s" % (name, sql_type(fields_format[j]) )
   
 createTable_cmd +=");"
 cur.execute(createTable_cmd)
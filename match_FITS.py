@@ -0,0 +1,342 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Book-keeping of the matches between the rows of a FITS table and the rows
+of an ASCII table (objects identified by position, name or index), and the
+spatial index used for the matches by position (optionally run in parallel
+over declination zones).
+
+The matches can be cached (in MATCH_CACHE_DIR), keyed on the columns and the
+parameters used to compute them, so that they are not recomputed when the
+same tables are matched again.
+'''
+
+import numpy as np
+import os, csv, hashlib
+import multiprocessing
+import astCoords
+
+#Default radius (arcsec) of the matches by position, shared by all the matching modes
+DEFAULT_MATCH_RADIUS = 300.0
+
+#Minimum number of positions for which a query is worth a pool of processes
+_PARALLEL_MIN_SIZE = 5000
+
+class MatchResult:
+  '''
+  Matches between FITS rows and ASCII rows.
+
+  Each FITS row is matched to (at most) one ASCII row:
+    - fits_to_ascii[j] is the ASCII row of FITS row j (-1 if not matched)
+    - ascii_matched[i] is True if ASCII row i is matched to any FITS row
+    - distance[j] is the separation (arcsec) of the pair, NaN if not computed
+
+  Note that the ASCII rows start from 0, i.e. the header line is not counted.
+  '''
+  def __init__(self, nrows_fits, nrows_ascii):
+    self.fits_to_ascii = np.zeros(nrows_fits, dtype=int) - 1
+    self.ascii_matched = np.zeros(nrows_ascii, dtype=bool)
+    self.distance = np.zeros(nrows_fits) + np.nan
+
+  def add(self, row_fits, row_ascii, distance=np.nan):
+    '''Store the match between FITS row 'row_fits' and ASCII row 'row_ascii' '''
+    self.fits_to_ascii[row_fits] = row_ascii
+    self.ascii_matched[row_ascii] = True
+    self.distance[row_fits] = distance
+
+  def __len__(self):
+    return int(np.count_nonzero(self.fits_to_ascii >= 0))
+
+  @property
+  def fits_matched(self):
+    '''Boolean mask of the matched FITS rows'''
+    return self.fits_to_ascii >= 0
+
+  @property
+  def rows_fits(self):
+    '''FITS rows with a match, in ascending order'''
+    return np.flatnonzero(self.fits_to_ascii >= 0)
+
+  @property
+  def rows_ascii(self):
+    '''ASCII rows matched to rows_fits (same order)'''
+    return self.fits_to_ascii[self.fits_to_ascii >= 0]
+
+  @property
+  def rows_ascii_new(self):
+    '''ASCII rows not matched to any FITS row, i.e. the NEW objects'''
+    return np.flatnonzero(~self.ascii_matched)
+
+class SkyIndex:
+  '''
+  Spatial index of a catalogue (RA, DEC in decimal degrees), built once and
+  shared by all the cross-matches against it: a thin layer over
+  astCoords.SkyCatalogue (objects sorted by DEC, each position compared only
+  with the objects in the band [DEC - radius, DEC + radius]), taking the
+  radii and giving the separations in arcsec.
+  '''
+  def __init__(self, ra, dec):
+    self.catalogue = astCoords.SkyCatalogue(ra, dec)
+    self.size = len(self.catalogue)
+
+  def query(self, ra, dec, radius, processes=1):
+    '''
+    Find all the objects within 'radius' (arcsec) from each position.
+    Returns three arrays describing the pairs: rows of the positions, rows of
+    the indexed objects and separations (arcsec).
+    With processes > 1 (None = all the CPUs), large queries are split into
+    declination zones matched in parallel (see crossmatch_parallel).
+    '''
+    ra = np.atleast_1d(np.asarray(ra, dtype=float))
+    dec = np.atleast_1d(np.asarray(dec, dtype=float))
+    if processes is None: processes = multiprocessing.cpu_count()
+    if processes > 1 and len(ra) >= _PARALLEL_MIN_SIZE:
+      return crossmatch_parallel(self, ra, dec, radius, processes)
+    return _query_catalogue(self.catalogue, ra, dec, radius)
+
+  def nearest(self, ra, dec, radius, processes=1):
+    '''
+    Nearest indexed object within 'radius' (arcsec) from each position.
+    Returns the rows of the objects (-1 if none) and the separations (arcsec).
+    '''
+    nquery = len(np.atleast_1d(ra))
+    rows_query, rows_index, dist = self.query(ra, dec, radius, processes)
+    best = np.zeros(nquery, dtype=int) - 1
+    best_dist = np.zeros(nquery) + np.nan
+    first = _first_of_groups(rows_query, dist)
+    best[rows_query[first]] = rows_index[first]
+    best_dist[rows_query[first]] = dist[first]
+    return best, best_dist
+
+def _first_of_groups(keys, dist):
+  '''
+  Indices of the pairs with the smallest 'dist' for each value of 'keys' (the
+  first one in case of ties), one per key. Explicit selection, since the order
+  of the writes of a fancy-indexed assignment with repeated indices is not
+  guaranteed by NumPy.
+  '''
+  order = np.lexsort((dist, keys))
+  first = np.ones(len(order), dtype=bool)
+  first[1:] = keys[order][1:] != keys[order][:-1]
+  return order[first]
+
+def _query_catalogue(catalogue, ra, dec, radius):
+  '''Pairs within 'radius' (arcsec) between the positions and a SkyCatalogue (see SkyIndex.query)'''
+  rows_query, rows_index, dist = catalogue.pairs(ra, dec, radius/3600.)
+  return rows_query, rows_index, 3600. * dist
+
+def _query_zone(args):
+  '''Worker of crossmatch_parallel: pairs of the positions of one zone (rows given back in the full tables)'''
+  ra_index, dec_index, rows_index_zone, ra, dec, rows, radius = args
+  catalogue = astCoords.SkyCatalogue(ra_index, dec_index)
+  rows_query, rows_index, dist = _query_catalogue(catalogue, ra, dec, radius)
+  return rows[rows_query], rows_index_zone[rows_index], dist
+
+def crossmatch_parallel(index, ra, dec, radius, processes=None, zones=None):
+  '''
+  Same result as index.query(ra, dec, radius), computed by a pool of
+  'processes' (None = all the CPUs).
+
+  The sky is split into declination zones holding the same number of
+  positions ('zones', default is 4 per process, to balance the load).
+  Each zone gets the indexed objects within its DEC range widened by 'radius'
+  (overlap margins), so that the pairs across the boundaries are not lost.
+  Each position is owned by one zone only, so a pair found in the margins of
+  two zones is kept once, by the zone owning the position.
+  The pairs are returned sorted by position and separation.
+  '''
+  ra = np.atleast_1d(np.asarray(ra, dtype=float))
+  dec = np.atleast_1d(np.asarray(dec, dtype=float))
+  if processes is None: processes = multiprocessing.cpu_count()
+  if zones is None: zones = 4 * processes
+
+  rows = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+  if len(rows) == 0:
+    return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+  bounds = np.percentile(dec[rows], np.linspace(0., 100., zones + 1)[1:-1])
+  owner = np.searchsorted(bounds, dec[rows], side='right')
+  edges = np.concatenate([[-90.], bounds, [90.]])
+  margin = radius / 3600.
+
+  catalogue = index.catalogue
+  tasks = []
+  for z in range(zones):
+    rows_zone = rows[owner == z]
+    if len(rows_zone) == 0: continue
+    lo = np.searchsorted(catalogue.decSorted, edges[z] - margin, side='left')
+    hi = np.searchsorted(catalogue.decSorted, edges[z+1] + margin, side='right')
+    rows_band = catalogue.order[lo:hi]
+    tasks.append((catalogue.RADeg[rows_band], catalogue.decDeg[rows_band], rows_band, ra[rows_zone], dec[rows_zone], rows_zone, radius))
+
+  pool = multiprocessing.Pool(processes)
+  try:
+    results = pool.map(_query_zone, tasks)
+  finally:
+    pool.close()
+    pool.join()
+
+  rows_query = np.concatenate([result[0] for result in results])
+  rows_index = np.concatenate([result[1] for result in results])
+  dist = np.concatenate([result[2] for result in results])
+  order = np.lexsort((dist, rows_query))
+  return rows_query[order], rows_index[order], dist[order]
+
+def match_by_position(index, ra, dec, radius, processes=1):
+  '''
+  Match the positions (e.g. the rows of an ASCII table) to the objects of a
+  SkyIndex (e.g. the rows of a FITS table), without user interaction: the
+  pairs within 'radius' (arcsec) are taken by increasing separation, each
+  position and each object being matched at most once. So a position goes to
+  its nearest object but, if a closer position has already taken it, it falls
+  back to its next-nearest free object within the radius (if any), instead of
+  being left as a new object.
+  Returns a MatchResult (FITS rows = indexed objects).
+  '''
+  ra = np.atleast_1d(np.asarray(ra, dtype=float))
+  rows_query, rows_index, dist = index.query(ra, dec, radius, processes)
+  match = MatchResult(index.size, len(ra))
+  for p in np.lexsort((rows_index, rows_query, dist)):
+    if match.ascii_matched[rows_query[p]] or match.fits_to_ascii[rows_index[p]] >= 0: continue
+    match.add(rows_index[p], rows_query[p], dist[p])
+  return match
+
+class Candidates:
+  '''
+  The k nearest objects (e.g. ASCII rows) within the match radius of each
+  position (e.g. FITS row), as returned by crossmatch_knn:
+    - rows[j, r] is the r-th nearest object of position j (-1 if none)
+    - distance[j, r] is its separation (arcsec), NaN if none
+    - count[j] is the number of objects within the radius (it can be > k)
+    - best_match[j] is True if rows[j, 0] and j are mutual nearest
+      neighbours, i.e. j is also the nearest position of that object
+    - unique[j] is True if j has only one object within the radius, and
+      this object has no other position within the radius
+  '''
+  def __init__(self, rows, distance, count, best_match, unique):
+    self.rows = rows
+    self.distance = distance
+    self.count = count
+    self.best_match = best_match
+    self.unique = unique
+
+  def __len__(self):
+    return len(self.count)
+
+  def write(self, filename, names_fits=None, names_ascii=None):
+    '''Write all the candidate pairs into a CSV file, for review'''
+    f = open(filename, 'wb')
+    try:
+      writer = csv.writer(f)
+      writer.writerow(['ROW_FITS', 'NAME_FITS', 'RANK', 'ROW_ASCII', 'NAME_ASCII', 'DIST_ARCSEC', 'N_CANDIDATES', 'BEST_MATCH', 'UNIQUE'])
+      for j, rank in zip(*np.nonzero(self.rows >= 0)):
+        row = self.rows[j, rank]
+        writer.writerow([j, '' if names_fits is None else str(names_fits[j]).strip(), rank + 1, row,
+                         '' if names_ascii is None else str(names_ascii[row]).strip(), '%.2f' % self.distance[j, rank],
+                         self.count[j], self.best_match[j] and rank == 0, self.unique[j]])
+    finally:
+      f.close()
+
+def crossmatch_knn(index, ra, dec, radius, k=5, processes=1):
+  '''
+  Find the k nearest objects of 'index' (SkyIndex) within 'radius' (arcsec)
+  from each position, with their separations and the best-match/unique
+  flags (see Candidates). No choice is asked to the user.
+  '''
+  ra = np.atleast_1d(np.asarray(ra, dtype=float))
+  nquery = len(ra)
+  rows_query, rows_index, dist = index.query(ra, dec, radius, processes)
+
+  #Rank of each pair among the pairs of the same position, by separation
+  order = np.lexsort((dist, rows_query))
+  rows_query, rows_index, dist = rows_query[order], rows_index[order], dist[order]
+  rank = np.arange(len(rows_query)) - np.searchsorted(rows_query, rows_query, side='left')
+
+  rows = np.zeros((nquery, k), dtype=int) - 1
+  distance = np.zeros((nquery, k)) + np.nan
+  kept = rank < k
+  rows[rows_query[kept], rank[kept]] = rows_index[kept]
+  distance[rows_query[kept], rank[kept]] = dist[kept]
+  count = np.bincount(rows_query, minlength=nquery)
+
+  #Nearest position of each object, and number of positions within the radius of each object
+  nearest_query = np.zeros(index.size, dtype=int) - 1
+  first = _first_of_groups(rows_index, dist)
+  nearest_query[rows_index[first]] = rows_query[first]
+  count_index = np.bincount(rows_index, minlength=index.size)
+
+  found = count > 0
+  best_match = np.zeros(nquery, dtype=bool)
+  best_match[found] = nearest_query[rows[found, 0]] == np.flatnonzero(found)
+  unique = np.zeros(nquery, dtype=bool)
+  unique[found] = (count[found] == 1) & (count_index[rows[found, 0]] == 1)
+  return Candidates(rows, distance, count, best_match, unique)
+
+#Directory of the cached matches (see save_match/load_match), relative to the
+#current directory. It is never pruned: delete it to clear the cache
+MATCH_CACHE_DIR = '.match_cache'
+
+def _update_hash(md5, column):
+  column = np.asarray(column)
+  if column.dtype.kind in 'SU':
+    md5.update('\x00'.join(str(item).strip() for item in column).encode('utf-8'))
+  else:
+    md5.update(np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('>')).tostring())
+
+def match_cache_key(fits_columns, ascii_columns, params):
+  '''
+  Key of a match: MD5 of the columns used to match the objects (dictionaries
+  name -> values, e.g. RA, DEC, NAME, INDEX, of the FITS and of the ASCII
+  tables) and of the match parameters (method, radius, ...).
+  '''
+  md5 = hashlib.md5()
+  for label, columns in [('FITS', fits_columns), ('ASCII', ascii_columns)]:
+    for name in sorted(columns):
+      md5.update(('%s:%s:%i;' % (label, name, len(columns[name]))).encode('utf-8'))
+      _update_hash(md5, columns[name])
+  md5.update(repr([str(param) for param in params]).encode('utf-8'))
+  return md5.hexdigest()
+
+def save_match(key, match, cache_dir=MATCH_CACHE_DIR):
+  '''Store a MatchResult (including the choices among multiple matches) in the cache, under 'key' '''
+  if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+  f = open(os.path.join(cache_dir, key + '.npz'), 'wb')
+  try:
+    np.savez_compressed(f, fits_to_ascii=match.fits_to_ascii, ascii_matched=match.ascii_matched, distance=match.distance)
+  finally:
+    f.close()
+
+def load_match(key, nrows_fits, nrows_ascii, cache_dir=MATCH_CACHE_DIR):
+  '''MatchResult stored under 'key', or None if not in the cache (or not valid)'''
+  filename = os.path.join(cache_dir, key + '.npz')
+  if not os.path.exists(filename): return None
+  try:
+    npz = np.load(filename)
+  except (IOError, ValueError):
+    return None
+  #The file is closed also when the cached match is not valid
+  try:
+    if len(npz['fits_to_ascii']) != nrows_fits or len(npz['ascii_matched']) != nrows_ascii: return None
+    match = MatchResult(nrows_fits, nrows_ascii)
+    match.fits_to_ascii[:] = npz['fits_to_ascii']
+    match.ascii_matched[:] = npz['ascii_matched']
+    match.distance[:] = npz['distance']
+  except (IOError, KeyError, ValueError):
+    return None
+  finally:
+    npz.close()
+  return match
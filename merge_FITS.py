@@ -0,0 +1,261 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Merge of several ASCII catalogues into a master FITS table in one pass,
+used by edits_FITS_table.py when more than one ASCII file is given.
+
+  - The master table is indexed only once (SkyIndex), and each catalogue is
+    matched against it by POSITION, without user interaction.
+  - The catalogues are given in order of PRIORITY: when several of them
+    give a (defined) value for the same cell, the first one wins.
+    The composite fields (ALT_NAME, PAPER) are joined instead.
+  - A NAME of the master table replaced by a catalogue is not lost: it is
+    appended to the ALT_NAME of the cluster (the column is added if needed),
+    as the single-file mode of edits_FITS_table.py does on request.
+  - The objects not in the master table are matched among the catalogues,
+    so that the same new cluster is added only once.
+  - The new table is built and written only once.
+
+Each ASCII file can be given as <CATALOG>=<ascii_file>: <CATALOG> is the value
+of the CATALOG field for its new clusters (default is the name of the file).
+'''
+
+import numpy as np
+import os
+import pyfits
+
+import astCoords
+from match_FITS import SkyIndex, match_by_position
+from names_FITS import remove_duplicated_names_column
+from read_ASCII import read_ascii_table
+from schema_FITS import convert_strings, infer_tform, tform_code
+
+name_ra_key = 'RA'
+name_name_key = 'NAME'
+name_altname_key = 'ALT_NAME'
+name_dec_key = 'DEC'
+name_glon_key = 'GLON'
+name_glat_key = 'GLAT'
+name_index_key = 'INDEX'
+name_catalog_key = 'CATALOG'
+
+#Fields whose values are joined (separated by ';') rather than replaced
+_JOINED_FIELDS = ['ALT_NAME', 'PAPER']
+
+def parse_input(argument):
+  '''Split an argument <CATALOG>=<ascii_file> into (CATALOG, ascii_file)'''
+  if '=' in argument and not os.path.exists(argument):
+    label, filename = argument.split('=', 1)
+  else:
+    filename = argument
+    label = os.path.splitext(os.path.basename(argument))[0]
+  return label, filename
+
+def _undef_column(tform, nrows):
+  '''Column of 'nrows' undefined values for the format 'tform' '''
+  code = tform_code(tform)
+  if code == 'A': return np.array(['-'] * nrows, dtype=object)
+  if code == 'L': return np.zeros(nrows, dtype=bool)
+  if code in 'BIJK': return np.zeros(nrows, dtype=np.int64) - 1
+  return np.zeros(nrows) + np.nan
+
+def _fits_column(fits_data, name):
+  '''Column of the FITS table in the form used for the merge (strings as objects)'''
+  column = np.asarray(fits_data[name])
+  if column.dtype.kind in 'SU': return np.array(np.char.rstrip(column), dtype=object)
+  return np.array(column)
+
+def _differs(old, new):
+  '''Mask of the cells of 'new' differing from 'old' (NaN == NaN)'''
+  changed = np.asarray(old != new, dtype=bool)
+  if old.dtype.kind == 'f' and new.dtype.kind == 'f':
+    changed &= ~(np.isnan(old) & np.isnan(new))
+  return changed
+
+def _str_width(values):
+  if len(values) == 0: return 0
+  return max(len(str(value)) for value in values)
+
+def merge_catalogues(fits_data, inputs, fields_schema, radius, delimiter=None, h_factor=1., mass_keys=(), report=None, processes=1):
+  '''
+  Merge the ASCII catalogues 'inputs' (list of (CATALOG, ascii_file), in
+  order of priority) into the table 'fits_data' (FITS_rec).
+  The objects are matched within 'radius' (arcsec); the fields not in the
+  table get TFORM/TUNIT from 'fields_schema' (see schema_FITS.py), or a TFORM
+  inferred from the data; the 'mass_keys' fields are multiplied by 'h_factor'. If 'report' (UpdateReport)
+  is given, the updated and the new clusters are written into it. The
+  parsing of large files and the cross-matches run on 'processes'
+  processes (None = all the CPUs).
+  Returns the new table as a BinTableHDU.
+  '''
+  nrows_master = len(fits_data)
+  index = SkyIndex(fits_data[name_ra_key], fits_data[name_dec_key])
+
+  #Read each catalogue once, and match it against the shared index of the master table
+  tables, coords, matches = [], [], []
+  for label, filename in inputs:
+    table = read_ascii_table(filename, delimiter, processes)
+    for key in [name_ra_key, name_dec_key]:
+      if key not in table: raise ValueError("Field %s not found in %s: the catalogues are matched by position" % (key, filename))
+    ra = convert_strings(table.strings(name_ra_key), 'D')[0]
+    dec = convert_strings(table.strings(name_dec_key), 'D')[0]
+    tables.append(table)
+    coords.append((ra, dec))
+    matches.append(match_by_position(index, ra, dec, radius, processes))
+    print "\t>> %s (%s): %i rows, %i matched, %i not in the table" % (label, filename, table.nrows, len(matches[-1]), len(matches[-1].rows_ascii_new))
+
+  #The objects not in the table are matched to the new objects of the catalogues with higher priority
+  new_ra, new_dec, new_label = np.zeros(0), np.zeros(0), []
+  new_rows, new_objects = [], []
+  for k, (ra, dec) in enumerate(coords):
+    rows = matches[k].rows_ascii_new
+    objects = np.zeros(len(rows), dtype=int) - 1
+    if len(new_ra) > 0 and len(rows) > 0:
+      match = match_by_position(SkyIndex(new_ra, new_dec), ra[rows], dec[rows], radius)
+      objects[match.rows_ascii] = match.rows_fits
+    added = np.flatnonzero(objects < 0)
+    objects[added] = len(new_ra) + np.arange(len(added))
+    new_ra = np.concatenate([new_ra, ra[rows[added]]])
+    new_dec = np.concatenate([new_dec, dec[rows[added]]])
+    new_label.extend([inputs[k][0]] * len(added))
+    new_rows.append(rows)
+    new_objects.append(objects)
+  nrows_new = len(new_ra)
+  nrows = nrows_master + nrows_new
+
+  #Schema of the new table: the fields of the master table, then the new ones
+  coldefs = pyfits.ColDefs(fits_data.columns)
+  names, formats, units = list(coldefs.names), list(coldefs.formats), [str(unit) for unit in coldefs.units]
+  for table in tables:
+    for name in table.names:
+      if name in names: continue
+      names.append(name)
+      if name in fields_schema:
+        formats.append(fields_schema.tform(name))
+        units.append(fields_schema.tunit(name))
+      else:
+        #Not in the registry: the format is inferred from the values of all the catalogues
+        formats.append(infer_tform(np.concatenate([other.strings(name) for other in tables if name in other])))
+        units.append('None')
+        print "\t>> Field %s not in the schema: format %s inferred from the data" % (name, formats[-1])
+
+  #The replaced NAMEs go to ALT_NAME
+  keep_names = name_name_key in fits_data.names and any(name_name_key in table for table in tables)
+  if keep_names and name_altname_key not in names:
+    names.append(name_altname_key)
+    if name_altname_key in fields_schema:
+      formats.append(fields_schema.tform(name_altname_key))
+      units.append(fields_schema.tunit(name_altname_key))
+    else:
+      formats.append('1A')
+      units.append('None')
+
+  columns = {}
+  for name, tform in zip(names, formats):
+    if name in fits_data.names:
+      column = _fits_column(fits_data, name)
+      columns[name] = np.concatenate([column, _undef_column(tform, nrows_new).astype(column.dtype)])
+    else:
+      columns[name] = _undef_column(tform, nrows)
+  merged_fields = [name for name in names if any(name in table for table in tables)]
+  if keep_names and name_altname_key not in merged_fields: merged_fields.append(name_altname_key)
+  old_columns = dict((name, columns[name][:nrows_master].copy()) for name in merged_fields)
+
+  #Merge the fields: lowest priority first (so that the others overwrite it), joined fields in order of priority
+  names_cache = {}
+  for name in merged_fields:
+    tform = formats[names.index(name)]
+    column = columns[name]
+    if name in _JOINED_FIELDS: order = range(len(tables))
+    else: order = range(len(tables) - 1, -1, -1)
+    for k in order:
+      if name not in tables[k]: continue
+      try:
+        values, defined = convert_strings(tables[k].strings(name), tform)
+      except ValueError, err:
+        raise ValueError("%s (field %s of %s)" % (err, name, inputs[k][1]))
+      if name in mass_keys: values = values * h_factor
+      dst = np.concatenate([matches[k].rows_fits, nrows_master + new_objects[k]])
+      src = np.concatenate([matches[k].rows_ascii, new_rows[k]])
+      keep = defined[src]
+      dst, src = dst[keep], src[keep]
+      if name in _JOINED_FIELDS: column[dst] = column[dst] + '; ' + values[src]
+      else: column[dst] = values[src]
+    if name in _JOINED_FIELDS:
+      columns[name] = np.array(remove_duplicated_names_column(column, names_cache), dtype=object)
+
+  if keep_names:
+    old_names = np.array([str(value).strip() for value in old_columns[name_name_key]], dtype=object)
+    new_names = np.array([str(value).strip() for value in columns[name_name_key][:nrows_master]], dtype=object)
+    replaced = np.flatnonzero((old_names != new_names) & (old_names != '-') & (old_names != ''))
+    if len(replaced) > 0:
+      alt_names = columns[name_altname_key]
+      joined = [str(alt_names[row]).strip() + '; ' + old_names[row] for row in replaced]
+      alt_names[replaced] = np.array(remove_duplicated_names_column(joined, names_cache), dtype=object)
+
+  #New clusters: INDEX, CATALOG and galactic coordinates, if not given by the catalogues
+  if nrows_new > 0:
+    new = slice(nrows_master, nrows)
+    if name_index_key in columns:
+      missing = np.flatnonzero(columns[name_index_key][new] <= 0)
+      start = max(columns[name_index_key][:nrows_master].max() if nrows_master > 0 else 0, 0) + 1
+      columns[name_index_key][nrows_master + missing] = start + np.arange(len(missing))
+    if name_catalog_key in columns:
+      missing = np.flatnonzero(columns[name_catalog_key][new] == '-')
+      columns[name_catalog_key][nrows_master + missing] = np.array(new_label, dtype=object)[missing]
+    if name_glon_key in columns and name_glat_key in columns:
+      glon, glat = astCoords.convertCoordsArray('J2000', 'GALACTIC', new_ra, new_dec, 2000)
+      for name, values in [(name_glon_key, glon), (name_glat_key, glat)]:
+        missing = ~np.isfinite(columns[name][new])
+        columns[name][new][missing] = np.round(values[missing], 5)
+
+  #Build the new table
+  fits_columns = []
+  for name, tform, tunit in zip(names, formats, units):
+    values = columns[name]
+    if tform_code(tform) == 'A':
+      width = max(int(tform.split('A')[0] or 1), _str_width(values))
+      tform = '%iA' % width
+      values = values.astype('S%i' % width)
+    fits_columns.append(pyfits.Column(name=name, format=tform, unit=tunit, array=values))
+  hdu = pyfits.new_table(pyfits.ColDefs(fits_columns))
+
+  if report is not None:
+    _write_report(report, merged_fields, old_columns, columns, nrows_master, names)
+  return hdu
+
+def _write_report(report, merged_fields, old_columns, columns, nrows_master, names):
+  '''Write the updated (merged fields only) and the new clusters into the report'''
+  changed = np.zeros(nrows_master, dtype=bool)
+  for name in merged_fields:
+    changed |= _differs(old_columns[name], columns[name][:nrows_master])
+  rows = np.flatnonzero(changed)
+
+  if len(rows) > 0:
+    widths_old = [max(_str_width(old_columns[name][rows]), len(name)) for name in merged_fields]
+    widths_new = [max(_str_width(columns[name][rows]), len(name)) for name in merged_fields]
+    report.start_section('updated', "\n# >>>> CLUSTERS PROPERTIES ** UPDATED ** IN THE FITS TABLE <<<<\n\n", merged_fields, widths_new, widths_old)
+    for row in rows:
+      report.write_row(row, [columns[name][row] for name in merged_fields], [old_columns[name][row] for name in merged_fields])
+
+  nrows = len(columns[names[0]])
+  if nrows > nrows_master:
+    widths = [max(_str_width(columns[name][nrows_master:]), len(name)) + 3 for name in names]
+    report.start_section('new', "\n\n# >>>> NEW CLUSTERS ** ADDED ** TO THE FITS TABLE <<<<\n\n", names, widths)
+    for row in range(nrows_master, nrows):
+      report.write_row(row, [columns[name][row] for name in names])
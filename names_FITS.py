@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Helpers to clean the composite string fields (e.g. ALT_NAME, PAPER) of the
+cluster catalogues, where several names are separated by ';', and to set the
+'undef' values of all the fields of a table (see set_undef_values).
+
+When run as a script, it benchmarks the per-cell and the batched cleaning
+on the string columns of a real catalogue:
+
+$ python names_FITS.py <table>.fits [<field_1> <field_2> ...]
+'''
+
+import numpy as np
+import os, sys, time
+
+#Values not to be kept in a composite string
+_NULL_NAMES = ["-", "NULL", "NAN", "NONE", "FALSE"]
+
+def remove_duplicated_names(string):
+  '''
+  This function removes duplicated names of a string, assuming they are separated by ';'
+  In addition, it takes out 'NULL', 'NaN', 'False' from the final, composite string.
+  It is used for the creation of ALT_NAME field.
+  '''
+  string = string.replace('; ',';')
+  tmp = [item for item in string.split(';') if item.upper() not in _NULL_NAMES and len(item)>0 ]
+  # *** This lines of code help preserving the order ot the names ***
+  tmp_uniq = []
+  set_tmp = set()
+  for item in tmp:
+    if item not in set_tmp:
+      tmp_uniq.append(item)
+      set_tmp.add(item)
+  # ******************************************************************
+
+  if len(tmp)==0: new_string = '-'
+  else: new_string =  "; ".join(tmp_uniq)
+  return new_string
+
+def remove_duplicated_names_column(values, cache=None):
+  '''
+  Apply remove_duplicated_names() to a whole column of strings.
+  Each distinct value is cleaned only once: the results are kept in 'cache'
+  (a dictionary, which can be shared among several calls/columns).
+  Returns a list with the cleaned strings, in the same order of 'values'.
+  '''
+  if cache is None: cache = {}
+  cleaned = []
+  for value in values:
+    value = str(value)
+    if value not in cache:
+      cache[value] = remove_duplicated_names(value)
+    cleaned.append(cache[value])
+  return cleaned
+
+def undef_string(value):
+  '''
+  Clean a string value and replace the empty/null ones with '-'
+  '''
+  value = remove_duplicated_names(str(value))
+  if value.upper() in ["", "0.0", "NULL", "NAN", "NONE", "FALSE"]: value = "-"
+  return value
+
+def set_undef_values(fits_data, index_key='INDEX', redshift_key='REDSHIFT', zType_key='REDSHIFT_TYPE'):
+  '''
+  Set the proper 'undef' values according to the format/name of the field.
+  Each rule is applied to the whole column at once through a boolean mask.
+  '''
+  print "\n\t>> Checking/setting undefined values for the different fields ..."
+  for i, name in enumerate(fits_data.names):
+    sys.stdout.write('\t%i/%i > %s (format %s) : Done                                        \r' % (i+1, len(fits_data.names), name, fits_data.formats[i]))
+    sys.stdout.flush()
+    column = fits_data.field(i)
+    if column.size == 0: continue
+    if name == index_key:
+      column[column <= 0] = -1
+      continue
+    #The cells not taken by the rules of REDSHIFT (-1) and REDSHIFT_TYPE ('Null') go on to the rules of their format
+    other = np.ones(column.shape, dtype=bool)
+    if name == redshift_key:
+      other = column != -1.0
+      column[~other] = np.nan
+    elif name.find(zType_key) >= 0:
+      other = np.char.rstrip(column) != 'Null'
+      column[~other] = "undef"
+    if fits_data.formats[i] in 'EDJ':
+      #Only float columns can hold the -1.6375E+30 placeholder
+      if column.dtype.kind == 'f':
+        column[other & (column == column.dtype.type(-1.6375E+30))] = np.nan
+    elif fits_data.formats[i].find('A') >= 0:
+      #Many rows share the same string: clean each distinct value only once
+      values, inverse = np.unique(column[other], return_inverse=True)
+      cleaned = np.array([undef_string(value) for value in values])
+      if len(values) > 0: column[other] = cleaned[inverse]
+    elif name in ['PIPELINE','PIPE_DET']:
+      column[column <= 0] = 0
+  print '\n'
+  return fits_data
+
+def benchmark(columns, repeat=3):
+  '''
+  Compare the per-cell and the batched cleaning of the given columns
+  (a dictionary: name -> sequence of strings). Returns a dictionary with the
+  best timings (in seconds) for each column.
+  '''
+  results = {}
+  for name in sorted(columns):
+    values = [str(item) for item in columns[name]]
+    t_cell = min(_timeit(lambda: [remove_duplicated_names(item) for item in values]) for i in range(repeat))
+    t_batch = min(_timeit(lambda: remove_duplicated_names_column(values)) for i in range(repeat))
+    if remove_duplicated_names_column(values) != [remove_duplicated_names(item) for item in values]:
+      raise ValueError("Batched and per-cell cleaning of '%s' differ" % name)
+    results[name] = {'rows': len(values), 'distinct': len(set(values)), 'cell': t_cell, 'batch': t_batch}
+  return results
+
+def _timeit(function):
+  start = time.time()
+  function()
+  return time.time() - start
+
+if __name__ == '__main__':
+  if (len(sys.argv) > 1):
+    fits_file = sys.argv[1]
+    fields = sys.argv[2:] or ['ALT_NAME', 'PAPER']
+  else:
+    print "\n\tSintax:\t$ python names_FITS.py <table>.fits [<field_1> <field_2> ...]\n"
+    os._exit(0)
+
+  import pyfits
+  fits_data = pyfits.open(fits_file)[1].data
+  columns = dict((field, fits_data[field]) for field in fields if field in fits_data.names)
+
+  print "\n\t%-12s %8s %8s %12s %12s %8s" % ('FIELD', 'ROWS', 'DISTINCT', 'CELL [s]', 'BATCH [s]', 'SPEEDUP')
+  for name, res in sorted(benchmark(columns).items()):
+    print "\t%-12s %8i %8i %12.5f %12.5f %7.1fx" % (name, res['rows'], res['distinct'], res['cell'], res['batch'], res['cell']/max(res['batch'], 1e-9))
+  print
@@ -0,0 +1,272 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Columnar reader for delimited ASCII tables, used by create_FITS.py and
+edits_FITS_table.py.
+
+The file is parsed only once and stored column by column as NumPy arrays.
+IMPORTANT: the first (non-comment) line must contain the names of the
+columns. Lines starting with '#' and empty lines are skipped; fields can be
+quoted (e.g. "Planck 2013; Planck 2015").
+
+Tables larger than the memory can be read a chunk of rows at a time
+(read_ascii_chunks). Large files can be parsed by a pool of processes, each
+one parsing a part of the file split at line boundaries (read_ascii_table).
+'''
+
+import numpy as np
+import csv, os
+import multiprocessing
+
+#Delimiters tried when the user does not specify one
+_DELIMITERS = ',;\t| '
+
+#Minimum size (in bytes) of a file for which parsing is worth a pool of processes
+_PARALLEL_MIN_BYTES = 16 * 1024**2
+
+class AsciiTable:
+  '''
+  Columns of a delimited ASCII table.
+
+  table.names            -> list with the names of the columns
+  table.nrows            -> number of data rows (header excluded)
+  table[key]             -> typed column (int, float or string array)
+  table.strings(key)     -> column as (stripped) strings, as in the file
+  table.max_length(key)  -> max length of the strings of the column
+
+  'key' is either the name or the number of the column.
+  '''
+  def __init__(self, names, columns):
+    self.names = list(names)
+    self._strings = [np.array(column, dtype=str) for column in columns]
+    self._typed = {}
+    self._max_length = {}
+    self.ncols = len(self.names)
+    if self.ncols > 0: self.nrows = len(self._strings[0])
+    else: self.nrows = 0
+
+  def _col(self, key):
+    if isinstance(key, (int, np.integer)): return int(key)
+    try:
+      return self.names.index(key)
+    except ValueError:
+      raise KeyError("Column '%s' not found in the ASCII table" % key)
+
+  def __contains__(self, name):
+    return name in self.names
+
+  def __getitem__(self, key):
+    k = self._col(key)
+    if k not in self._typed:
+      self._typed[k] = convert_column(self._strings[k])
+    return self._typed[k]
+
+  def strings(self, key):
+    return self._strings[self._col(key)]
+
+  def max_length(self, key):
+    k = self._col(key)
+    if k not in self._max_length:
+      if self.nrows == 0: self._max_length[k] = 0
+      else: self._max_length[k] = int(np.char.str_len(self._strings[k]).max())
+    return self._max_length[k]
+
+def convert_column(strings):
+  '''
+  Convert a column of strings into integers or floats (empty cells of a
+  float column become NaN). If neither works, the strings are returned.
+  '''
+  if len(strings) == 0: return strings
+  try:
+    return strings.astype(np.int64)
+  except (ValueError, OverflowError):
+    pass
+  try:
+    return np.where(strings == '', 'nan', strings).astype(np.float64)
+  except ValueError:
+    return strings
+
+def sniff_delimiter(sample):
+  '''Guess the column delimiter from a sample of the file (default is ',')'''
+  lines = [line for line in sample.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+  try:
+    return csv.Sniffer().sniff('\n'.join(lines[:20]), delimiters=_DELIMITERS).delimiter
+  except csv.Error:
+    pass
+  #Columns aligned with a variable number of blanks confuse the Sniffer
+  header = (lines or [''])[0]
+  for delimiter in _DELIMITERS.strip():
+    if delimiter in header: return delimiter
+  if len(header.split()) > 1: return ' '
+  return ','
+
+def split_lines(lines, delimiter):
+  '''
+  Split text lines into lists of (stripped) fields. Comments and empty lines
+  are skipped. A blank delimiter means "any run of white spaces".
+  '''
+  if delimiter.strip() == '':
+    reader = csv.reader((line.strip() for line in lines if _is_data(line)), delimiter=' ', skipinitialspace=True)
+  else:
+    reader = csv.reader((line for line in lines if _is_data(line)), delimiter=delimiter)
+  for fields in reader:
+    yield [field.strip() for field in fields]
+
+def _is_data(line):
+  line = line.strip()
+  return len(line) > 0 and not line.startswith('#')
+
+def _fields_error(row_number, nfields, ncols):
+  return ValueError("Row %i of the ASCII table has %i fields, but there are %i columns" % (row_number, nfields, ncols))
+
+def rows_to_columns(rows, ncols, first_line=1):
+  '''Transpose a list of rows into ncols lists, checking the number of fields'''
+  for i, row in enumerate(rows):
+    if len(row) > ncols:
+      raise _fields_error(i+first_line, len(row), ncols)
+    elif len(row) < ncols:
+      row.extend([''] * (ncols - len(row)))
+  if len(rows) == 0: return [[] for k in range(ncols)]
+  return [list(column) for column in zip(*rows)]
+
+def read_ascii_table(filename, delimiter=None, processes=1):
+  '''
+  Read a delimited ASCII table. If 'delimiter' is None (or empty), it is
+  guessed from the first lines of the file.
+  With processes > 1 (None = all the CPUs), large files are parsed in
+  parallel (see read_ascii_parallel).
+  '''
+  if processes is None: processes = multiprocessing.cpu_count()
+  if processes > 1 and os.path.getsize(filename) >= _PARALLEL_MIN_BYTES:
+    return read_ascii_parallel(filename, delimiter, processes)
+
+  f = open(filename, 'r')
+  try:
+    if not delimiter:
+      delimiter = sniff_delimiter(f.read(65536))
+      f.seek(0)
+    rows = list(split_lines(f, delimiter))
+  finally:
+    f.close()
+
+  if len(rows) == 0:
+    raise ValueError("No header line found in the ASCII table %s" % filename)
+  names = rows.pop(0)
+  return AsciiTable(names, rows_to_columns(rows, len(names)))
+
+def _parse_part(args):
+  '''
+  Worker of read_ascii_parallel: columns (string arrays) of the lines between
+  two offsets of the file, and number of rows of the part. A row with too
+  many fields is given back as (row in the part, number of fields), with no
+  columns, so that the error can report its row in the whole table.
+  '''
+  filename, delimiter, start, end, ncols = args
+  f = open(filename, 'rb')
+  try:
+    f.seek(start)
+    lines = f.read(end - start).splitlines(True)
+  finally:
+    f.close()
+  rows = list(split_lines(lines, delimiter))
+  for i, row in enumerate(rows):
+    if len(row) > ncols: return None, len(rows), (i, len(row))
+  return [np.array(column, dtype=str) for column in rows_to_columns(rows, ncols)], len(rows), None
+
+def read_ascii_parallel(filename, delimiter=None, processes=None, parts=None):
+  '''
+  Same result as read_ascii_table(filename, delimiter), parsed by a pool of
+  'processes' (None = all the CPUs).
+
+  The data lines are split into 'parts' (default is 4 per process) of about
+  the same size, each part ending at a line boundary. Each process parses
+  its parts into columns, which are then concatenated in the file order.
+  NOTE: quoted fields spanning several lines are not supported.
+  '''
+  if processes is None: processes = multiprocessing.cpu_count()
+  if parts is None: parts = 4 * processes
+
+  f = open(filename, 'rb')
+  try:
+    if not delimiter:
+      delimiter = sniff_delimiter(f.read(65536))
+      f.seek(0)
+    #The header is the first data line
+    names = None
+    while names is None:
+      line = f.readline()
+      if line == '': raise ValueError("No header line found in the ASCII table %s" % filename)
+      if _is_data(line): names = next(split_lines([line], delimiter))
+    start = f.tell()
+    end = os.path.getsize(filename)
+
+    #Move each boundary to the beginning of the next line
+    offsets = [start]
+    for k in range(1, parts):
+      f.seek(start + (end - start) * k // parts)
+      f.readline()
+      offsets.append(max(f.tell(), offsets[-1]))
+    offsets.append(end)
+  finally:
+    f.close()
+
+  tasks = [(filename, delimiter, offsets[k], offsets[k+1], len(names)) for k in range(parts) if offsets[k+1] > offsets[k]]
+  pool = multiprocessing.Pool(processes)
+  try:
+    results = pool.map(_parse_part, tasks)
+  finally:
+    pool.close()
+    pool.join()
+
+  #Rows of the parts counted in the whole table, for the errors
+  nrows = 0
+  for columns, nrows_part, error in results:
+    if error is not None: raise _fields_error(nrows + error[0] + 1, error[1], len(names))
+    nrows += nrows_part
+
+  if len(results) == 0: return AsciiTable(names, [[] for name in names])
+  return AsciiTable(names, [np.concatenate([result[0][k] for result in results]) for k in range(len(names))])
+
+def read_ascii_chunks(filename, delimiter=None, chunk_rows=100000):
+  '''
+  Read a delimited ASCII table 'chunk_rows' rows at a time, yielding an
+  AsciiTable (with the names of the header line) for each chunk: only one
+  chunk is in memory at any time. A table with no rows gives one empty chunk.
+  '''
+  f = open(filename, 'r')
+  try:
+    if not delimiter:
+      delimiter = sniff_delimiter(f.read(65536))
+      f.seek(0)
+    rows = split_lines(f, delimiter)
+    try:
+      names = next(rows)
+    except StopIteration:
+      raise ValueError("No header line found in the ASCII table %s" % filename)
+
+    chunk, first_line = [], 1
+    for row in rows:
+      chunk.append(row)
+      if len(chunk) == chunk_rows:
+        yield AsciiTable(names, rows_to_columns(chunk, len(names), first_line))
+        first_line += len(chunk)
+        chunk = []
+    if len(chunk) > 0 or first_line == 1:
+      yield AsciiTable(names, rows_to_columns(chunk, len(names), first_line))
+  finally:
+    f.close()
@@ -0,0 +1,90 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Report of the updates applied to a FITS table by edits_FITS_table.py.
+
+The report can be written as:
+  - 'tab'  : aligned text columns, with 'old | new' values for each field;
+  - 'csv'  : one line per cluster and field (SECTION, ROW, FIELD, OLD, NEW);
+  - 'json' : one JSON object per cluster and line (JSON Lines).
+
+Each row is written as soon as it is given, so the report is streamed to
+the file instead of being kept in memory.
+'''
+
+import csv, json
+
+REPORT_FORMATS = ['tab', 'csv', 'json']
+
+class UpdateReport:
+  '''
+  Streamed report of the updated/new clusters.
+  The widths of the 'tab' columns are given once per section, and each row
+  is then formatted with a single template.
+  '''
+  def __init__(self, filename, fmt='tab'):
+    if fmt not in REPORT_FORMATS:
+      raise ValueError("Report format '%s' not valid (use one of %s)" % (fmt, ", ".join(REPORT_FORMATS)))
+    self.filename = filename
+    self.fmt = fmt
+    self._file = open(filename, 'w')
+    self._section = None
+    self._fields = []
+    self._template = ''
+    if fmt == 'csv':
+      self._csv = csv.writer(self._file)
+      self._csv.writerow(['SECTION', 'ROW', 'FIELD', 'OLD', 'NEW'])
+
+  def start_section(self, section, title, fields, widths_new, widths_old=None):
+    '''
+    Start a new section of the report. If 'widths_old' is given, the rows
+    contain both the old and the new values of each field.
+    '''
+    self._section = section
+    self._fields = list(fields)
+    if self.fmt != 'tab': return
+
+    header = ""
+    template = ""
+    for k, field in enumerate(self._fields):
+      if widths_old is None:
+        header += ('{0:^%ss}' % widths_new[k]).format(field)
+        template += '{%i:^%ss}' % (k, widths_new[k])
+      else:
+        header += ('{0:^%ss}' % (int(widths_old[k]) + int(widths_new[k]) + 3)).format(field) #+3 because of  ' | '
+        template += ' {%i:>%ss} | {%i:<%ss} ' % (2*k, widths_old[k], 2*k+1, widths_new[k])
+    self._template = template
+    self._file.write(title)
+    self._file.write(header+"\n")
+
+  def write_row(self, row, new_values, old_values=None):
+    '''Write the values of a cluster (FITS row 'row') for the fields of the current section'''
+    if self.fmt == 'tab':
+      if old_values is None: values = [str(value) for value in new_values]
+      else: values = [str(value) for pair in zip(old_values, new_values) for value in pair]
+      self._file.write("\n" + self._template.format(*values))
+    elif self.fmt == 'csv':
+      if old_values is None: old_values = [''] * len(new_values)
+      self._csv.writerows([self._section, row, field, str(old), str(new)] for field, old, new in zip(self._fields, old_values, new_values))
+    else:
+      if old_values is None: values = dict((field, {'new': str(new)}) for field, new in zip(self._fields, new_values))
+      else: values = dict((field, {'old': str(old), 'new': str(new)}) for field, old, new in zip(self._fields, old_values, new_values))
+      self._file.write(json.dumps({'section': self._section, 'row': int(row), 'values': values}, sort_keys=True) + "\n")
+
+  def close(self):
+    self._file.close()
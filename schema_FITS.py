@@ -0,0 +1,224 @@
+# ******************************************************************************
+#    Copyright 2015 - Alessandro Nastasi
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ******************************************************************************
+'''
+Registry of the fields of the cluster catalogues: FORMAT (TFORM), UNIT (TUNIT)
+and PostgreSQL type of each field, shared by create_FITS.py,
+edits_FITS_table.py, merge_FITS.py and ingest_dataset_from_FITS.py.
+
+The registry is read from a JSON file (fields_schema.json) with:
+  - "common"     : the fields shared by all the catalogues (NAME, RA, ...);
+  - "namespaces" : the fields of each survey (ACT, AMI, CARMA, PSZ1, PSZ2,
+                   PLCK, SPT), also known with the survey prefix, e.g. the
+                   NAME of the ACT namespace is the field ACT_NAME;
+  - "sql_types"  : the PostgreSQL type of each FITS data type (TFORM code).
+
+A field must be defined only once: duplicated names (also after adding the
+prefixes) are an error. The file is read and compiled only once per process.
+
+For the fields not in the registry, the TFORM is inferred from the values
+of the ASCII column (see infer_tform).
+'''
+
+import numpy as np
+import os, json
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fields_schema.json')
+
+#FITS data types, in the order used to find the code of a TFORM
+_TFORM_CODES = 'LXBIJKAEDCMPQ'
+
+#Registries already loaded (filename -> FieldsSchema)
+_SCHEMAS = {}
+
+#ASCII values meaning 'undefined'
+_UNDEF_STRINGS = ['', '-', 'NULL', 'NAN', 'NONE', 'UNDEF', '-1.6375E+30']
+
+#ASCII values of the logical (L) fields
+_TRUE_STRINGS = ['TRUE', 'YES', 'T', '1', '1.0']
+_FALSE_STRINGS = ['FALSE', 'NO', 'F', '0', '0.0']
+
+#Values of the columns inferred as logical (0/1 columns are inferred as integers)
+_BOOL_STRINGS = ['TRUE', 'FALSE', 'YES', 'NO']
+
+class FieldsSchema:
+  '''
+  Compiled registry of the fields.
+
+  name in schema          -> True if the field is defined
+  schema[name]            -> {'format': TFORM, 'unit': TUNIT}, as in the old _FIELDS_DICTIONARY
+  schema.tform(name)      -> TFORM of the field
+  schema.tunit(name)      -> TUNIT of the field
+  schema.sql_type(tform)  -> PostgreSQL type of a TFORM
+  schema.namespace(name)  -> namespace (survey) of the field, None for the common ones
+  '''
+  def __init__(self, common, namespaces, sql_types):
+    self._fields = {}
+    self._namespace = {}
+    for name, field in common.items():
+      self._add(name, field, None)
+    for survey in sorted(namespaces):
+      for name, field in namespaces[survey].items():
+        self._add(survey + '_' + name, field, survey)
+    self._sql_types = dict(sql_types)
+
+  def _add(self, name, field, survey):
+    if name in self._fields:
+      raise ValueError("Field '%s' defined twice in the schema (namespaces %s and %s)" % (name, self._namespace[name], survey))
+    self._fields[name] = {'format': str(field['format']), 'unit': str(field['unit'])}
+    self._namespace[name] = survey
+
+  def __contains__(self, name):
+    return name in self._fields
+
+  def __getitem__(self, name):
+    return self._fields[name]
+
+  def __len__(self):
+    return len(self._fields)
+
+  def names(self):
+    return sorted(self._fields)
+
+  def tform(self, name):
+    return self._fields[name]['format']
+
+  def tunit(self, name):
+    return self._fields[name]['unit']
+
+  def namespace(self, name):
+    return self._namespace[name]
+
+  def sql_type(self, tform):
+    '''PostgreSQL type of a FITS format (e.g. '18A' -> 'character varying(1027)'), '' if unknown'''
+    psql_format = ''
+    for char in _TFORM_CODES:
+      if char in tform and char in self._sql_types:
+        psql_format = self._sql_types[char]
+    return psql_format
+
+def _no_duplicates(pairs):
+  '''object_pairs_hook of json: duplicated keys in the same object are an error'''
+  result = {}
+  for key, value in pairs:
+    if key in result: raise ValueError("Key '%s' duplicated in the schema file" % key)
+    result[key] = value
+  return result
+
+def load_schema(filename=SCHEMA_FILE):
+  '''Registry of the fields read from 'filename' (compiled only at the first call)'''
+  filename = os.path.abspath(filename)
+  if filename not in _SCHEMAS:
+    f = open(filename, 'r')
+    try:
+      spec = json.load(f, object_pairs_hook=_no_duplicates)
+    finally:
+      f.close()
+    _SCHEMAS[filename] = FieldsSchema(spec.get('common', {}), spec.get('namespaces', {}), spec.get('sql_types', {}))
+  return _SCHEMAS[filename]
+
+def sql_type(tform):
+  '''PostgreSQL type of a FITS format, according to the default registry'''
+  return load_schema().sql_type(tform)
+
+def tform_code(tform):
+  '''Data type code of a TFORM (e.g. '20A' -> 'A')'''
+  return tform.strip()[-1].upper()
+
+def infer_tform(strings):
+  '''
+  Infer the TFORM of a column of ASCII strings (the undefined values, e.g.
+  '' or '-', are not considered):
+    - L     : only TRUE/FALSE or YES/NO;
+    - I/J/K : integers, according to their range (16, 32 or 64 bits);
+    - E/D   : floats, D if they need more than 7 significant digits;
+    - nA    : strings, n being the max length of the column.
+  '''
+  strings = np.char.strip(np.asarray(strings, dtype=str))
+  width = 1
+  if len(strings) > 0: width = max(int(np.char.str_len(strings).max()), 1)
+  values = strings[~np.in1d(np.char.upper(strings), _UNDEF_STRINGS)]
+  if len(values) == 0: return '%iA' % width
+
+  if np.in1d(np.char.upper(values), _BOOL_STRINGS).all(): return 'L'
+
+  try:
+    ints = values.astype(np.int64)
+    if ints.min() >= -2**15 and ints.max() < 2**15: return 'I'
+    if ints.min() >= -2**31 and ints.max() < 2**31: return 'J'
+    return 'K'
+  except (ValueError, OverflowError):
+    pass
+
+  try:
+    floats = values.astype(np.float64)
+  except ValueError:
+    return '%iA' % width
+  finite = np.abs(floats[np.isfinite(floats)])
+  if len(finite) > 0 and finite.max() > 3.4e38: return 'D'
+  #Significant digits of the mantissas
+  mantissa = np.char.partition(np.char.lower(values), 'e')[:, 0]
+  digits = np.char.lstrip(np.char.replace(np.char.lstrip(mantissa, '+-'), '.', ''), '0')
+  if np.char.str_len(digits).max() > 7: return 'D'
+  return 'E'
+
+def combine_tforms(tforms, width=1):
+  '''
+  TFORM of a column made of parts (e.g. the chunks of a file) with the
+  inferred formats 'tforms': the widest type able to hold all of them.
+  'width' is the max length of the strings, used for the string columns
+  (and for the columns with no defined value).
+  '''
+  codes = set(tform_code(tform) for tform in tforms)
+  if codes == set(['L']): return 'L'
+  if len(codes) == 0 or 'A' in codes or 'L' in codes: return '%iA' % max(width, 1)
+  for code in 'KJI':
+    if codes <= set('IJK') and code in codes: return code
+  #Floats: 32-bit integers do not fit in the mantissa of E
+  if codes & set('DJK'): return 'D'
+  return 'E'
+
+def convert_strings(strings, tform):
+  '''
+  Convert a column of ASCII strings to the type of the FITS format 'tform'
+  (strings as objects, numbers as floats). Returns the values and the mask
+  of the defined ones.
+  '''
+  upper = np.char.upper(np.char.strip(np.asarray(strings, dtype=str)))
+  defined = ~np.in1d(upper, _UNDEF_STRINGS)
+  code = tform_code(tform)
+  if code == 'A':
+    return np.array(strings, dtype=object), defined
+  if code == 'L':
+    values = np.in1d(upper, _TRUE_STRINGS)
+    return values, defined & (values | np.in1d(upper, _FALSE_STRINGS))
+  try:
+    values = np.where(defined, strings, 'nan').astype(np.float64)
+  except ValueError:
+    raise ValueError("Values not valid for the format '%s'" % tform)
+  return values, defined & np.isfinite(values)
+
+def fits_array(strings, tform):
+  '''
+  Column of ASCII strings ready for a FITS column of format 'tform': the
+  undefined values become -1 (integers), NaN (floats) or False (logical).
+  '''
+  code = tform_code(tform)
+  if code == 'A': return np.asarray(strings, dtype=str)
+  values, defined = convert_strings(strings, tform)
+  if code in 'BIJK': return np.where(defined, values, -1).astype(np.int64)
+  return values
@@ -0,0 +1,117 @@
+'''
+Tests of the array functions of astCoords_ANchanges.py, against the scalar
+functions of the same module.
+
+$ python -m pytest test_astCoords_ANchanges.py
+'''
+
+import numpy
+import pytest
+
+import astCoords_ANchanges as astCoords
+
+def test_sexagesimal2decimalArray():
+    RAStrings = ["00:00:00.0", "12:30:15.5", "23:59:59.99", "-", ""]
+    decStrings = ["+10:20:30.4", "-00:30:00", "-89:59:59.9", " 05:06:07 ", "-"]
+    RADegs = astCoords.hms2decimalArray(RAStrings)
+    decDegs = astCoords.dms2decimalArray(decStrings)
+    for i in range(3):
+        assert abs(RADegs[i]-astCoords.hms2decimal(RAStrings[i], ":")) < 1e-10
+    for i in range(4):
+        assert abs(decDegs[i]-astCoords.dms2decimal(decStrings[i].strip(), ":")) < 1e-10
+    assert numpy.isnan(RADegs[3:]).all() and numpy.isnan(decDegs[4])
+    # the sign of -00:MM:SS is kept
+    assert decDegs[1] == -0.5
+
+def test_sexagesimal2decimalArray_delimiters():
+    assert numpy.allclose(astCoords.hms2decimalArray(["01 00 00", "02 30 00"]), [15.0, 37.5])
+    assert numpy.allclose(astCoords.dms2decimalArray(["-01 30 00", "2"], " "), [-1.5, 2.0])
+    # decimal values (no delimiter) are read as they are
+    assert numpy.allclose(astCoords.hms2decimalArray(["150.25", "-"])[:1], [150.25])
+
+def test_sexagesimal2decimalArray_empty():
+    for delimiter in [None, ":", " ", ""]:
+        values = astCoords.dms2decimalArray(numpy.array([], dtype=str), delimiter)
+        assert values.dtype == numpy.float64 and len(values) == 0
+        assert len(astCoords.hms2decimalArray([], delimiter)) == 0
+
+def test_decimal2sexagesimalArray():
+    RADegs = numpy.random.RandomState(1).uniform(0.0, 360.0, 1000)
+    decDegs = numpy.random.RandomState(2).uniform(-90.0, 90.0, 1000)
+    # the strings are rounded to half of their last digit
+    RAStrings = astCoords.decimal2hmsArray(RADegs)
+    assert numpy.abs(astCoords.hms2decimalArray(RAStrings)-RADegs).max() <= 0.0005*15.0/3600.0+1e-12
+    decStrings = astCoords.decimal2dmsArray(decDegs)
+    assert numpy.abs(astCoords.dms2decimalArray(decStrings)-decDegs).max() <= 0.005/3600.0+1e-12
+
+def test_decimal2sexagesimalArray_rounding():
+    # the rounding carries into minutes, hours and degrees
+    assert list(astCoords.decimal2hmsArray([359.99999999, 15.0, numpy.nan])) == ["00:00:00.000", "01:00:00.000", "-"]
+    assert list(astCoords.decimal2hmsArray([14.999999999], delimiter=" ", decimals=1)) == ["01 00 00.0"]
+    assert list(astCoords.decimal2dmsArray([-1e-9, -0.5, 89.9999999999, numpy.nan])) == [
+        "+00:00:00.00", "-00:30:00.00", "+90:00:00.00", "-"]
+    assert len(astCoords.decimal2hmsArray([])) == 0 and len(astCoords.decimal2dmsArray([])) == 0
+
+def _circle(RADeg, decDeg, radiusDeg, numPoints=3600):
+    """Points on a circle on the sky, with their R.A. unwrapped around the centre"""
+    bearing = numpy.linspace(0.0, 2.0*numpy.pi, numPoints, endpoint=False)
+    dec, r = numpy.radians(decDeg), numpy.radians(radiusDeg)
+    decPoints = numpy.arcsin(numpy.sin(dec)*numpy.cos(r)+numpy.cos(dec)*numpy.sin(r)*numpy.cos(bearing))
+    delRA = numpy.arctan2(numpy.sin(bearing)*numpy.sin(r)*numpy.cos(dec),
+                          numpy.cos(r)-numpy.sin(dec)*numpy.sin(decPoints))
+    return RADeg+numpy.degrees(delRA), numpy.degrees(decPoints)
+
+def test_calcRADecSearchBox():
+    rs = numpy.random.RandomState(3)
+    RADegs = rs.uniform(0.0, 360.0, 200)
+    decDegs = rs.uniform(-85.0, 85.0, 200)
+    radii = rs.uniform(0.001, 4.0, 200)
+    RAMin, RAMax, decMin, decMax = astCoords.calcRADecSearchBox(RADegs, decDegs, radii)
+    for i in range(200):
+        RAPoints, decPoints = _circle(RADegs[i], decDegs[i], radii[i])
+        # every point of the circle is in the box, which touches the circle
+        assert RAMin[i]-1e-9 <= RAPoints.min() and RAPoints.max() <= RAMax[i]+1e-9
+        assert decMin[i]-1e-9 <= decPoints.min() and decPoints.max() <= decMax[i]+1e-9
+        assert RAPoints.min()-RAMin[i] < 1e-4 and RAMax[i]-RAPoints.max() < 1e-4
+        # the scalar boxes are the same
+        assert numpy.allclose(astCoords.calcRADecSearchBox(RADegs[i], decDegs[i], radii[i]),
+                              [RAMin[i], RAMax[i], decMin[i], decMax[i]])
+
+def test_calcRADecSearchBox_poles():
+    assert astCoords.calcRADecSearchBox(10.0, 89.5, 1.0) == [0.0, 360.0, 88.5, 90.0]
+    assert astCoords.calcRADecSearchBox(10.0, -89.0, 2.0) == [0.0, 360.0, -90.0, -87.0]
+
+def test_shiftRADec():
+    RADegs = numpy.array([10.0, 200.0, 359.0])
+    decDegs = numpy.array([0.0, 45.0, -60.0])
+    RAShifted, decShifted = astCoords.shiftRADec(RADegs, decDegs, 36.0, -18.0)
+    for i in range(3):
+        assert numpy.allclose(astCoords.shiftRADec(RADegs[i], decDegs[i], 36.0, -18.0), [RAShifted[i], decShifted[i]])
+    # a shift in R.A. of 36 arcsec on the sky, at dec = 60 deg, is 72 arcsec of R.A.
+    assert abs(astCoords.shiftRADec(0.0, 60.0, 36.0, 0.0)[0]*3600.0-72.0) < 1e-3
+    assert numpy.allclose(decShifted, decDegs-18.0/3600.0)
+
+def test_convertCoordsArray_round_trips():
+    rs = numpy.random.RandomState(4)
+    RADegs = rs.uniform(0.0, 360.0, 2000)
+    decDegs = numpy.degrees(numpy.arcsin(rs.uniform(-1.0, 1.0, 2000)))
+    for system in ["GALACTIC", "B1950", "ECLIPTIC"]:
+        lon, lat = astCoords.convertCoordsArray("J2000", system, RADegs, decDegs, 2000.0)
+        RABack, decBack = astCoords.convertCoordsArray(system, "J2000", lon, lat, 2000.0)
+        # the FK4 <-> FK5 conversions are inverse only to some micro-arcsec
+        assert astCoords.calcAngSepDegArray(RADegs, decDegs, RABack, decBack).max()*3600.0 < 1e-4
+
+def test_convertCoordsArray_reference_positions():
+    # Galactic centre and north Galactic pole in J2000
+    RADeg, decDeg = astCoords.convertCoordsArray("GALACTIC", "J2000", [0.0, 0.0], [0.0, 90.0], 2000.0)
+    assert numpy.allclose(RADeg, [266.40500, 192.85948], atol=1e-4)
+    assert numpy.allclose(decDeg, [-28.93617, 27.12825], atol=1e-4)
+    # the scalar conversions give the same values, as floats
+    lon, lat = astCoords.convertCoords("J2000", "GALACTIC", RADeg[0], decDeg[0], 2000.0)
+    assert abs(lat) < 1e-8 and min(lon, 360.0-lon) < 1e-8
+
+def test_convertCoordsArray_wcscon():
+    if astCoords.wcscon is None:
+        pytest.skip("PyWCSTools is not installed")
+    for maxSep in astCoords.validateConvertCoords(200).values():
+        assert maxSep < 1e-6
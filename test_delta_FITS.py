@@ -0,0 +1,68 @@
+'''
+Tests of delta_FITS.py: deltas between versions of a table, replayed or
+applied in place.
+
+$ python -m pytest test_delta_FITS.py
+'''
+
+import numpy as np
+import json
+import pyfits
+import pytest
+
+from delta_FITS import (table_checksum, compute_delta, cells_delta, write_delta, read_delta, apply_delta,
+                        can_update_in_place, update_in_place)
+
+def _hdu(names=('A', 'B', 'C'), n=4):
+  columns = {'A': ('J', np.arange(n)), 'B': ('E', np.arange(n) * 0.5), 'C': ('6A', ['c%i' % i for i in range(n)])}
+  return pyfits.new_table(pyfits.ColDefs([pyfits.Column(name=name, format=columns[name][0], array=columns[name][1]) for name in names]))
+
+def test_compute_and_apply_delta(tmpdir):
+  old = _hdu()
+  new = _hdu(names=('A', 'B', 'C'), n=6)
+  new.data['B'][1] = 9.
+  new.data['C'][2] = 'x'
+  filename = str(tmpdir.join('v1.delta.npz'))
+  write_delta(filename, compute_delta(old.data, new.data))
+  meta, delta = read_delta(filename)
+  assert sorted(meta['changed']) == ['B', 'C'] and meta['nrows_new'] == 6
+  assert not can_update_in_place(old.data, meta)
+  assert table_checksum(apply_delta(old.data, meta, delta).data) == table_checksum(new.data)
+
+def test_cells_delta_update_in_place(tmpdir):
+  filename = str(tmpdir.join('table.fits'))
+  _hdu().writeto(filename)
+  old = pyfits.open(filename)[1].data
+  rows = np.array([1, 3])
+  new = old[rows]
+  new['B'][0] = 7.
+  new['C'][1] = 'new'
+  delta = cells_delta(old, rows, new)
+  meta = json.loads(str(delta['meta']))
+  #Only the changed cells are in the delta, the row 1 of C and the row 3 of B being unchanged
+  assert list(delta['rows__B']) == [1] and list(delta['rows__C']) == [3]
+  assert can_update_in_place(old, meta)
+
+  expected = _hdu()
+  expected.data['B'][1] = 7.
+  expected.data['C'][3] = 'new'
+  assert meta['source'] == table_checksum(old) and meta['target'] == table_checksum(expected.data)
+
+  assert update_in_place(filename, meta, delta) == 2
+  updated = pyfits.open(filename)[1].data
+  assert table_checksum(updated) == meta['target']
+  assert list(updated['B']) == [0., 7., 1., 1.5] and list(updated['C']) == ['c0', 'c1', 'c2', 'new']
+
+def test_cells_delta_without_checksums():
+  old = _hdu().data
+  delta = cells_delta(old, np.array([0]), old[np.array([0])], checksums=False)
+  meta = json.loads(str(delta['meta']))
+  assert meta['changed'] == [] and meta['source'] is None and meta['target'] is None
+
+def test_cells_delta_longer_strings():
+  old = _hdu().data
+  new = pyfits.new_table(pyfits.ColDefs([pyfits.Column(name='A', format='J', array=[0]),
+                                         pyfits.Column(name='B', format='E', array=[0.]),
+                                         pyfits.Column(name='C', format='10A', array=['too long!'])])).data
+  with pytest.raises(ValueError):
+    cells_delta(old, np.array([0]), new)
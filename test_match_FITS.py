@@ -0,0 +1,104 @@
+'''
+Tests of match_FITS.py: spatial index, cross-matches and match bookkeeping.
+
+$ python -m pytest test_match_FITS.py
+'''
+
+import numpy as np
+
+import astCoords
+from match_FITS import SkyIndex, MatchResult, match_by_position, crossmatch_parallel, crossmatch_knn
+from match_FITS import match_cache_key, save_match, load_match
+
+def _sky(n, seed):
+  rs = np.random.RandomState(seed)
+  return rs.uniform(0., 360., n), np.degrees(np.arcsin(rs.uniform(-1., 1., n)))
+
+def _separations(ra1, dec1, ra2, dec2):
+  '''All the separations (arcsec) between two sets of positions, by brute force'''
+  return 3600. * astCoords.calcAngSepDegTrig(astCoords.precomputeTrig(ra1[:, None], dec1[:, None]),
+                                             astCoords.precomputeTrig(ra2[None, :], dec2[None, :]))
+
+def test_query_and_nearest():
+  ra, dec = _sky(2000, 1)
+  ra_query, dec_query = _sky(1000, 2)
+  ra_query[:500], dec_query[:500] = ra[:500] + 0.01, np.clip(dec[:500] - 0.01, -90., 90.)
+  radius = 1800.
+  index = SkyIndex(ra, dec)
+  rows_query, rows_index, dist = index.query(ra_query, dec_query, radius)
+
+  seps = _separations(ra_query, dec_query, ra, dec)
+  assert set(zip(rows_query, rows_index)) == set(zip(*np.nonzero(seps <= radius)))
+  assert np.allclose(dist, seps[rows_query, rows_index], rtol=0., atol=1e-6)
+
+  best, best_dist = index.nearest(ra_query, dec_query, radius)
+  found = seps.min(axis=1) <= radius
+  assert (best[found] == seps.argmin(axis=1)[found]).all() and (best[~found] == -1).all()
+  assert np.isnan(best_dist[~found]).all()
+
+def test_crossmatch_parallel():
+  ra, dec = _sky(3000, 3)
+  ra_query, dec_query = _sky(3000, 4)
+  index = SkyIndex(ra, dec)
+  serial = index.query(ra_query, dec_query, 3600.)
+  parallel = crossmatch_parallel(index, ra_query, dec_query, 3600., processes=2)
+  order = np.lexsort((serial[2], serial[0]))
+  for result_serial, result_parallel in zip(serial, parallel):
+    assert np.allclose(result_serial[order], result_parallel)
+
+def test_match_by_position():
+  #Master objects A, B, C at DEC = 0, 100, 1000 arcsec; both positions 0 and 1 are nearest to A
+  index = SkyIndex([0., 0., 0.], [0., 100./3600., 1000./3600.])
+  ra = np.zeros(4)
+  dec = np.array([20., 5., 2000., 990.]) / 3600.
+  match = match_by_position(index, ra, dec, 300.)
+  #Position 1 (closest) takes A, position 0 falls back to B, position 3 goes to C
+  assert list(match.fits_to_ascii) == [1, 0, 3]
+  assert list(match.rows_ascii_new) == [2]
+  assert np.allclose(match.distance, [5., 80., 10.])
+
+def test_match_by_position_one_to_one():
+  ra, dec = _sky(500, 5)
+  rs = np.random.RandomState(6)
+  ra_query = np.concatenate([ra, ra]) + rs.normal(0., 0.01, 1000)
+  dec_query = np.clip(np.concatenate([dec, dec]) + rs.normal(0., 0.01, 1000), -90., 90.)
+  match = match_by_position(SkyIndex(ra, dec), ra_query, dec_query, 300.)
+  rows = match.rows_ascii
+  assert len(np.unique(rows)) == len(rows) == match.ascii_matched.sum()
+  seps = _separations(ra_query[rows], dec_query[rows], ra[match.rows_fits], dec[match.rows_fits])
+  assert (np.diag(seps) <= 300.).all()
+
+def test_crossmatch_knn():
+  index = SkyIndex([0., 0., 0.], [0., 10./3600., 20./3600.])
+  candidates = crossmatch_knn(index, [0., 0.], [1./3600., 1.], 60., k=2)
+  assert list(candidates.count) == [3, 0]
+  assert list(candidates.rows[0]) == [0, 1] and list(candidates.rows[1]) == [-1, -1]
+  assert candidates.best_match[0] and not candidates.unique[0]
+
+def test_match_result():
+  match = MatchResult(3, 4)
+  match.add(2, 1, 0.5)
+  match.add(0, 3)
+  assert len(match) == 2
+  assert list(match.rows_fits) == [0, 2] and list(match.rows_ascii) == [3, 1]
+  assert list(match.rows_ascii_new) == [0, 2]
+
+def test_match_cache(tmpdir):
+  match = MatchResult(3, 4)
+  match.add(2, 1, 0.5)
+  key = match_cache_key({'RA': np.arange(3.)}, {'RA': np.arange(4.)}, ['1', 300.])
+  save_match(key, match, str(tmpdir))
+  cached = load_match(key, 3, 4, str(tmpdir))
+  assert list(cached.fits_to_ascii) == [-1, -1, 1] and cached.distance[2] == 0.5
+  assert load_match('missing', 3, 4, str(tmpdir)) is None
+
+def test_match_cache_stale_closes_file(tmpdir, monkeypatch):
+  save_match('stale', MatchResult(3, 4), str(tmpdir))
+  opened = []
+  np_load = np.load
+  def load(*args, **kwargs):
+    opened.append(np_load(*args, **kwargs))
+    return opened[-1]
+  monkeypatch.setattr(np, 'load', load)
+  assert load_match('stale', 5, 4, str(tmpdir)) is None
+  assert len(opened) == 1 and opened[0].zip is None
@@ -0,0 +1,40 @@
+'''
+Tests of names_FITS.py: cleaning of the composite names and 'undef' values.
+
+$ python -m pytest test_names_FITS.py
+'''
+
+import numpy as np
+import pyfits
+
+from names_FITS import remove_duplicated_names, remove_duplicated_names_column, set_undef_values
+
+def _table(columns):
+  return pyfits.new_table(pyfits.ColDefs([pyfits.Column(name=name, format=tform, array=values) for name, tform, values in columns])).data
+
+def test_remove_duplicated_names():
+  assert remove_duplicated_names('A; B;A; NULL') == 'A; B'
+  assert remove_duplicated_names('NaN; -') == '-'
+  assert remove_duplicated_names_column(['A; A', 'B', 'A; A']) == ['A', 'B', 'A']
+
+def test_set_undef_values():
+  data = set_undef_values(_table([
+    ('INDEX', 'J', [1, 0, -5, 4]),
+    ('REDSHIFT', 'E', [0.1, -1., -1.6375E+30, 0.5]),
+    ('REDSHIFT_TYPE', '10A', ['Null', '', 'spec; spec', 'NaN']),
+    ('M500', 'E', [-1.6375E+30, 2., -1., 3.]),
+    ('ALT_NAME', '10A', ['A; A', 'NULL', 'B; NONE', 'False']),
+    ('PIPELINE', 'I', [-1, 0, 2, 3]),
+    ]))
+  assert list(data['INDEX']) == [1, -1, -1, 4]
+  #Both the REDSHIFT rule (-1) and the float placeholder rule apply to REDSHIFT
+  assert np.isnan(data['REDSHIFT'][1:3]).all() and np.allclose(data['REDSHIFT'][[0, 3]], [0.1, 0.5])
+  #The REDSHIFT_TYPE cells other than 'Null' are cleaned as any string
+  assert list(data['REDSHIFT_TYPE']) == ['undef', '-', 'spec', '-']
+  assert np.isnan(data['M500'][0]) and list(data['M500'][1:]) == [2., -1., 3.]
+  assert list(data['ALT_NAME']) == ['A', '-', 'B', '-']
+  assert list(data['PIPELINE']) == [0, 0, 2, 3]
+
+def test_set_undef_values_empty_table():
+  data = set_undef_values(_table([('REDSHIFT', 'E', []), ('ALT_NAME', '10A', [])]))
+  assert len(data) == 0
@@ -0,0 +1,41 @@
+'''
+Tests of read_ASCII.py: serial and parallel parsing of the ASCII tables.
+
+$ python -m pytest test_read_ASCII.py
+'''
+
+import numpy as np
+import pytest
+
+from read_ASCII import read_ascii_table, read_ascii_parallel
+
+def _write(tmpdir, lines):
+  filename = str(tmpdir.join('table.csv'))
+  f = open(filename, 'w')
+  f.write('\n'.join(lines) + '\n')
+  f.close()
+  return filename
+
+def test_read_ascii_table(tmpdir):
+  filename = _write(tmpdir, ['NAME,RA,DEC', 'A,1.5,-2', 'B, 3 ,4.25'])
+  table = read_ascii_table(filename)
+  assert table.names == ['NAME', 'RA', 'DEC'] and table.nrows == 2
+  assert list(table.strings('NAME')) == ['A', 'B']
+  assert np.allclose(table['RA'], [1.5, 3.]) and np.allclose(table['DEC'], [-2., 4.25])
+
+def test_read_ascii_parallel(tmpdir):
+  filename = _write(tmpdir, ['NAME,RA'] + ['N%i,%i' % (i, i) for i in range(1000)])
+  serial = read_ascii_table(filename)
+  parallel = read_ascii_parallel(filename, processes=2, parts=7)
+  assert parallel.names == serial.names and parallel.nrows == serial.nrows
+  assert list(parallel.strings('NAME')) == list(serial.strings('NAME'))
+  assert np.allclose(parallel['RA'], serial['RA'])
+
+def test_read_ascii_parallel_row_number(tmpdir):
+  lines = ['NAME,RA'] + ['N%i,%i' % (i, i) for i in range(1000)]
+  lines[900] = 'N899,899,extra'
+  filename = _write(tmpdir, lines)
+  for read in [lambda: read_ascii_table(filename), lambda: read_ascii_parallel(filename, processes=2, parts=7)]:
+    with pytest.raises(ValueError) as error:
+      read()
+    assert 'Row 900' in str(error.value)